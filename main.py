@@ -10,13 +10,23 @@ from settings import *
 from modules.player import Player
 from modules.weapon import Weapon
 from modules.ui import UI
-from modules.ai_client import AIClient
+from modules.ai_client import AIClient, batch_report
 from modules.game_manager import GameManager
 from modules.menu import MenuScreen
 from modules.audio_manager import AudioManager
 from modules.network import GameClient, start_server, get_local_ip
 from modules.lobby import LobbyScreen
 
+CAPTURE_DIR = 'captures'
+
+
+def capture_path(role):
+    """Return a fresh capture file path when run with --capture, else None."""
+    if '--capture' not in sys.argv:
+        return None
+    os.makedirs(CAPTURE_DIR, exist_ok=True)
+    return os.path.join(CAPTURE_DIR, f"{role}_{int(time.time())}.pwcap")
+
 
 def show_menu(screen, audio_manager):
     """Display menu and wait for user choice."""
@@ -54,9 +64,11 @@ def show_menu(screen, audio_manager):
     return "QUIT", None, None
 
 
-def show_lobby(screen, audio_manager, network_client, room_name, is_host):
-    """Display lobby and wait for players."""
+def show_lobby(screen, audio_manager, network_client, room_name, is_host, ai_client=None):
+    """Display lobby and wait for players (pre-forging the warm pool meanwhile)."""
     lobby = LobbyScreen(screen, network_client, room_name, is_host)
+    if ai_client:
+        ai_client.prewarm()
     clock = pygame.time.Clock()
 
     running = True
@@ -88,6 +100,8 @@ def show_lobby(screen, audio_manager, network_client, room_name, is_host):
             print("✓ Received start signal from host!")
             return "START"
 
+        if ai_client:
+            lobby.warm_status = ai_client.warm_pool_status()
         lobby.draw()
 
         # Draw audio button
@@ -98,7 +112,7 @@ def show_lobby(screen, audio_manager, network_client, room_name, is_host):
     return "QUIT"
 
 
-def run_game(room_info=None, audio_manager=None, is_host=False, network_client=None):
+def run_game(room_info=None, audio_manager=None, is_host=False, network_client=None, ai_client=None):
     """Run the main game."""
     # Use resizable window
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.RESIZABLE)
@@ -133,7 +147,10 @@ def run_game(room_info=None, audio_manager=None, is_host=False, network_client=N
     # Initialize game systems
     game_manager = GameManager()
     ui = UI(screen)
-    ai_client = AIClient()
+    if ai_client is None:
+        ai_client = AIClient()
+    # Warm forges would compete with the players' own for workers
+    ai_client.stop_prewarm()
 
     # Display room info if available
     if room_info:
@@ -175,7 +192,7 @@ def run_game(room_info=None, audio_manager=None, is_host=False, network_client=N
 
                 # In multiplayer, send weapon forged notification to other player
                 if is_multiplayer and network_client:
-                    network_client.send_update({
+                    network_client.send_event({
                         'type': 'weapon_forged',
                         'player_id': player_id,
                         'weapon_name': weapon_data.get('name', 'Unknown'),
@@ -191,28 +208,42 @@ def run_game(room_info=None, audio_manager=None, is_host=False, network_client=N
 
     ai_client.set_weapon_spawned_callback(on_weapon_spawned)
 
+    def on_weapon_upgraded(weapon_data, player_id):
+        # Progressive forge finished: swap the AI sprite into the placeholder already equipped
+        if player_id < len(game_manager.players):
+            weapon = getattr(game_manager.players[player_id], 'equipped_weapon', None)
+            if weapon is not None:
+                weapon.upgrade(weapon_data)
+                print(f"[DEBUG] Player {player_id + 1} weapon upgraded to AI sprite: {weapon_data.get('name', 'Unknown')}")
+                return
+        on_weapon_spawned(weapon_data, player_id)
+
+    ai_client.set_weapon_upgraded_callback(on_weapon_upgraded)
+
     def on_forge_weapon(prompt, player_id):
         print(f"[DEBUG] Forging weapon for Player {player_id + 1} with prompt: '{prompt}'")
-        ai_client.forge_weapon(prompt, player_id)
+        if ai_client.forge_weapon(prompt, player_id) == 'rejected':
+            ui.add_notification('Forge queue full - try again in a moment', 3.0, (255, 80, 80))
 
     ui.set_forge_weapon_callback(on_forge_weapon)
+    # Refine the prompt while the player is still typing so ENTER skips that round trip
+    ui.set_speculate_callback(ai_client.speculate_refine)
 
-    # PRE-GAME: wait for all players to forge weapons (NO TIMEOUT - wait until all forged)
+    # PRE-GAME: wait for all players to forge weapons (up to FORGE_PHASE_TIMEOUT)
     num_players = len(game_manager.players)
+    local_players = [local_player_id] if is_multiplayer else list(range(num_players))
+    forge_deadline = time.time() + FORGE_PHASE_TIMEOUT
     ui.add_notification('Type your weapon and press ENTER to forge!', 5.0, (0, 255, 255))
     print(f"[DEBUG] Starting forge phase. Multiplayer: {is_multiplayer}, Local Player ID: {local_player_id}")
 
-    # Track forging state for UI display
-    network_update_timer = 0
-
     # Simple blocking wait loop that still processes UI events so players can type prompts
     waiting = True
     while waiting:
         dt = clock.tick(FPS) / 1000.0
-        network_update_timer += dt
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                ai_client.cancel_all()
                 return "QUIT"
             # Pass the correct player_id for forging
             ui.handle_event(event, local_player_id)
@@ -222,6 +253,15 @@ def run_game(room_info=None, audio_manager=None, is_host=False, network_client=N
         # IMPORTANT: Process completed weapon forging results (async)
         ai_client.process_pending_results()
 
+        # Out of time: local players still without a weapon get one from the warm pool
+        if time.time() > forge_deadline:
+            for pid in local_players:
+                if pid not in forged_players:
+                    ai_client.cancel_forge(pid)
+                    print(f"[DEBUG] Forge phase timed out, giving Player {pid + 1} a warm pool weapon")
+                    on_weapon_spawned(ai_client.take_warm_weapon(), pid)
+            forge_deadline = float('inf')
+
         # Handle keyboard input for player movement during forge phase
         keys = pygame.key.get_pressed()
         if len(game_manager.players) > local_player_id:
@@ -243,8 +283,8 @@ def run_game(room_info=None, audio_manager=None, is_host=False, network_client=N
 
         # IMPORTANT: Process network updates during forge phase for multiplayer
         if is_multiplayer and network_client:
-            # Send our position updates
-            if network_update_timer >= 0.033:
+            # Send our position updates at the client's adaptive rate
+            if network_client.should_send_snapshot(dt):
                 if local_player_id < len(game_manager.players):
                     player = game_manager.players[local_player_id]
                     network_client.send_update({
@@ -255,51 +295,47 @@ def run_game(room_info=None, audio_manager=None, is_host=False, network_client=N
                         'facing_right': player.facing_right
                     })
 
-            if network_update_timer >= 0.033:
-                network_update_timer = 0
-
-                # Receive network updates from other player
-                remote_state = network_client.get_game_state()
-                if remote_state:
-                    # Check if this is a weapon_forged notification
-                    if remote_state.get('type') == 'weapon_forged':
-                        remote_player_id = remote_state.get('player_id')
-                        if remote_player_id is not None and remote_player_id not in forged_players:
-                            forged_players.add(remote_player_id)
-                            weapon_name = remote_state.get('weapon_name', 'Unknown')
-                            print(f"[DEBUG] Received weapon_forged from network: Player {remote_player_id + 1} forged {weapon_name}")
-                            ui.add_notification(f'Player {remote_player_id + 1} forged: {weapon_name}!', 3.0, (0, 255, 0))
-
-                            # Create a placeholder weapon for the remote player
-                            if remote_player_id < len(game_manager.players):
-                                remote_player = game_manager.players[remote_player_id]
-                                placeholder_weapon_data = {
-                                    'name': weapon_name,
-                                    'damage': 15,
-                                    'knockback': 5,
-                                    'size': 30,
-                                    'speed': 3,
-                                    'color': (200, 200, 255)
-                                }
-                                weapon = Weapon(placeholder_weapon_data, remote_player_id, remote_player.rect.centerx, remote_player.rect.centery)
-                                try:
-                                    remote_player.equip_weapon(weapon)
-                                except:
-                                    pass
-
-                    # Handle regular position updates during forge phase
-                    elif 'x' in remote_state and 'y' in remote_state:
-                        remote_player_id = 1 - local_player_id
+            # Events (weapon_forged) arrive on their own queue so snapshots can't overwrite them
+            for remote_event in network_client.poll_events():
+                if remote_event.get('type') == 'weapon_forged':
+                    remote_player_id = remote_event.get('player_id')
+                    if remote_player_id is not None and remote_player_id not in forged_players:
+                        forged_players.add(remote_player_id)
+                        weapon_name = remote_event.get('weapon_name', 'Unknown')
+                        print(f"[DEBUG] Received weapon_forged from network: Player {remote_player_id + 1} forged {weapon_name}")
+                        ui.add_notification(f'Player {remote_player_id + 1} forged: {weapon_name}!', 3.0, (0, 255, 0))
+
+                        # Create a placeholder weapon for the remote player
                         if remote_player_id < len(game_manager.players):
                             remote_player = game_manager.players[remote_player_id]
-                            remote_player.rect.x = remote_state.get('x', remote_player.rect.x)
-                            remote_player.rect.y = remote_state.get('y', remote_player.rect.y)
-                            if 'vx' in remote_state:
-                                remote_player.vel_x = remote_state.get('vx', 0)
-                            if 'vy' in remote_state:
-                                remote_player.vel_y = remote_state.get('vy', 0)
-                            if 'facing_right' in remote_state:
-                                remote_player.facing_right = remote_state.get('facing_right', True)
+                            placeholder_weapon_data = {
+                                'name': weapon_name,
+                                'damage': 15,
+                                'knockback': 5,
+                                'size': 30,
+                                'speed': 3,
+                                'color': (200, 200, 255)
+                            }
+                            weapon = Weapon(placeholder_weapon_data, remote_player_id, remote_player.rect.centerx, remote_player.rect.centery)
+                            try:
+                                remote_player.equip_weapon(weapon)
+                            except:
+                                pass
+
+            # Handle regular position updates during forge phase
+            remote_state = network_client.get_game_state()
+            if remote_state and 'x' in remote_state and 'y' in remote_state:
+                remote_player_id = 1 - local_player_id
+                if remote_player_id < len(game_manager.players):
+                    remote_player = game_manager.players[remote_player_id]
+                    remote_player.rect.x = remote_state.get('x', remote_player.rect.x)
+                    remote_player.rect.y = remote_state.get('y', remote_player.rect.y)
+                    if 'vx' in remote_state:
+                        remote_player.vel_x = remote_state.get('vx', 0)
+                    if 'vy' in remote_state:
+                        remote_player.vel_y = remote_state.get('vy', 0)
+                    if 'facing_right' in remote_state:
+                        remote_player.facing_right = remote_state.get('facing_right', True)
 
         # Draw a waiting screen with weapon input
         screen.blit(background, (0, 0))
@@ -321,6 +357,10 @@ def run_game(room_info=None, audio_manager=None, is_host=False, network_client=N
             if pid in forged_players:
                 status_color = (0, 255, 0)  # Green - forged
                 status_text = f"Player {pid + 1}: WEAPON FORGED!"
+            elif ai_client.player_forge_state(pid) == 'queued':
+                status_color = (255, 150, 0)  # Orange - waiting for a forge worker
+                ahead = ai_client.queue_position(pid)
+                status_text = f"Player {pid + 1}: QUEUED ({ahead} ahead)..." if ahead else f"Player {pid + 1}: QUEUED..."
             elif ai_client.is_player_processing(pid):
                 status_color = (255, 200, 0)  # Yellow - forging in progress
                 status_text = f"Player {pid + 1}: FORGING IN PROGRESS..."
@@ -335,7 +375,8 @@ def run_game(room_info=None, audio_manager=None, is_host=False, network_client=N
 
         # Show instruction at bottom
         if local_player_id not in forged_players and not ai_client.is_player_processing(local_player_id):
-            instruction_text = ui.small_font.render("Type your weapon prompt below and press ENTER to forge!", True, (255, 255, 255))
+            seconds_left = max(0, int(forge_deadline - time.time())) if forge_deadline != float('inf') else 0
+            instruction_text = ui.small_font.render(f"Type your weapon prompt below and press ENTER to forge! ({seconds_left}s)", True, (255, 255, 255))
             instruction_rect = instruction_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100))
             screen.blit(instruction_text, instruction_rect)
         elif local_player_id in forged_players and len(forged_players) < num_players:
@@ -360,11 +401,9 @@ def run_game(room_info=None, audio_manager=None, is_host=False, network_client=N
     running = True
     current_player = local_player_id if is_multiplayer else 0
     current_screen_size = (SCREEN_WIDTH, SCREEN_HEIGHT)
-    network_update_timer = 0
 
     while running:
         dt = clock.tick(FPS) / 1000.0
-        network_update_timer += dt
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -415,6 +454,7 @@ def run_game(room_info=None, audio_manager=None, is_host=False, network_client=N
                     elif event.key == pygame.K_ESCAPE:
                         if is_multiplayer and network_client:
                             network_client.disconnect()
+                        ai_client.cancel_all()
                         return "MENU"
 
         keys = pygame.key.get_pressed()
@@ -461,9 +501,11 @@ def run_game(room_info=None, audio_manager=None, is_host=False, network_client=N
                 if keys[pygame.K_RSHIFT] or keys[pygame.K_RCTRL]:
                     p1.attack(Player.ATTACK_SWING)
 
+        # Progressive forges keep landing after the round starts
+        ai_client.process_pending_results()
+
         # Send network updates (enhanced with new player state)
-        if is_multiplayer and network_update_timer >= 0.033:  # ~30 updates per second
-            network_update_timer = 0
+        if is_multiplayer and network_client.should_send_snapshot(dt):  # Adaptive 10-60 Hz
             if local_player_id < len(game_manager.players):
                 player = game_manager.players[local_player_id]
                 network_client.send_update({
@@ -477,7 +519,8 @@ def run_game(room_info=None, audio_manager=None, is_host=False, network_client=N
                     'attack_state': player.attack_state
                 })
 
-            # Receive network updates
+        # Receive network updates every frame (the remote side picks its own send rate)
+        if is_multiplayer and network_client:
             remote_state = network_client.get_game_state()
             if remote_state:
                 # Update remote player
@@ -544,48 +587,138 @@ def run_game(room_info=None, audio_manager=None, is_host=False, network_client=N
 
     if is_multiplayer and network_client:
         network_client.disconnect()
+    ai_client.cancel_all()
+
+    return "QUIT"
+
+
+def run_spectator_mode(server_ip, room_code):
+    """Watch a running match read-only (e.g. on a projector) and exit."""
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.RESIZABLE)
+    pygame.display.set_caption(f"PROMPT WARS - Spectating {room_code}")
+    clock = pygame.time.Clock()
+
+    try:
+        background = pygame.transform.scale(pygame.image.load("backgrounds/bg.png"), (SCREEN_WIDTH, SCREEN_HEIGHT))
+    except Exception as e:
+        print(f"✗ Could not load background: {e}")
+        background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        background.fill((50, 30, 80))
+
+    network_client = GameClient()
+    if not network_client.connect(server_ip) or not network_client.spectate_room(room_code):
+        print("✗ Failed to spectate - check IP address and room code")
+        network_client.disconnect()
+        return "QUIT"
+
+    ui = UI(screen)
+    player_colors = [(0, 200, 255), (255, 80, 180), (0, 255, 100), (255, 200, 0)]
+    players = {}
+    equipped = {}
+
+    running = True
+    while running and network_client.connected:
+        clock.tick(FPS)
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                running = False
+
+        snapshot = network_client.get_snapshot()
+        for pid, state in snapshot.get('players', {}).items():
+            if pid not in players:
+                players[pid] = Player(pid, state.get('x', 0), state.get('y', 0), player_colors[pid % len(player_colors)])
+            player = players[pid]
+            player.rect.x = state.get('x', player.rect.x)
+            player.rect.y = state.get('y', player.rect.y)
+            player.vel_x = state.get('vx', player.vel_x)
+            player.vel_y = state.get('vy', player.vel_y)
+            player.health = state.get('health', player.health)
+            player.alive = state.get('alive', player.alive)
+            player.facing_right = state.get('facing_right', player.facing_right)
+            player.attack_state = state.get('attack_state', player.attack_state)
+
+        for pid, weapon_name in snapshot.get('weapons', {}).items():
+            if pid in players and equipped.get(pid) != weapon_name:
+                equipped[pid] = weapon_name
+                player = players[pid]
+                weapon_data = {'name': weapon_name, 'damage': 15, 'knockback': 5, 'size': 30, 'speed': 3, 'color': (200, 200, 255)}
+                player.equip_weapon(Weapon(weapon_data, pid, player.rect.centerx, player.rect.centery))
+
+        screen.blit(background, (0, 0))
+        for player in players.values():
+            player.draw(screen)
+
+        names = snapshot.get('player_names', network_client.lobby_players)
+        header = ui.font.render(f"SPECTATING {room_code.upper()} - {' VS '.join(n.upper() for n in names)}", True, (0, 255, 255))
+        screen.blit(header, header.get_rect(center=(SCREEN_WIDTH // 2, 30)))
+        if not players:
+            waiting = ui.small_font.render("Waiting for match data...", True, (150, 150, 150))
+            screen.blit(waiting, waiting.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)))
 
+        pygame.display.flip()
+
+    network_client.disconnect()
     return "QUIT"
 
 
 def run_ai_test_mode():
-    """Run a quick AI image test (same as test_ai_images.py) and exit."""
+    """Forge sample prompts as one concurrent batch, report throughput and latency, and exit.
+
+    --mock-ai forges against a local stand-in for the AI APIs, and --batch N
+    forges N distinct prompts (sample prompts, then element + weapon
+    combinations, then numbered variants "... mk2") to load-test the pipeline.
+    Cache hits are reported apart from the throughput and latency figures.
+    """
     pygame.init()
     prompts = ["flaming sword", "icy spear", "giant Tiger"]
+    if '--batch' in sys.argv:
+        idx = sys.argv.index('--batch')
+        count = int(sys.argv[idx + 1]) if len(sys.argv) > idx + 1 and sys.argv[idx + 1].isdigit() else len(prompts)
+        pool = prompts + [f"{element} {weapon}" for element in WARM_POOL_ELEMENTS for weapon in WARM_POOL_WEAPONS]
+        prompts = [pool[i % len(pool)] + (f" mk{i // len(pool) + 1}" if i >= len(pool) else '') for i in range(count)]
     ai = AIClient()
-    results = []
+    if '--mock-ai' in sys.argv:
+        # Local stand-in for the HackClub / remove.bg APIs (no network, no keys)
+        from modules.mock_upstream import MockUpstream
+        MockUpstream().start().attach(ai)
+
+    print('HACKCLUB_API_KEY set:', bool(os.environ.get('HACKCLUB_API_KEY')))
+    print('REMOVE_BG_API_KEY set:', bool(os.environ.get('REMOVE_BG_API_KEY')))
+    print(f"\nForging {len(prompts)} prompts as one batch...")
+    start = time.time()
+    results = ai.forge_batch(prompts)
+    elapsed = time.time() - start
 
-    def _cb(weapon_data, player_id):
-        has_image = 'image' in weapon_data and weapon_data['image'] is not None
+    print('\nResults:')
+    for i, r in enumerate(results):
+        weapon_data = r['weapon'] or {}
+        surf = weapon_data.get('image')
         size = None
         path = None
-        bg_removed = weapon_data.get('bg_removed') if isinstance(weapon_data, dict) else None
-        bg_has_alpha = weapon_data.get('bg_has_alpha') if isinstance(weapon_data, dict) else None
-        if has_image:
-            surf = weapon_data['image']
+        if surf is not None:
             try:
                 size = surf.get_size()
-                fname = f"ai_image_{player_id}_{weapon_data.get('name','weapon').replace(' ','_')}.png"
+                # Into captures/, so runs don't overwrite the sample images checked in at the root
+                os.makedirs(CAPTURE_DIR, exist_ok=True)
+                fname = os.path.join(CAPTURE_DIR, f"ai_image_{i}_{weapon_data.get('name','weapon').replace(' ','_')}.png")
                 pygame.image.save(surf, fname)
                 path = os.path.abspath(fname)
             except Exception as e:
                 path = f"save_failed: {e}"
-        results.append({'prompt': cur_prompt, 'has_image': has_image, 'size': size, 'path': path, 'bg_removed': bg_removed, 'bg_has_alpha': bg_has_alpha, 'data': weapon_data})
-
-    ai.set_weapon_spawned_callback(_cb)
+        print(f"Prompt: {r['prompt']}, outcome: {r['outcome']}, time: {r['seconds']:.1f}s, has_image: {surf is not None}, "
+              f"size: {size}, saved: {path}, bg_removed: {weapon_data.get('bg_removed')}, bg_has_alpha: {weapon_data.get('bg_has_alpha')}")
 
-    print('HACKCLUB_API_KEY set:', bool(os.environ.get('HACKCLUB_API_KEY')))
-    print('REMOVE_BG_API_KEY set:', bool(os.environ.get('REMOVE_BG_API_KEY')))
-
-    for i, p in enumerate(prompts):
-        cur_prompt = p
-        print(f"\nForging prompt ({i+1}/{len(prompts)}): {p}")
-        ai.forge_weapon(p, i)
-
-    print('\nResults:')
-    for r in results:
-        print(f"Prompt: {r['prompt']}, has_image: {r['has_image']}, size: {r['size']}, saved: {r['path']}, bg_removed: {r['bg_removed']}, bg_has_alpha: {r['bg_has_alpha']}")
+    report = batch_report(results, elapsed)
+    print(f"\n{report['forges']} forges in {report['elapsed']:.1f}s ({report['forges_per_minute']:.1f} forges/minute)")
+    print(f"Latency: p50 {report['p50']:.1f}s, p90 {report['p90']:.1f}s, p99 {report['p99']:.1f}s, max {report['max']:.1f}s")
+    if report['cached']:
+        print(f"Cache hits (not counted above): {report['cached']}, p50 {report['cached_p50']:.2f}s")
+    print('Outcomes:', report['outcomes'])
 
+    ai.close()
     pygame.quit()
     # exit after test
     sys.exit(0)
@@ -597,6 +730,15 @@ def main():
     # CLI test mode: run AI test and exit
     if '--test-ai' in sys.argv:
         run_ai_test_mode()
+    # CLI spectator mode: python main.py --spectate <server_ip> <room_code>
+    if '--spectate' in sys.argv:
+        idx = sys.argv.index('--spectate')
+        if len(sys.argv) < idx + 3:
+            print("Usage: python main.py --spectate <server_ip> <room_code>")
+        else:
+            run_spectator_mode(sys.argv[idx + 1], sys.argv[idx + 2])
+        pygame.quit()
+        sys.exit(0)
     # Create resizable window
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.RESIZABLE)
     pygame.display.set_caption("PROMPT WARS - Retro Edition")
@@ -611,6 +753,9 @@ def main():
     else:
         print("✗ Could not load background music")
 
+    # One AI client for the whole session so lobby pre-forging carries into the match
+    ai_client = AIClient()
+
     while True:
         action, room_info, server_ip = show_menu(screen, audio_manager)
 
@@ -620,24 +765,24 @@ def main():
         elif action == "CREATE_LOBBY":
             # Host a game - start server and go to lobby
             print(f"\n=== CREATING LOBBY: {room_info} ===")
-            if start_server():
+            if start_server(capture_path=capture_path('server')):
                 local_ip = get_local_ip()
                 print(f"✓ Server started! Share this IP: {local_ip}")
                 print(f"✓ Room Code: {room_info}")
 
                 # Create network client and connect to own server
-                network_client = GameClient()
+                network_client = GameClient(capture_path=capture_path('host'), p2p='--no-p2p' not in sys.argv)
                 if network_client.connect(local_ip):
                     if network_client.create_room(room_info, 'Host'):
                         print("✓ Room created successfully!")
                         print("✓ Opening lobby...")
 
                         # Show lobby screen immediately - no freezing!
-                        lobby_result = show_lobby(screen, audio_manager, network_client, room_info, is_host=True)
+                        lobby_result = show_lobby(screen, audio_manager, network_client, room_info, is_host=True, ai_client=ai_client)
 
                         if lobby_result == "START":
                             print("✓ Starting game!")
-                            result = run_game(room_info, audio_manager, is_host=True, network_client=network_client)
+                            result = run_game(room_info, audio_manager, is_host=True, network_client=network_client, ai_client=ai_client)
                             network_client.disconnect()
                         elif lobby_result == "CANCEL":
                             print("✓ Cancelled - returning to menu")
@@ -664,7 +809,7 @@ def main():
             print(f"\n=== JOINING GAME: {room_info} ===")
             print(f"Connecting to server at: {server_ip}")
 
-            network_client = GameClient()
+            network_client = GameClient(capture_path=capture_path('client'), p2p='--no-p2p' not in sys.argv)
             if network_client.connect(server_ip):
                 if network_client.join_room(room_info, 'Player2'):
                     print("✓ Joined room successfully!")
@@ -672,16 +817,16 @@ def main():
                     # Check if game already started during join
                     if network_client.game_starting:
                         print("✓ Game already starting - going straight to game!")
-                        result = run_game(f"{room_info}", audio_manager, is_host=False, network_client=network_client)
+                        result = run_game(f"{room_info}", audio_manager, is_host=False, network_client=network_client, ai_client=ai_client)
                         network_client.disconnect()
                     else:
                         print("✓ Waiting in lobby...")
                         # Show lobby screen
-                        lobby_result = show_lobby(screen, audio_manager, network_client, room_info, is_host=False)
+                        lobby_result = show_lobby(screen, audio_manager, network_client, room_info, is_host=False, ai_client=ai_client)
 
                         if lobby_result == "START":
                             print("✓ Game starting!")
-                            result = run_game(f"{room_info}", audio_manager, is_host=False, network_client=network_client)
+                            result = run_game(f"{room_info}", audio_manager, is_host=False, network_client=network_client, ai_client=ai_client)
                             network_client.disconnect()
                         elif lobby_result == "LEAVE" or lobby_result == "CANCEL":
                             print("✓ Left lobby - returning to menu")
@@ -701,6 +846,8 @@ def main():
             if result == "QUIT":
                 break
 
+    ai_client.stop_prewarm()
+    ai_client.close()
     pygame.quit()
     sys.exit()
 
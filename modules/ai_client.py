@@ -4,12 +4,29 @@
 
 import os
 import io
+import re
+import json
 import time
-import base64
+import socket
+import binascii
+import random
+import queue
+import itertools
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib.parse import urlsplit
 import pygame
 import threading
+from collections import deque
 from settings import *
+from modules.forge_cache import ForgeCache, normalize_prompt
+from modules.asset_store import AssetStore
+from modules.circuit_breaker import CircuitBreaker, UpstreamUnavailable, percentile
+from modules.hedging import HedgePolicy
+from modules.forge_telemetry import ForgeTelemetry, stage, mark, note_retry
+from modules.sprite_generator import create_retro_weapon_sprite, fit_weapon_sprite, quantize_sprite, encode_indexed_png
+from modules.bg_removal import remove_background_bytes
 
 # Optional: load keys from a local .env file if present
 try:
@@ -27,6 +44,288 @@ if not os.path.exists(GENERATED_DIR):
     except Exception:
         pass
 
+# Both upstream URLs can be overridden from the environment, e.g. to use modules/mock_upstream.py
+DEFAULT_CHAT_URL = 'https://ai.hackclub.com/proxy/v1/chat/completions'
+HACKCLUB_CHAT_URL = os.environ.get('HACKCLUB_CHAT_URL', DEFAULT_CHAT_URL)
+REFINE_MODEL = 'qwen/qwen3-32b'
+IMAGE_MODEL = 'google/gemini-2.5-flash-image'
+REMOVE_BG_URL = os.environ.get('REMOVE_BG_URL', 'https://api.remove.bg/v1.0/removebg')
+FORGE_PIPELINE_VERSION = 3  # Bump when prompts or post-processing change so cached forges are redone
+
+# Keep-alive connection pool size per upstream, shared by every player's forge
+HTTP_POOL_SIZES = {
+    'ai.hackclub.com': 8,  # refine + image calls, the busiest upstream
+    'api.remove.bg': 4,
+}
+HTTP_POOL_SIZE_DEFAULT = 4  # Image CDNs and anything else
+
+
+_sending = threading.local()  # .job: (ForgeJob, [aborts]) while a helper thread sends for a forge
+
+
+class _ConnectionAbort:
+    """cancel() hook for a pooled connection a forge request holds: shuts its socket down.
+
+    That unblocks the helper thread whether it is waiting for headers or
+    reading the body, and urllib3 then discards the connection.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def close(self):
+        conn, self.conn = self.conn, None
+        sock = getattr(conn, 'sock', None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class _AbortableConnections:
+    """Pool mixin: connections checked out for a forge job are registered with it."""
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        sending = getattr(_sending, 'job', None)
+        if sending is not None:
+            job, aborts = sending
+            abort = _ConnectionAbort(conn)
+            aborts.append(abort)
+            try:
+                job.track(abort)
+            except ForgeCancelled:
+                pass  # Already cancelled: track() shut the socket, so the request fails at once
+        return conn
+
+
+class _AbortableHTTPPool(_AbortableConnections, HTTPConnectionPool):
+    pass
+
+
+class _AbortableHTTPSPool(_AbortableConnections, HTTPSConnectionPool):
+    pass
+
+
+class _ForgeAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools let a cancelled forge abort its in-flight request."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _AbortableHTTPPool, 'https': _AbortableHTTPSPool}
+
+
+def _make_session(pool_size):
+    """requests.Session with a keep-alive pool sized for concurrent forges."""
+    session = requests.Session()
+    # Retries stay in _post_with_retries so they're logged and backed off
+    adapter = _ForgeAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_DATA_URL_END = re.compile(r'[)"\'\s]')
+
+
+def _decode_base64(text, start=0, end=None):
+    """Decode base64 text[start:end] without slicing the (possibly multi-MB) string first."""
+    raw = text.encode('ascii') if isinstance(text, str) else text
+    return binascii.a2b_base64(memoryview(raw)[start:end])
+
+
+def _inline_image(text):
+    """Decode a data:image URL found anywhere in a string (e.g. markdown), or None."""
+    idx = text.find('data:image')
+    if idx == -1:
+        return None
+    comma = text.find(',', idx)
+    if comma == -1:
+        return None
+    # A bare data URL runs to the end; one embedded in text stops at a quote, paren or space
+    match = _DATA_URL_END.search(text, comma + 1) if idx else None
+    return _decode_base64(text, comma + 1, match.start() if match else None)
+
+
+def extract_image(out):
+    """Find the image in an image-generation response.
+
+    Walks the parsed JSON once and supports the shapes we've seen: data URLs
+    (in image_url / image_url.url, content parts or inline in text),
+    b64_json fields, and plain http(s) URLs. Inline images win over URLs.
+    Returns (image_bytes, image_url) - the URL is only set when the image
+    still has to be downloaded.
+    """
+    image_url = None
+    stack = [out]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            b64 = node.get('b64_json')
+            if isinstance(b64, str) and b64:
+                try:
+                    return _decode_base64(b64), None
+                except (binascii.Error, ValueError):
+                    pass
+            # Push in reverse so the walk visits keys (and list items) in order
+            stack.extend(reversed(list(node.items())))
+        elif isinstance(node, tuple):
+            key, value = node
+            if isinstance(value, str):
+                if 'data:image' in value:
+                    try:
+                        image_bytes = _inline_image(value)
+                    except (binascii.Error, ValueError):
+                        image_bytes = None
+                    if image_bytes:
+                        return image_bytes, None
+                elif image_url is None and key in ('url', 'image_url') and value.startswith('http'):
+                    image_url = value
+            else:
+                stack.append(value)
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, str) and 'data:image' in node:
+            try:
+                image_bytes = _inline_image(node)
+            except (binascii.Error, ValueError):
+                image_bytes = None
+            if image_bytes:
+                return image_bytes, None
+    return None, image_url
+
+
+class ForgeCancelled(Exception):
+    """Raised inside a forge whose job was cancelled or superseded."""
+
+
+class ForgeJob:
+    """One queued or running forge request."""
+
+    def __init__(self, prompt, player_id, priority=0):
+        self.prompt = prompt
+        self.player_id = player_id
+        self.priority = priority  # Lower runs first
+        self.state = 'queued'  # 'queued' -> 'running'
+        self.enqueued_at = time.time()
+        self.started_at = None
+        self.cancelled = threading.Event()
+        self.responses = []  # In-flight HTTP responses and connections, closed on cancel
+        self.on_cancel = None  # Set by the async engine to cancel the job's task
+        self.warm = False  # Lobby pre-forge for the warm pool, not tied to a player
+        self.done = threading.Event()  # Set when a warm job finishes (players forging the same prompt wait on it)
+        self.placeholder = False  # A procedural weapon was already delivered; the result upgrades it
+        self.trace = None  # ForgeTrace once a worker takes the job
+        self.batch = None  # (batch number, item) in forge_batch(): no player, the result stays on the job
+        self.result = None  # Weapon data of a finished batch job
+        self.finished_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def owner(self):
+        """Who the forge is for, for logs: 'Player N' or 'batch B item N'."""
+        if self.batch:
+            return f"batch {self.batch[0]} item {self.batch[1] + 1}"
+        if self.player_id is None:
+            return 'no player'
+        return f"Player {self.player_id + 1}"
+
+    def cancel(self):
+        """Stop the job: later stage checks raise and open downloads are aborted."""
+        self.cancelled.set()
+        if self.on_cancel:
+            self.on_cancel()
+        with self.lock:
+            responses, self.responses = self.responses, []
+        for resp in responses:
+            try:
+                resp.close()
+            except Exception:
+                pass
+
+    def track(self, resp):
+        """Register an in-flight response or connection (anything with close()) for cancel() to abort."""
+        with self.lock:
+            if not self.cancelled.is_set():
+                self.responses.append(resp)
+                return
+        resp.close()
+        raise ForgeCancelled()
+
+    def untrack(self, resp):
+        with self.lock:
+            if resp in self.responses:
+                self.responses.remove(resp)
+
+    def check(self):
+        """Cooperative cancellation point between forge stages."""
+        if self.cancelled.is_set():
+            raise ForgeCancelled()
+
+
+# --- Forge stage ops ---
+# The forge pipeline in AIClient is written as generator "stages" that yield
+# these ops instead of doing I/O themselves. AIClient._run_steps performs them
+# on the calling thread (requests, waits, helper threads) and the async engine
+# performs them on its event loop (modules/forge_engine.py), so both engines
+# run the very same pipeline.
+
+def _http(method, url, job, timeout, **kwargs):
+    """Op: one HTTP call -> (status, body bytes).
+
+    kwargs: headers=, json=, data= and upload=(field, filename, bytes, content type).
+    """
+    return ('http', method, url, job, timeout, kwargs)
+
+
+def _call(fn, *args):
+    """Op: blocking or CPU-heavy work -> fn(*args) (off the loop on the async engine)."""
+    return ('call', fn, args)
+
+
+def _sleep(job, seconds):
+    """Op: backoff that ends early (ForgeCancelled) when the job is cancelled."""
+    return ('sleep', job, seconds)
+
+
+def _spawn(job, steps):
+    """Op: run another stage concurrently under its own job -> handle."""
+    return ('spawn', job, steps)
+
+
+def _wait(job, handles, timeout=None):
+    """Op: wait for spawned handles -> set of finished ones (empty on timeout)."""
+    return ('wait', job, handles, timeout)
+
+
+class _StageThread:
+    """A spawned stage on the thread engine (done/exception/result like an asyncio.Task)."""
+
+    def __init__(self, client, steps):
+        self.finished = threading.Event()
+        self.value = None
+        self.error = None
+        threading.Thread(target=self._run, args=(client, steps), daemon=True).start()
+
+    def _run(self, client, steps):
+        try:
+            self.value = client._run_steps(steps)
+        except Exception as e:
+            self.error = e
+        self.finished.set()
+
+    def done(self):
+        return self.finished.is_set()
+
+    def exception(self):
+        return self.error
+
+    def result(self):
+        if self.error is not None:
+            raise self.error
+        return self.value
+
 
 class AIClient:
     """Handles AI weapon generation from prompts."""
@@ -34,95 +333,747 @@ class AIClient:
     def __init__(self):
         """Initialize AI client."""
         self.weapon_spawned_callback = None
-        # Track processing state per player instead of global
-        self.processing_players = set()  # Set of player_ids currently processing
-        self.pending_results = []  # List of (weapon_data, player_id) tuples ready to be processed
+        self.weapon_upgraded_callback = None
+        # Fixed-size worker pool fed by a priority queue (FIFO within a priority)
+        self.forge_queue = queue.PriorityQueue()
+        self.queue_seq = itertools.count()
+        self.batch_seq = itertools.count(1)  # Numbers forge_batch() runs in logs and traces
+        self.player_jobs = {}  # {player_id: ForgeJob} - at most one queued/running job per player
+        self.jobs_lock = threading.Lock()
+        self.workers = []
+        self.engine = None  # AsyncForgeEngine when FORGE_ENGINE == 'async'
+        self.forge_waits = deque(maxlen=100)  # Seconds jobs spent queued before a worker took them
+        self.forges_completed = 0
+        self.forges_rejected = 0
+        self.forges_cancelled = 0
+        self.pending_results = []  # List of (weapon_data, player_id, job) tuples ready to be processed
         self.results_lock = threading.Lock()
 
         # Read API keys from environment - safer than hardcoding
         self.hackclub_key = os.environ.get('HACKCLUB_API_KEY')
         self.removebg_key = os.environ.get('REMOVE_BG_API_KEY')
+        self.chat_url = HACKCLUB_CHAT_URL
+        self.removebg_url = REMOVE_BG_URL
+
+        # One pooled keep-alive session per upstream host so forges reuse TCP/TLS connections
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.breakers = {}  # {(host, call kind): CircuitBreaker} - fail fast while an upstream is unhealthy
+        self.probe_targets = {}  # {(host, call kind): (method, url, headers)} of the latest call, for probes
+        self.hedging = HedgePolicy()  # When to fire a second image request for a slow one
+        self.telemetry = ForgeTelemetry()  # Per-stage timings of finished forges
+
+        # Refined prompts are memoized on their own (step 1 of the forge)
+        self.refine_memo = {}  # {normalized prompt: (refined prompt, time)}
+        self.refine_lock = threading.Lock()
+        self.refine_inflight = {}  # {normalized prompt: Event set when that refine finishes}
+        self.speculations = {}  # {player_id: ForgeJob} speculative refines while typing
+
+        # Repeat prompts are served from disk instead of re-running the AI chain
+        # Generated images are stored once per content hash; the cache points at them
+        # A non-default upstream (e.g. the standalone mock) gets its own cache keys
+        upstream = () if self.chat_url == DEFAULT_CHAT_URL else (self.chat_url,)
+        self.assets = AssetStore(GENERATED_DIR, ASSET_STORE_MAX_BYTES)
+        self.forge_cache = ForgeCache(FORGE_CACHE_DIR, self.assets, FORGE_PIPELINE_VERSION,
+                                      models=(REFINE_MODEL, IMAGE_MODEL) + upstream)
+
+        # Warm pool: weapons pre-forged into the cache while the lobby is open
+        self.warm_prompts = []  # In forge order, popular first
+        self.warm_jobs = {}  # {normalized prompt: ForgeJob} still queued or running
+        self.warm_taken = set()  # Warm prompts already handed to a player this match
+
+    @property
+    def processing_players(self):
+        """Player ids with a queued or running forge."""
+        with self.jobs_lock:
+            return set(self.player_jobs)
 
     @property
     def is_processing(self):
         """Check if any player is currently processing."""
-        return len(self.processing_players) > 0
+        with self.jobs_lock:
+            return len(self.player_jobs) > 0
 
     def is_player_processing(self, player_id):
-        """Check if a specific player is currently processing."""
-        return player_id in self.processing_players
+        """Check if a specific player is currently processing (queued or running)."""
+        with self.jobs_lock:
+            return player_id in self.player_jobs
+
+    def player_forge_state(self, player_id):
+        """'queued', 'running' or None for a player's forge."""
+        with self.jobs_lock:
+            job = self.player_jobs.get(player_id)
+            return job.state if job else None
+
+    def queue_position(self, player_id):
+        """Number of queued jobs that will start before this player's (None if not queued)."""
+        with self.jobs_lock:
+            job = self.player_jobs.get(player_id)
+            if job is None or job.state != 'queued':
+                return None
+            return sum(1 for other in self.player_jobs.values()
+                       if other.state == 'queued' and (other.priority, other.enqueued_at) < (job.priority, job.enqueued_at))
+
+    @property
+    def queue_depth(self):
+        with self.jobs_lock:
+            return sum(1 for job in self.player_jobs.values() if job.state == 'queued')
+
+    def forge_metrics(self):
+        """Queue depth, worker usage and queue wait times (seconds)."""
+        with self.jobs_lock:
+            queued = sum(1 for job in self.player_jobs.values() if job.state == 'queued')
+            running = len(self.player_jobs) - queued
+            waits = list(self.forge_waits)
+        return {
+            'queue_depth': queued,
+            'running': running,
+            'workers': FORGE_ASYNC_CONCURRENCY if self.engine else FORGE_WORKERS,
+            'completed': self.forges_completed,
+            'rejected': self.forges_rejected,
+            'cancelled': self.forges_cancelled,
+            'avg_wait': sum(waits) / len(waits) if waits else 0.0,
+            'max_wait': max(waits) if waits else 0.0,
+            'upstreams': {breaker.name: breaker.snapshot() for breaker in list(self.breakers.values())},
+            'hedging': self.hedging.snapshot(),
+        }
+
+    def forge_telemetry(self):
+        """Per-stage latency percentiles, outcomes, cache hits and retries of recent forges."""
+        return self.telemetry.summary()
+
+    def dump_forge_telemetry(self, path='forge_telemetry.json'):
+        """Write recent forge traces and their summary to a JSON file; returns the path."""
+        return self.telemetry.dump(path)
 
     def set_weapon_spawned_callback(self, callback):
         """Set callback for weapon spawned: callback(weapon_data, player_id)"""
         self.weapon_spawned_callback = callback
 
-    def _post_with_retries(self, url, headers=None, json=None, files=None, data=None, timeout=60, retries=2, backoff=1.5):
-        """POST with simple retry/backoff, returns requests.Response or raises."""
+    def set_weapon_upgraded_callback(self, callback):
+        """Set callback for a progressive forge's final weapon: callback(weapon_data, player_id)"""
+        self.weapon_upgraded_callback = callback
+
+    def _session_for(self, url):
+        """Pooled session for the URL's host (created on first use)."""
+        host = urlsplit(url).hostname or ''
+        with self.sessions_lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = _make_session(HTTP_POOL_SIZES.get(host, HTTP_POOL_SIZE_DEFAULT))
+                self.sessions[host] = session
+            return session
+
+    def _breaker_for(self, kind, method, url, headers=None):
+        """Circuit breaker for one kind of call ('refine', 'image', ...) to the URL's host.
+
+        Refine and image calls share an endpoint but not their latency, so each
+        kind gets its own window and timeout cap, and its probe repeats that
+        kind's latest request (created on first use). Download URLs change with
+        every image, so probing the first one would hit a long-expired link.
+        """
+        host = urlsplit(url).hostname or ''
+        with self.sessions_lock:
+            self.probe_targets[host, kind] = (method, url, headers)
+            breaker = self.breakers.get((host, kind))
+            if breaker is None:
+                breaker = CircuitBreaker(f'{host} {kind}', probe=lambda: self._probe(*self.probe_targets[host, kind]))
+                self.breakers[host, kind] = breaker
+            return breaker
+
+    def _probe(self, method, url, headers=None):
+        """Cheap health check of the endpoint whose circuit is open.
+
+        A POST carries an empty JSON body, which the API rejects without doing
+        (or billing) any work: a 4xx answer still shows the endpoint is
+        serving, while 5xx, 429 and errors don't.
+        """
+        try:
+            resp = self._session_for(url).request(method, url, headers=headers, json={} if method == 'POST' else None,
+                                                  stream=True, timeout=5)
+            resp.close()
+            return resp.status_code < 500 and resp.status_code != 429
+        except Exception:
+            return False
+
+    def close(self):
+        """Close pooled HTTP connections, stop the async engine and flush the asset index."""
+        if self.engine:
+            self.engine.close()
+            self.engine = None
+        with self.sessions_lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+        self.assets.flush()
+        if FORGE_TELEMETRY_DUMP:
+            try:
+                print(f"✓ Forge telemetry written to {self.dump_forge_telemetry(FORGE_TELEMETRY_DUMP)}")
+            except Exception as e:
+                print(f"✗ Forge telemetry dump failed: {e}")
+
+    def _request(self, kind, method, url, job=None, timeout=30, **kwargs):
+        """Stage: one HTTP call through the circuit breaker for its kind -> (status, body).
+
+        Raises UpstreamUnavailable at once while the breaker is open; the
+        timeout is capped near the usual latency of this kind of call, and the
+        outcome (errors, 5xx and 429 count as failures) feeds the breaker.
+        """
+        breaker = self._breaker_for(kind, method, url, kwargs.get('headers'))
+        breaker.check()
+        start = time.time()
+        try:
+            status, body = yield _http(method, url, job, breaker.timeout_for(timeout), **kwargs)
+        except ForgeCancelled:
+            raise
+        except Exception:
+            breaker.record(False, time.time() - start)
+            raise
+        breaker.record(status < 500 and status != 429, time.time() - start)
+        return status, body
+
+    def _send(self, method, url, job=None, timeout=30, headers=None, json=None, data=None, upload=None):
+        """Thread transport: one HTTP call with requests -> (status, body bytes).
+
+        upload is (field, filename, bytes, content type) for multipart posts.
+        Without a job this is a plain pooled request. With one, the call runs on
+        a helper thread so cancel() doesn't have to wait out a 90s upstream
+        call; the connection it checks out is tracked by the job, so cancel()
+        shuts it down and the upstream call really stops (headers or body).
+        """
+        files = None
+        if upload:
+            field, filename, content, content_type = upload
+            files = {field: (filename, io.BytesIO(content), content_type)}
+        kwargs = dict(headers=headers, json=json, data=data, files=files, timeout=timeout)
+        session = self._session_for(url)
+        if job is None:
+            resp = session.request(method, url, **kwargs)
+            return resp.status_code, resp.content
+
+        job.check()
+        box = {}
+        done = threading.Event()
+        aborts = []
+
+        def _run():
+            _sending.job = (job, aborts)
+            try:
+                box['resp'] = session.request(method, url, stream=True, **kwargs)
+            except Exception as e:
+                box['error'] = e
+            finally:
+                _sending.job = None
+            done.set()
+            if job.cancelled.is_set() and 'resp' in box:
+                box['resp'].close()  # Nobody is waiting for it any more
+
+        threading.Thread(target=_run, daemon=True).start()
+        while not done.wait(0.05):
+            job.check()
+        if 'error' in box:
+            job.check()  # Failed because cancel() aborted it
+            raise box['error']
+
+        resp = box['resp']
+        try:
+            body = resp.content  # Read the body now, while cancel() can still abort it
+        except Exception:
+            job.check()
+            raise
+        finally:
+            for abort in aborts:
+                job.untrack(abort)  # The connection goes back to the pool
+        job.check()
+        return resp.status_code, body
+
+    def _post_with_retries(self, kind, url, job=None, timeout=60, retries=2, backoff=1.5, **kwargs):
+        """Stage: POST with simple retry/backoff -> (status, body), or raises."""
         last_exc = None
         for attempt in range(1, retries + 1):
             try:
-                resp = requests.post(url, headers=headers, json=json, files=files, data=data, timeout=timeout)
-                return resp
+                return (yield from self._request(kind, 'POST', url, job, timeout, **kwargs))
+            except (ForgeCancelled, UpstreamUnavailable):
+                raise  # Retrying an open circuit would only wait for nothing
             except Exception as e:
                 last_exc = e
                 print(f"[DEBUG] AI API: Request failed (attempt {attempt}): {e}")
-                time.sleep(backoff * attempt)
+                note_retry(job)
+                yield _sleep(job, backoff * attempt)
         raise last_exc
 
-    def forge_weapon(self, prompt, player_id):
+    def _run_steps(self, steps):
+        """Drive a forge stage generator to its result on this thread (the thread engine)."""
+        value = error = None
+        while True:
+            try:
+                op = steps.send(value) if error is None else steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            value = error = None
+            try:
+                value = self._perform(op)
+            except Exception as e:
+                error = e
+
+    def _perform(self, op):
+        """Carry out one stage op with requests, waits and helper threads."""
+        kind = op[0]
+        if kind == 'http':
+            _, method, url, job, timeout, kwargs = op
+            return self._send(method, url, job, timeout, **kwargs)
+        if kind == 'call':
+            return op[1](*op[2])
+        if kind == 'sleep':
+            _, job, seconds = op
+            if job is None:
+                time.sleep(seconds)
+            else:
+                job.cancelled.wait(seconds)
+                job.check()
+            return None
+        if kind == 'spawn':
+            return _StageThread(self, op[2])
+        if kind == 'wait':
+            _, job, handles, timeout = op
+            deadline = None if timeout is None else time.time() + timeout
+            while True:
+                finished = {handle for handle in handles if handle.done()}
+                if finished or (deadline is not None and time.time() >= deadline):
+                    return finished
+                if job is not None:
+                    job.check()
+                time.sleep(0.05)
+        raise ValueError(f'Unknown forge op {kind!r}')
+
+    def forge_weapon(self, prompt, player_id, priority=0, progressive=PROGRESSIVE_FORGE):
         """
         Generate a weapon from a text prompt (NON-BLOCKING).
 
-        Starts a background thread to generate the weapon so the game loop
-        doesn't freeze. Call process_pending_results() each frame to handle
-        completed weapons.
+        Queues the request for the forge worker pool so the game loop doesn't
+        freeze. Call process_pending_results() each frame to handle completed
+        weapons. A player has at most one job: the same prompt again is
+        ignored, a different one cancels the queued or running forge and is
+        submitted afresh.
+
+        Returns the player's forge state afterwards, like player_forge_state():
+        'queued' or 'running', or 'rejected' when the queue is full.
+
+        With progressive, every queued forge of an uncached prompt first
+        delivers a procedural placeholder on the next process_pending_results()
+        (with or without an API key); an AI result then goes to the
+        weapon_upgraded callback.
         """
-        if player_id in self.processing_players:
-            print(f"[DEBUG] AI Client: Player {player_id + 1} already processing, skipping")
-            return None
+        with self.jobs_lock:
+            job = self.player_jobs.get(player_id)
+            if job is not None and normalize_prompt(job.prompt) == normalize_prompt(prompt):
+                print(f"[DEBUG] AI Client: Player {player_id + 1} already forging this prompt, skipping")
+                return job.state
+
+            # The player's own queued job doesn't count: the new prompt takes its slot
+            queued = sum(1 for other in self.player_jobs.values() if other.state == 'queued' and other is not job)
+            if queued >= FORGE_QUEUE_LIMIT:
+                self.forges_rejected += 1
+                print(f"[DEBUG] AI Client: Forge queue full ({queued}), rejecting Player {player_id + 1}")
+                return 'rejected'  # Any forge the player already has keeps going
+
+            if job is not None:
+                # Retyped prompt supersedes the queued or running forge
+                print(f"[DEBUG] AI Client: Player {player_id + 1} retyped, cancelling {job.state} forge")
+                job.cancel()
+                del self.player_jobs[player_id]
+
+            job = ForgeJob(prompt, player_id, priority)
+            self.player_jobs[player_id] = job
+            self._ensure_workers()
+
+        if progressive and not self.forge_cache.contains(prompt):
+            job.placeholder = True
+            with self.results_lock:
+                self.pending_results.append((self._placeholder_weapon(prompt), player_id, job))
 
-        self.processing_players.add(player_id)
-        print(f"[DEBUG] AI Client: Starting forge process for player {player_id + 1} (async)")
+        # A speculative refine of different text is now wasted work
+        speculation = self.speculations.get(player_id)
+        if speculation is not None and normalize_prompt(speculation.prompt) != normalize_prompt(prompt):
+            speculation.cancel()
+
+        print(f"[DEBUG] AI Client: Queued forge for player {player_id + 1} (queue depth {queued + 1})")
         print(f"[DEBUG] AI Client: Prompt = '{prompt}'")
         print(f"[DEBUG] AI Client: HackClub API Key present = {bool(self.hackclub_key)}")
+        if self.engine:
+            self.engine.submit(job)
+        else:
+            self.forge_queue.put((priority, next(self.queue_seq), job))
+        return 'queued'
+
+    def forge_batch(self, prompts, timeout=None, priority=0):
+        """Forge several prompts concurrently and wait for all of them (BLOCKING).
+
+        The jobs share the worker pool / async engine with player forges, so
+        no more than FORGE_WORKERS (FORGE_ASYNC_CONCURRENCY) run at once, but
+        they don't take player slots or go through the callbacks. Forges still
+        unfinished after timeout seconds are cancelled.
+
+        Returns one dict per prompt, in order: prompt, weapon (weapon data or
+        None), outcome ('ai', 'cached', 'mock', 'cancelled' or 'timeout'),
+        queued / seconds since submit, and seconds per pipeline stage.
+        """
+        with self.jobs_lock:
+            self._ensure_workers()
+        batch = next(self.batch_seq)
+        jobs = []
+        for index, prompt in enumerate(prompts):
+            job = ForgeJob(prompt, None, priority)  # Batch items aren't players
+            job.batch = (batch, index)
+            jobs.append(job)
+            if self.engine:
+                self.engine.submit(job)
+            else:
+                self.forge_queue.put((priority, next(self.queue_seq), job))
+        print(f"[DEBUG] AI Client: Queued batch {batch} of {len(jobs)} forges")
+
+        deadline = time.time() + timeout if timeout is not None else None
+        timed_out = set()
+        for job in jobs:
+            remaining = None if deadline is None else max(0.0, deadline - time.time())
+            if not job.done.wait(remaining):
+                timed_out.add(job)
+                job.cancel()
+        now = time.time()
+
+        results = []
+        for job in jobs:
+            stages = {}
+            if job.trace is not None:
+                for record in job.trace.to_dict()['stages']:
+                    stages[record['stage']] = stages.get(record['stage'], 0.0) + record['seconds']
+            results.append({
+                'prompt': job.prompt,
+                'weapon': None if job in timed_out else job.result,
+                'outcome': 'timeout' if job in timed_out else self._forge_outcome(job, job.result),
+                'queued': job.started_at - job.enqueued_at if job.started_at else None,
+                'seconds': (now if job in timed_out else job.finished_at) - job.enqueued_at,
+                'stages': stages,
+            })
+        return results
+
+    def cancel_forge(self, player_id):
+        """Cancel a player's queued or running forge (e.g. they left). Returns True if one existed."""
+        with self.jobs_lock:
+            job = self.player_jobs.pop(player_id, None)
+        if job is None:
+            return False
+        job.cancel()
+        print(f"[DEBUG] AI Client: Cancelled forge for Player {player_id + 1}")
+        return True
+
+    def cancel_all(self):
+        """Cancel every queued and running forge (and speculative refines)."""
+        with self.jobs_lock:
+            player_ids = list(self.player_jobs)
+        for player_id in player_ids:
+            self.cancel_forge(player_id)
+        for speculation in list(self.speculations.values()):
+            speculation.cancel()
+
+    def prewarm(self, prompts=None, count=WARM_POOL_SIZE):
+        """Pre-forge popular and randomized weapons into the forge cache (non-blocking).
+
+        Meant to run while the lobby is shown. Warm jobs queue behind players'
+        forges, and a player who types a prompt that is being warmed waits for
+        that forge instead of starting another. Prompts already cached are
+        skipped. Returns the number of warm forges queued.
+        """
+        if not self.hackclub_key:
+            return 0  # Mock weapons are instant, nothing to warm
+        if prompts is None:
+            prompts = list(WARM_POOL_PROMPTS)
+            combos = [f"{element} {weapon}" for element in WARM_POOL_ELEMENTS for weapon in WARM_POOL_WEAPONS]
+            random.shuffle(combos)
+            prompts += combos
+        self.warm_prompts = []
+        self.warm_taken = set()
+        queued = 0
+        for prompt in prompts:
+            if len(self.warm_prompts) >= count:
+                break
+            key = normalize_prompt(prompt)
+            if any(normalize_prompt(p) == key for p in self.warm_prompts):
+                continue
+            self.warm_prompts.append(prompt)
+            if self._queue_warm(prompt):
+                queued += 1
+        if queued:
+            print(f"[DEBUG] AI Client: Warming {queued} weapons in the background")
+        return queued
+
+    def _queue_warm(self, prompt):
+        """Queue a background forge of prompt into the cache unless cached or already queued."""
+        key = normalize_prompt(prompt)
+        with self.jobs_lock:
+            if key in self.warm_jobs or self.forge_cache.contains(prompt):
+                return False
+            job = ForgeJob(prompt, None, WARM_POOL_PRIORITY)
+            job.warm = True
+            self.warm_jobs[key] = job
+            self._ensure_workers()
+        if self.engine:
+            self.engine.submit(job)
+        else:
+            self.forge_queue.put((job.priority, next(self.queue_seq), job))
+        return True
+
+    def stop_prewarm(self):
+        """Cancel warm forges that haven't finished (finished ones stay cached)."""
+        with self.jobs_lock:
+            jobs, self.warm_jobs = list(self.warm_jobs.values()), {}
+        for job in jobs:
+            job.cancel()
+            job.done.set()
+        if jobs:
+            print(f"[DEBUG] AI Client: Stopped {len(jobs)} unfinished warm forges")
+
+    def warm_pool_status(self):
+        """(ready, total) weapons in the warm pool."""
+        ready = sum(1 for p in self.warm_prompts if self.forge_cache.contains(p))
+        return ready, len(self.warm_prompts)
+
+    def take_warm_weapon(self):
+        """Weapon data for a player who ran out of time: a cached warm weapon, else a mock one."""
+        for prompt in self.warm_prompts:
+            if prompt in self.warm_taken:
+                continue
+            weapon_data = self._forge_from_cache(prompt)
+            if weapon_data is not None:
+                self.warm_taken.add(prompt)
+                return weapon_data
+        prompt = random.choice(self.warm_prompts or WARM_POOL_PROMPTS)
+        return self._generate_mock_weapon(prompt)
+
+    def _wait_for_warm(self, prompt, job=None, timeout=90.0):
+        """If this prompt is being warmed right now, wait for it to land in the cache."""
+        with self.jobs_lock:
+            warm = self.warm_jobs.get(normalize_prompt(prompt))
+            running = warm is not None and warm.state == 'running'
+        if not running:
+            return  # A queued warm job would only start after this one - just forge it
+        print(f"[DEBUG] AI Client: '{prompt}' is already being warmed, waiting for it")
+        deadline = time.time() + timeout
+        while not warm.done.wait(0.05):
+            if job is not None:
+                job.check()
+            if time.time() > deadline:
+                return
 
-        # Start forging in background thread
-        thread = threading.Thread(target=self._forge_weapon_thread, args=(prompt, player_id), daemon=True)
-        thread.start()
+    def _warm_job(self, job):
+        """Forge one warm-pool weapon straight into the cache on a worker thread."""
+        try:
+            self._run_steps(self._warm_steps(job))
+        finally:
+            self._finish_warm(job)
+
+    def _warm_steps(self, job):
+        """Stage: forge a warm-pool prompt into the cache (no mock fallback). Shared by both engines."""
+        try:
+            if (yield _call(self.forge_cache.contains, job.prompt)):
+                mark(job, cache='hit')
+                return
+            mark(job, cache='miss')
+            yield from self._forge_with_ai(job.prompt, job)
+            print(f"[DEBUG] AI Client: ✓ Warmed '{job.prompt}'")
+        except ForgeCancelled:
+            pass
+        except Exception as e:
+            print(f"[DEBUG] AI Client: ✗ Warming '{job.prompt}' failed: {e}")
+
+    def _finish_warm(self, job):
+        with self.jobs_lock:
+            key = normalize_prompt(job.prompt)
+            if self.warm_jobs.get(key) is job:
+                del self.warm_jobs[key]
+        job.done.set()
+        if job.cancelled.is_set():
+            outcome = 'cancelled'
+        else:
+            outcome = 'warmed' if self.forge_cache.contains(job.prompt) else 'failed'
+        self.telemetry.finish(job, outcome)
 
-        return True  # Indicate forging started
+    def speculate_refine(self, prompt, player_id):
+        """Start refining a prompt the player is still typing (cancellable, non-blocking).
 
-    def _forge_weapon_thread(self, prompt, player_id):
-        """Background thread for weapon forging."""
-        weapon_data = None
+        Called by the UI once typing pauses. The refined prompt lands in the
+        refine memo, so if the player submits this text the forge skips step 1;
+        a forge that starts while the speculation is in flight waits for it
+        instead of sending a duplicate request.
+        """
+        if not self.hackclub_key or not (prompt or '').strip():
+            return False
+        previous = self.speculations.get(player_id)
+        if previous is not None:
+            if normalize_prompt(previous.prompt) == normalize_prompt(prompt) and not previous.cancelled.is_set():
+                return True
+            previous.cancel()  # Player kept typing - older text is stale
+        with self.refine_lock:
+            hit = self.refine_memo.get(normalize_prompt(prompt))
+            if hit and time.time() - hit[1] < REFINE_CACHE_TTL:
+                return True
+        job = ForgeJob(prompt, player_id)
+        self.speculations[player_id] = job
+        threading.Thread(target=self._speculate, args=(job,), daemon=True).start()
+        return True
 
+    def _speculate(self, job):
+        key = normalize_prompt(job.prompt)
+        with self.refine_lock:
+            if key in self.refine_inflight:
+                return  # Someone is already refining this text
+            done = threading.Event()
+            self.refine_inflight[key] = done
         try:
+            print(f"[DEBUG] AI API: Speculatively refining '{job.prompt}' for Player {job.player_id + 1}")
+            self._run_steps(self._request_refine(job.prompt, self._hackclub_headers(), job))
+        except ForgeCancelled:
+            print(f"[DEBUG] AI API: Speculative refine of '{job.prompt}' cancelled")
+        except Exception as e:
+            print(f"[DEBUG] AI API: Speculative refine failed: {e}")
+        finally:
+            with self.refine_lock:
+                self.refine_inflight.pop(key, None)
+            done.set()
+            if self.speculations.get(job.player_id) is job:
+                del self.speculations[job.player_id]
+
+    def _wait_for_speculation(self, prompt, job=None, timeout=30.0):
+        """If this prompt is being refined speculatively, wait for it and return the result."""
+        with self.refine_lock:
+            done = self.refine_inflight.get(normalize_prompt(prompt))
+        if done is None:
+            return None
+        print(f"[DEBUG] AI API: Step 1 - Waiting for speculative refine already in flight")
+        deadline = time.time() + timeout
+        while not done.wait(0.05):
+            if job is not None:
+                job.check()
+            if time.time() > deadline:
+                return None
+        return self._memoized_refine(prompt)
+
+    def _ensure_workers(self):
+        """Start the async engine or the fixed worker pool on first use."""
+        if self.engine is not None:
+            return
+        if FORGE_ENGINE == 'async' and not self.workers:
+            from modules.forge_engine import AsyncForgeEngine
+            self.engine = AsyncForgeEngine(self, FORGE_ASYNC_CONCURRENCY)
+            return
+        while len(self.workers) < FORGE_WORKERS:
+            worker = threading.Thread(target=self._forge_worker, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def _forge_worker(self):
+        """Worker loop: take the next job and forge it."""
+        while True:
+            _, _, job = self.forge_queue.get()
+            if job.cancelled.is_set():
+                self.forge_queue.task_done()
+                continue
+            self._start_job(job)
+            try:
+                if job.warm:
+                    self._warm_job(job)
+                else:
+                    self._forge_job(job)
+            finally:
+                self.forge_queue.task_done()
+
+    def _start_job(self, job):
+        """Mark a job as taken by a worker and record how long it queued."""
+        with self.jobs_lock:
+            job.state = 'running'
+            job.started_at = time.time()
+            if not job.warm:
+                self.forge_waits.append(job.started_at - job.enqueued_at)
+        self.telemetry.begin(job)
+
+    def _forge_job(self, job):
+        """Run one forge on a worker thread."""
+        self._complete_job(job, self._run_steps(self._forge_steps(job)))
+
+    def _forge_steps(self, job):
+        """Stage: one player's forge -> weapon data (None if cancelled). Shared by both engines."""
+        prompt, owner = job.prompt, job.owner
+        try:
+            yield _call(self._wait_for_warm, prompt, job)
+            with stage(job, 'cache'):
+                weapon_data = yield _call(self._forge_from_cache, prompt, True)
+            mark(job, cache=self._cache_result(weapon_data))
+
             # Try real AI flow only if we have a HackClub API key
-            if self.hackclub_key:
+            if weapon_data is not None:
+                print(f"[DEBUG] AI Client: ✓ Forge cache hit for {owner}")
+            elif self.hackclub_key:
                 try:
-                    print(f"[DEBUG] AI Client: Attempting real AI image generation for Player {player_id + 1}...")
-                    weapon_data = self._forge_with_ai(prompt)
-                    print(f"[DEBUG] AI Client: ✓ AI image generation successful for Player {player_id + 1}!")
+                    print(f"[DEBUG] AI Client: Attempting real AI image generation for {owner}...")
+                    weapon_data = yield from self._forge_with_ai(prompt, job)
+                    print(f"[DEBUG] AI Client: ✓ AI image generation successful for {owner}!")
+                except ForgeCancelled:
+                    raise
                 except Exception as e:
-                    print(f'[DEBUG] AI Client: ✗ AI image generation failed for Player {player_id + 1}, falling back to mock: {e}')
+                    print(f'[DEBUG] AI Client: ✗ AI image generation failed for {owner}, falling back to mock: {e}')
                     weapon_data = None
             else:
-                print(f"[DEBUG] AI Client: No HackClub API key, using mock generator for Player {player_id + 1}")
+                print(f"[DEBUG] AI Client: No HackClub API key, using mock generator for {owner}")
 
             # Fallback to mock generator
             if weapon_data is None:
-                print(f"[DEBUG] AI Client: Using mock weapon generator for Player {player_id + 1}")
+                print(f"[DEBUG] AI Client: Using mock weapon generator for {owner}")
                 weapon_data = self._generate_mock_weapon(prompt)
+            return weapon_data
+        except ForgeCancelled:
+            print(f"[DEBUG] AI Client: Forge for {owner} cancelled, dropping it")
+            return None
         except Exception as e:
-            print(f"[DEBUG] AI Client: Exception in forge thread for Player {player_id + 1}: {e}")
-            weapon_data = self._generate_mock_weapon(prompt)
+            print(f"[DEBUG] AI Client: Exception in forge for {owner}: {e}")
+            return self._generate_mock_weapon(prompt)
 
-        # Store result for main thread to process
-        with self.results_lock:
-            self.pending_results.append((weapon_data, player_id))
-            self.processing_players.discard(player_id)
+    def _complete_job(self, job, weapon_data):
+        """Hand a finished forge to the main thread and release the player's slot."""
+        player_id = job.player_id
+        self.telemetry.finish(job, self._forge_outcome(job, weapon_data))
+        if job.batch:
+            with self.jobs_lock:
+                if job.cancelled.is_set():
+                    self.forges_cancelled += 1
+                else:
+                    self.forges_completed += 1
+            job.result = weapon_data
+            job.finished_at = time.time()
+            job.done.set()
+            return
+
+        # Store result for main thread to process (unless it went stale meanwhile)
+        if weapon_data is not None and not job.cancelled.is_set():
+            with self.results_lock:
+                self.pending_results.append((weapon_data, player_id, job))
+        with self.jobs_lock:
+            if self.player_jobs.get(player_id) is job:
+                del self.player_jobs[player_id]
+            if job.cancelled.is_set():
+                self.forges_cancelled += 1
+                return
+            self.forges_completed += 1
 
-        print(f"[DEBUG] AI Client: Forge process complete for Player {player_id + 1}")
+        print(f"[DEBUG] AI Client: Forge process complete for Player {player_id + 1} "
+              f"(waited {job.started_at - job.enqueued_at:.1f}s, ran {time.time() - job.started_at:.1f}s)")
+
+    def _forge_outcome(self, job, weapon_data):
+        """How a player or batch forge ended: 'ai', 'cached', 'mock' or 'cancelled'."""
+        if job.cancelled.is_set() or weapon_data is None:
+            return 'cancelled'
+        if weapon_data.get('cached'):
+            return 'cached'
+        return 'ai' if weapon_data.get('image') is not None else 'mock'
 
     def process_pending_results(self):
         """
@@ -133,64 +1084,128 @@ class AIClient:
             results_to_process = self.pending_results[:]
             self.pending_results.clear()
 
-        for weapon_data, player_id in results_to_process:
-            if self.weapon_spawned_callback and weapon_data:
+        for weapon_data, player_id, job in results_to_process:
+            if job.cancelled.is_set():
+                continue  # Cancelled or superseded after it finished
+            callback = self.weapon_spawned_callback
+            if job.placeholder and not weapon_data.get('placeholder'):
+                if weapon_data.get('image') is None:
+                    continue  # AI failed - the placeholder already has these stats
+                callback = self.weapon_upgraded_callback or callback
+            if callback and weapon_data:
                 try:
-                    self.weapon_spawned_callback(weapon_data, player_id)
+                    callback(weapon_data, player_id)
                 except Exception as e:
-                    print(f'[DEBUG] AI Client: Error in weapon_spawned_callback: {e}')
+                    print(f'[DEBUG] AI Client: Error in weapon callback: {e}')
 
-    def _save_bytes_to_file(self, bts, prompt):
-        """Save binary image bytes into GENERATED_DIR with safe filename and return path."""
+    def _placeholder_weapon(self, prompt):
+        """Mock stats plus a generated retro sprite, cheap enough to build on the main thread."""
+        weapon_data = self._generate_mock_weapon(prompt)
         try:
-            safe = ''.join(c if c.isalnum() else '_' for c in (prompt or 'weapon'))[:40]
-            ts = int(time.time())
-            fname = f"ai_{safe}_{ts}.png"
-            path = os.path.join(GENERATED_DIR, fname)
-            with open(path, 'wb') as f:
-                f.write(bts)
-            return path
+            weapon_data['image'] = create_retro_weapon_sprite(prompt, weapon_data['color'], size=weapon_data['size'])
+        except Exception:
+            pass
+        weapon_data['placeholder'] = True
+        return weapon_data
+
+    def _cache_result(self, weapon_data):
+        """'hit', 'fuzzy' or 'miss' for what _forge_from_cache returned (telemetry)."""
+        if weapon_data is None:
+            return 'miss'
+        return 'fuzzy' if 'matched_prompt' in weapon_data else 'hit'
+
+    def _forge_from_cache(self, prompt, fuzzy=False):
+        """Return weapon data for a previously forged prompt, or None.
+
+        With fuzzy, a miss falls back to the most similar cached prompt scoring
+        at least FUZZY_MATCH_THRESHOLD (and, if FUZZY_MATCH_REFRESH, the exact
+        prompt is forged in the background so the next request hits).
+        """
+        cached = self.forge_cache.get(prompt)
+        if cached is None and fuzzy and FUZZY_MATCH_THRESHOLD is not None:
+            match = self.forge_cache.nearest(prompt, FUZZY_MATCH_THRESHOLD)
+            if match is not None:
+                png_bytes, meta, score = match
+                print(f"[DEBUG] AI Client: ✓ Close match '{meta.get('prompt')}' ({score:.2f}) for '{prompt}'")
+                cached = png_bytes, dict(meta, fuzzy_score=score)
+                if FUZZY_MATCH_REFRESH and self.hackclub_key:
+                    self._queue_warm(prompt)
+        if cached is None:
+            return None
+        png_bytes, meta = cached
+        try:
+            surf = self._load_surface(png_bytes, meta.get('size'))
         except Exception as e:
-            print('Failed to save AI image to disk:', e)
+            print(f"[DEBUG] AI Client: Cached image unreadable, forging again: {e}")
             return None
+        weapon_data = {k: meta[k] for k in ('name', 'damage', 'knockback', 'size', 'speed', 'bg_removed', 'bg_has_alpha') if k in meta}
+        weapon_data['color'] = tuple(meta.get('color', YELLOW))
+        weapon_data['image'] = surf
+        weapon_data['saved_path'] = self.forge_cache.image_path(meta)
+        weapon_data['cached'] = True
+        if 'fuzzy_score' in meta:
+            weapon_data['matched_prompt'] = meta.get('prompt')
+        return weapon_data
 
-    def _forge_with_ai(self, prompt):
-        """Perform two-step AI call: refine prompt, generate image, remove bg."""
-        headers = {
-            'Authorization': f'Bearer {self.hackclub_key}',
-            'Content-Type': 'application/json'
-        }
+    def _load_surface(self, bts, size=None):
+        """Load image bytes into a pygame surface (robust against headless environments).
 
-        def _has_alpha_bytes(bts):
-            """Return True if image bytes appear to contain an alpha channel."""
+        With a size, the image is trimmed and shrunk to a size x size sprite
+        here on the worker, so the game loop never touches the full image.
+        Cached sprites are already that size; 8-bit palettized ones stay
+        8-bit (see _display_surface).
+        """
+        image_file = io.BytesIO(bts)
+        image_file.seek(0)
+        surf = pygame.image.load(image_file)
+        if size and surf.get_size() != (size, size):
+            surf = fit_weapon_sprite(surf, size)
+        return self._display_surface(surf)
+
+    def _display_surface(self, surf):
+        """Convert a surface to the display's format for fast blits (as-is without a display).
+
+        Palettized sprites only have on/off transparency, so they stay 8-bit
+        (a quarter of the memory) with an RLE colorkey: SDL run-length encodes
+        them for the screen on the first blit, skipping transparent runs, so
+        blits stay cheap without a 32-bit copy. The rest keep per-pixel alpha.
+        """
+        colorkey = surf.get_colorkey()
+        if colorkey is not None and surf.get_bitsize() == 8:
+            surf.set_colorkey(colorkey, pygame.RLEACCEL)
+            return surf
+        if pygame.display.get_surface() is None:
+            return surf  # Headless (server, tools): nothing to convert to
+        try:
+            return surf.convert_alpha()
+        except Exception:
             try:
-                img = pygame.image.load(io.BytesIO(bts))
-                # Check per-pixel alpha mask or alpha channel
-                masks = img.get_masks() if hasattr(img, 'get_masks') else (0,0,0,0)
-                has_alpha = False
-                try:
-                    if len(masks) >= 4 and masks[3] != 0:
-                        has_alpha = True
-                except Exception:
-                    pass
-                try:
-                    if img.get_alpha() is not None:
-                        has_alpha = True
-                except Exception:
-                    pass
-                try:
-                    if img.get_flags() & pygame.SRCALPHA:
-                        has_alpha = True
-                except Exception:
-                    pass
-                return has_alpha
+                return surf.convert()
             except Exception:
-                return False
+                return surf
 
-        # Step 1: refine prompt (explicit about visibility, game icon, retro style)
-        print(f"[DEBUG] AI API: Step 1 - Refining prompt...")
-        refine_payload = {
-            'model': 'qwen/qwen3-32b',
+    def _compact_sprite(self, surf):
+        """Palette-quantize a sprite if it survives it; returns (surface, png bytes, psnr or None).
+
+        The 8-bit surface is both what gets stored (as an indexed PNG) and
+        what the game draws, like a cached sprite would be.
+        """
+        if SPRITE_PALETTE_COLORS:
+            try:
+                quantized, psnr = quantize_sprite(surf, SPRITE_PALETTE_COLORS)
+                if quantized is not None and psnr >= SPRITE_MIN_PSNR:
+                    return self._display_surface(quantized), encode_indexed_png(quantized), psnr
+                print(f"[DEBUG] AI Client: Sprite kept at 32-bit (palette PSNR {psnr:.1f} dB)")
+            except Exception as e:
+                print(f"[DEBUG] AI Client: Sprite quantization failed: {e}")
+        out = io.BytesIO()
+        pygame.image.save(surf, out, 'weapon.png')
+        return surf, out.getvalue(), None
+
+    def _refine_payload(self, prompt):
+        """Chat payload for step 1 (explicit about visibility, game icon, retro style)."""
+        return {
+            'model': REFINE_MODEL,
             'messages': [
                 {
                     'role': 'user',
@@ -206,211 +1221,328 @@ class AIClient:
                 }
             ]
         }
-        resp = self._post_with_retries('https://ai.hackclub.com/proxy/v1/chat/completions', headers=headers, json=refine_payload, timeout=30)
-        if resp.status_code != 200:
-            print(f"[DEBUG] AI API: ✗ Prompt refinement failed with status {resp.status_code}")
-            raise RuntimeError(f'HackClub refine error: {resp.status_code} {resp.text}')
-        print(f"[DEBUG] AI API: ✓ Prompt refinement successful (status {resp.status_code})")
-        refined = resp.json()
-        specific_prompt = None
-        try:
-            specific_prompt = refined['choices'][0]['message']['content']
-            print(f"[DEBUG] AI API: Refined prompt = '{specific_prompt[:100]}...'")
-        except Exception:
-            specific_prompt = prompt
-            print(f"[DEBUG] AI API: Could not parse refined prompt, using original")
 
-        # Step 2: request image generation (model that supports image)
-        print(f"[DEBUG] AI API: Step 2 - Generating image...")
-        image_payload = {
-            'model': 'google/gemini-2.5-flash-image',
-            'messages': [
-                {
-                    'role': 'user',
-                    'content': (
-                        f"Create a 32-bit PNG image for the following prompt: {specific_prompt}. "
-                        "Constraints: output a single square PNG with TRANSPARENT BACKGROUND, pixel-art / retro aesthetic, "
-                        "no text in image, centered composition, clean silhouette. This will be used as an in-game ICON — make the weapon fully visible and legible at icon size. "
-                        "Return the image inline as base64 (data URL or b64_json) if possible."
-                    )
-                }
-            ],
+    def _image_payload(self, specific_prompt, fallback=False):
+        """Chat payload for step 2; the fallback wording is used for the one retry."""
+        if fallback:
+            content = (
+                f"Retro pixel-art icon sprite of: {specific_prompt}. "
+                "Return a single square PNG with TRANSPARENT BACKGROUND, centered weapon, no text, low color palette, sprite-style. Make it fully visible and readable as an in-game icon."
+            )
+        else:
+            content = (
+                f"Create a 32-bit PNG image for the following prompt: {specific_prompt}. "
+                "Constraints: output a single square PNG with TRANSPARENT BACKGROUND, pixel-art / retro aesthetic, "
+                "no text in image, centered composition, clean silhouette. This will be used as an in-game ICON — make the weapon fully visible and legible at icon size. "
+                "Return the image inline as base64 (data URL or b64_json) if possible."
+            )
+        return {
+            'model': IMAGE_MODEL,
+            'messages': [{'role': 'user', 'content': content}],
             'modalities': ['image', 'text'],
             'image_config': {'aspect_ratio': '1:1', 'size': '512x512'}
         }
-        resp2 = self._post_with_retries('https://ai.hackclub.com/proxy/v1/chat/completions', headers=headers, json=image_payload, timeout=90)
-        if resp2.status_code != 200:
-            print(f"[DEBUG] AI API: ✗ Image generation failed with status {resp2.status_code}")
-            raise RuntimeError(f'HackClub image error: {resp2.status_code} {resp2.text}')
-        print(f"[DEBUG] AI API: ✓ Image generation request successful (status {resp2.status_code})")
-        out = resp2.json()
-
-        # Parse image data - support base64 inline, b64_json, or returned URL
-        image_bytes = None
-        # 1) data URL (data:image/...) or http URL in image_url.url
+
+    def _hackclub_headers(self):
+        return {
+            'Authorization': f'Bearer {self.hackclub_key}',
+            'Content-Type': 'application/json'
+        }
+
+    def _memoized_refine(self, prompt):
+        """Refined prompt from the memo if still fresh, else None."""
+        with self.refine_lock:
+            hit = self.refine_memo.get(normalize_prompt(prompt))
+            if hit and time.time() - hit[1] < REFINE_CACHE_TTL:
+                print(f"[DEBUG] AI API: Step 1 - Using memoized refined prompt")
+                return hit[0]
+        return None
+
+    def _parse_refined(self, refined, prompt):
+        """Pull the refined prompt out of the step 1 response and memoize it."""
         try:
-            images_info = out['choices'][0]['message'].get('images')
-            if images_info and len(images_info) > 0:
-                info = images_info[0]
-                image_url_field = info.get('image_url')
-                if isinstance(image_url_field, dict):
-                    image_url = image_url_field.get('url')
-                else:
-                    image_url = image_url_field
-
-                if isinstance(image_url, str) and image_url.startswith('data:image'):
-                    base64_data = image_url.split(',', 1)[1]
-                    image_bytes = base64.b64decode(base64_data)
-                elif isinstance(image_url, str) and image_url.startswith('http'):
-                    # Download the image with retries
-                    last_exc = None
-                    for attempt in range(2):
-                        try:
-                            r = requests.get(image_url, timeout=30)
-                            if r.status_code == 200:
-                                image_bytes = r.content
-                                break
-                        except Exception as e:
-                            last_exc = e
-                            time.sleep(1.5 * (attempt + 1))
-                    if image_bytes is None and last_exc:
-                        raise last_exc
+            specific_prompt = refined['choices'][0]['message']['content']
+            print(f"[DEBUG] AI API: Refined prompt = '{specific_prompt[:100]}...'")
         except Exception:
-            image_bytes = None
+            print(f"[DEBUG] AI API: Could not parse refined prompt, using original")
+            return prompt  # Don't memoize a failed refinement
+
+        with self.refine_lock:
+            self.refine_memo[normalize_prompt(prompt)] = (specific_prompt, time.time())
+            if len(self.refine_memo) > REFINE_CACHE_MAX_ENTRIES:
+                # Drop the oldest half rather than trimming on every insert
+                for old_key, _ in sorted(self.refine_memo.items(), key=lambda item: item[1][1])[:len(self.refine_memo) // 2]:
+                    del self.refine_memo[old_key]
+        return specific_prompt
+
+    def _refine_prompt(self, prompt, headers, job=None):
+        """Stage: turn the player's prompt into a detailed image prompt (step 1 of the forge).
+
+        Results are memoized per normalized prompt for REFINE_CACHE_TTL seconds,
+        so image-stage retries and repeat forges skip the LLM round trip.
+        """
+        memoized = self._memoized_refine(prompt)
+        if memoized is not None:
+            mark(job, refine='memo')
+            return memoized
+        memoized = yield _call(self._wait_for_speculation, prompt, job)
+        if memoized is not None:
+            mark(job, refine='speculative')
+            return memoized
+        mark(job, refine='request')
+        return (yield from self._request_refine(prompt, headers, job))
+
+    def _request_refine(self, prompt, headers, job=None):
+        """Stage: send the step 1 refine request and memoize its result."""
+        print(f"[DEBUG] AI API: Step 1 - Refining prompt...")
+        with stage(job, 'refine') as record:
+            status, body = yield from self._post_with_retries('refine', self.chat_url, job, 30, headers=headers,
+                                                              json=self._refine_payload(prompt))
+            record['bytes'] = len(body)
+        if status != 200:
+            print(f"[DEBUG] AI API: ✗ Prompt refinement failed with status {status}")
+            raise RuntimeError(f'HackClub refine error: {status} {body[:200]!r}')
+        print(f"[DEBUG] AI API: ✓ Prompt refinement successful (status {status})")
+        return self._parse_refined(json.loads(body), prompt)
+
+    def _extract_image(self, out):
+        """Find the image in an image-generation response (see extract_image)."""
+        return extract_image(out)
+
+    def _image_from_body(self, body):
+        """(image bytes, image URL) from a raw image-generation response body."""
+        return self._extract_image(json.loads(body))
 
-        # 2) b64_json field
-        if image_bytes is None:
+    def _download_image(self, image_url, job=None):
+        """Stage: download an image URL with retries -> bytes or None."""
+        last_exc = None
+        for attempt in range(2):
             try:
-                b64 = out['choices'][0]['message']['images'][0].get('b64_json')
-                if b64:
-                    image_bytes = base64.b64decode(b64)
-            except Exception:
-                image_bytes = None
+                with stage(job, 'download') as record:
+                    status, body = yield from self._request('download', 'GET', image_url, job, 30)
+                    record['bytes'] = len(body)
+                if status == 200:
+                    return body
+            except (ForgeCancelled, UpstreamUnavailable):
+                raise
+            except Exception as e:
+                last_exc = e
+                note_retry(job)
+                yield _sleep(job, 1.5 * (attempt + 1))
+        if last_exc:
+            raise last_exc
+        return None
 
-        # 3) search entire response for first data:image occurrence
-        if image_bytes is None:
+    def _has_alpha_bytes(self, bts):
+        """Return True if image bytes appear to contain an alpha channel."""
+        try:
+            img = pygame.image.load(io.BytesIO(bts))
+            # Check per-pixel alpha mask or alpha channel
+            masks = img.get_masks() if hasattr(img, 'get_masks') else (0,0,0,0)
+            has_alpha = False
             try:
-                txt = str(out)
-                idx = txt.find('data:image')
-                if idx != -1:
-                    start = txt.find(',', idx) + 1
-                    end = txt.find("'", start)
-                    if end == -1:
-                        end = len(txt)
-                    b64data = txt[start:end]
-                    image_bytes = base64.b64decode(b64data)
+                if len(masks) >= 4 and masks[3] != 0:
+                    has_alpha = True
             except Exception:
-                image_bytes = None
-
-        if image_bytes is None:
-            # Try one fallback image-generation attempt with a very explicit prompt
+                pass
             try:
-                fallback_prompt = (
-                    f"Retro pixel-art icon sprite of: {specific_prompt}. "
-                    "Return a single square PNG with TRANSPARENT BACKGROUND, centered weapon, no text, low color palette, sprite-style. Make it fully visible and readable as an in-game icon."
-                )
-                image_payload['messages'][0]['content'] = fallback_prompt
-                resp3 = self._post_with_retries('https://ai.hackclub.com/proxy/v1/chat/completions', headers=headers, json=image_payload, timeout=90)
-                if resp3.status_code == 200:
-                    out2 = resp3.json()
-                    # attempt same extraction logic on out2
-                    try:
-                        images_info = out2['choices'][0]['message'].get('images')
-                        if images_info and len(images_info) > 0:
-                            info = images_info[0]
-                            image_url_field = info.get('image_url')
-                            if isinstance(image_url_field, dict):
-                                image_url = image_url_field.get('url')
-                            else:
-                                image_url = image_url_field
-                            if isinstance(image_url, str) and image_url.startswith('data:image'):
-                                base64_data = image_url.split(',', 1)[1]
-                                image_bytes = base64.b64decode(base64_data)
-                            elif isinstance(image_url, str) and image_url.startswith('http'):
-                                r = requests.get(image_url, timeout=30)
-                                if r.status_code == 200:
-                                    image_bytes = r.content
-                    except Exception:
-                        # If parsing the fallback response fails, ensure we don't crash
-                        image_bytes = None
+                if img.get_alpha() is not None:
+                    has_alpha = True
             except Exception:
-                image_bytes = None
-            if image_bytes is None:
-                raise RuntimeError('Could not extract image from AI response')
+                pass
+            try:
+                if img.get_flags() & pygame.SRCALPHA:
+                    has_alpha = True
+            except Exception:
+                pass
+            return has_alpha
+        except Exception:
+            return False
+
+    def _finish_forge(self, prompt, final_bytes, bg_removed, bg_has_alpha, job=None):
+        """Shrink, quantize, save and cache the final image; returns the weapon data dict."""
+        # Decode, trim and downscale to the weapon's render size here on the worker
+        base = self._generate_mock_weapon(prompt)
+        try:
+            with stage(job, 'decode') as record:
+                record['bytes'] = len(final_bytes)
+                surf = self._load_surface(final_bytes, base['size'])
+        except Exception as e:
+            raise RuntimeError('Failed to load image into pygame surface: ' + str(e))
+        with stage(job, 'quantize') as record:
+            surf, sprite_bytes, psnr = self._compact_sprite(surf)
+            record['bytes'] = len(sprite_bytes)
+
+        # Now create a weapon data dict enriched with the image
+        base['image'] = surf
+        base['name'] = base.get('name', prompt)
+        base['bg_removed'] = bg_removed
+        base['bg_has_alpha'] = bg_has_alpha
+        if psnr is not None:
+            base['palette_psnr'] = round(psnr, 1)
+
+        # Store the sprite (deduplicated by content) and remember the forge for repeat prompts
+        meta = {k: v for k, v in base.items() if k != 'image'}
+        with stage(job, 'store'):
+            saved_path = self.forge_cache.put(prompt, sprite_bytes, meta)
+        if saved_path:
+            base['saved_path'] = saved_path
+            print('Saved AI image to:', saved_path)
+        return base
+
+    def _forge_with_ai(self, prompt, job=None):
+        """Stage: two-step AI forge - refine prompt, generate image, remove bg.
+
+        With a job, cancellation is checked between stages and in-flight
+        requests are aborted (raises ForgeCancelled).
+        """
+        check = job.check if job is not None else (lambda: None)
+        headers = self._hackclub_headers()
+
+        # Step 1: refine prompt (memoized separately from the finished image)
+        specific_prompt = yield from self._refine_prompt(prompt, headers, job)
+        check()
 
-        # Optionally remove background via remove.bg
+        # Step 2: request image generation (model that supports image)
+        print(f"[DEBUG] AI API: Step 2 - Generating image...")
+        image_bytes = yield from self._generate_image(specific_prompt, headers, job)
+
+        # Remove a flat background locally; remove.bg only for images that can't be cut here
+        check()
         final_bytes = image_bytes
         bg_removed = False
-        bg_has_alpha = False
-        try:
-            bg_has_alpha = _has_alpha_bytes(image_bytes)
-        except Exception:
-            bg_has_alpha = False
+        bg_has_alpha = yield _call(self._has_alpha_bytes, image_bytes)
 
-        if self.removebg_key and not bg_has_alpha:
+        if BG_REMOVE_LOCAL and not bg_has_alpha:
+            with stage(job, 'bg_local') as record:
+                local_bytes = yield _call(remove_background_bytes, image_bytes)
+                record['bytes'] = len(local_bytes or b'')
+            if local_bytes is not None:
+                print(f"[DEBUG] AI API: ✓ Background removed locally")
+                final_bytes = local_bytes
+                bg_removed = True
+
+        if self.removebg_key and not bg_has_alpha and not bg_removed:
             # Use a filename + content-type when posting to remove.bg
             remove_attempts = 2
             for attempt in range(remove_attempts):
+                check()
                 try:
-                    files = {
-                        'image_file': ('ai_image.png', io.BytesIO(image_bytes), 'image/png')
-                    }
-                    r = self._post_with_retries(
-                        'https://api.remove.bg/v1.0/removebg',
-                        files=files,
-                        data={'size': 'auto'},
-                        headers={'X-Api-Key': self.removebg_key},
-                        timeout=30
-                    )
-                    if r.status_code == 200:
-                        final_bytes = r.content
+                    with stage(job, 'removebg') as record:
+                        status, body = yield from self._post_with_retries(
+                            'removebg', self.removebg_url, job, 30,
+                            headers={'X-Api-Key': self.removebg_key},
+                            upload=('image_file', 'ai_image.png', image_bytes, 'image/png'),
+                            data={'size': 'auto'}
+                        )
+                        record['bytes'] = len(body)
+                    if status == 200:
+                        final_bytes = body
                         bg_removed = True
                         break
                     else:
                         # If remove.bg says invalid file type, stop retrying
-                        print('remove.bg failed:', r.status_code, r.text)
-                        if r.status_code in (400, 415):
+                        print('remove.bg failed:', status, body[:200])
+                        if status in (400, 415):
                             break
+                except ForgeCancelled:
+                    raise
+                except UpstreamUnavailable as e:
+                    print('remove.bg skipped:', e)
+                    break
                 except Exception as e:
                     print('remove.bg call failed (attempt', attempt + 1, '):', e)
-                    time.sleep(1.5 * (attempt + 1))
+                    yield _sleep(job, 1.5 * (attempt + 1))
             # If remove.bg failed but original had alpha, consider background removed
             if not bg_removed and bg_has_alpha:
                 bg_removed = True
 
-        # Save the final bytes to disk for inspection
-        saved_path = None
-        try:
-            saved_path = self._save_bytes_to_file(final_bytes, prompt)
-            if saved_path:
-                print('Saved AI image to:', saved_path)
-        except Exception as e:
-            print('Failed to save final AI bytes:', e)
+        check()
+        return (yield _call(self._finish_forge, prompt, final_bytes, bg_removed, bg_has_alpha, job))
+
+    def _generate_image(self, specific_prompt, headers, job=None):
+        """Stage: image bytes for a refined prompt; raises if no image could be had.
+
+        The explicit fallback prompt is tried when the first response has no
+        image. With hedging, it is also fired early when the first request
+        runs past the recent latency threshold, and the first image back wins.
+        Each attempt runs under its own job so the loser can be cancelled.
+        """
+        delay = threshold = self.hedging.delay()
+        start = time.time()
+        attempts = {}  # {handle: (attempt job, fallback)}
+
+        def _attempt(fallback):
+            attempt = ForgeJob(specific_prompt, job.player_id if job is not None else None)
+            attempt.trace = job.trace if job is not None else None  # Attempts report into the forge's trace
+            return attempt, _spawn(attempt, self._image_attempt(specific_prompt, headers, attempt, fallback))
 
-        # Load into pygame surface (robust against headless environments)
+        hedged = False
+        error = None
         try:
-            image_file = io.BytesIO(final_bytes)
-            image_file.seek(0)
-            surf = pygame.image.load(image_file)
+            attempt, op = _attempt(False)
+            handle = yield op
+            attempts[handle] = (attempt, False)
+            pending = {handle}
+            while pending:
+                done = yield _wait(job, pending, delay)
+                delay = None  # Only the first wait can run into the hedge threshold
+                if not done:
+                    if self.hedging.take():
+                        print(f"[DEBUG] AI API: Image request slower than {threshold:.1f}s, hedging with the fallback prompt")
+                        hedged = True
+                        attempt, op = _attempt(True)
+                        handle = yield op
+                        attempts[handle] = (attempt, True)
+                        pending.add(handle)
+                    continue
+                pending -= done
+                for handle in done:
+                    fallback = attempts[handle][1]
+                    exc = handle.exception()
+                    if exc is None and handle.result() is not None:
+                        self.hedging.record(time.time() - start, hedge_won=fallback and hedged)
+                        return handle.result()
+                    if fallback:
+                        continue  # A failed fallback never fails the forge on its own
+                    error = exc
+                    if len(attempts) == 1:
+                        if exc is not None:
+                            raise exc
+                        # No image in the response: try once more with a very explicit prompt
+                        attempt, op = _attempt(True)
+                        handle = yield op
+                        attempts[handle] = (attempt, True)
+                        pending.add(handle)
+        finally:
+            for attempt, _ in attempts.values():
+                attempt.cancel()
+        if error is not None:
+            raise error
+        raise RuntimeError('Could not extract image from AI response')
+
+    def _image_attempt(self, specific_prompt, headers, job, fallback=False):
+        """Stage: one image-generation request -> image bytes, or None if the response had none."""
+        with stage(job, 'image_fallback' if fallback else 'image') as record:
+            status, body = yield from self._post_with_retries('image', self.chat_url, job, 90, headers=headers,
+                                                              json=self._image_payload(specific_prompt, fallback=fallback))
+            record['bytes'] = len(body)
+        if status != 200:
+            if not fallback:
+                print(f"[DEBUG] AI API: ✗ Image generation failed with status {status}")
+            raise RuntimeError(f'HackClub image error: {status} {body[:200]!r}')
+        if not fallback:
+            print(f"[DEBUG] AI API: ✓ Image generation request successful (status {status})")
+
+        image_bytes, image_url = yield _call(self._image_from_body, body)
+        if image_bytes is None and image_url:
             try:
-                surf = surf.convert_alpha()
+                image_bytes = yield from self._download_image(image_url, job)
+            except ForgeCancelled:
+                raise
             except Exception:
-                try:
-                    surf = surf.convert()
-                except Exception:
-                    pass
-        except Exception as e:
-            raise RuntimeError('Failed to load image into pygame surface: ' + str(e))
-
-        # Now create a weapon data dict enriched with the image
-        base = self._generate_mock_weapon(prompt)
-        base['image'] = surf
-        base['name'] = base.get('name', prompt)
-        if saved_path:
-            base['saved_path'] = saved_path
-        base['bg_removed'] = bg_removed
-        base['bg_has_alpha'] = bg_has_alpha
-        return base
+                image_bytes = None
+        return image_bytes
 
     def _generate_mock_weapon(self, prompt):
         """
@@ -491,3 +1623,28 @@ class AIClient:
             'color': color
         }
 
+
+def batch_report(results, elapsed):
+    """Throughput and latency distribution of a forge_batch() run that took elapsed seconds.
+
+    Cache hits would inflate both, so forges_per_minute and the percentiles
+    only count forges that ran the pipeline ('ai', 'mock', 'cancelled');
+    hits are reported on their own as 'cached' / 'cached_p50'.
+    """
+    seconds = [r['seconds'] for r in results if r['outcome'] not in ('timeout', 'cached')]
+    cached = [r['seconds'] for r in results if r['outcome'] == 'cached']
+    outcomes = {}
+    for r in results:
+        outcomes[r['outcome']] = outcomes.get(r['outcome'], 0) + 1
+    return {
+        'forges': len(results),
+        'elapsed': elapsed,
+        'forges_per_minute': len(seconds) / elapsed * 60 if elapsed > 0 else 0.0,
+        'p50': percentile(seconds, 50),
+        'p90': percentile(seconds, 90),
+        'p99': percentile(seconds, 99),
+        'max': max(seconds) if seconds else 0.0,
+        'cached': len(cached),
+        'cached_p50': percentile(cached, 50),
+        'outcomes': outcomes,
+    }
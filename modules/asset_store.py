@@ -0,0 +1,202 @@
+# modules/asset_store.py
+# Asset Store - content-addressed store for generated weapon images
+#
+# Each image is saved once as <sha256>.png, however many prompts produced it.
+# index.json records per asset the prompts that produced it, the weapon
+# stats, size, and created / last-used times, so old images can be found
+# again. Total size is capped; least recently used assets are evicted.
+# Images saved before the store existed (ai_<prompt>_<timestamp>.png) are
+# indexed where they are on first scan, so they count towards the cap too.
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from modules.prompt_index import normalize_prompt
+
+INDEX_FILE = 'index.json'
+INDEX_SAVE_INTERVAL = 5.0  # seconds between index writes caused only by last-used updates
+LEGACY_FILE = re.compile(r'^ai_(.+)_(\d+)\.png$')  # Pre-store saves: ai_<prompt>_<unix time>.png
+
+
+class AssetStore:
+    """Deduplicated, size-capped image store with a JSON index."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.assets = {}  # {hash: {'prompts', 'stats', 'size', 'created', 'last_used'[, 'file']}}
+        self.by_prompt = {}  # {normalized prompt: hash} of the latest asset for each prompt
+        self.on_evict = None  # callback(hash) after an asset is evicted
+        self.dirty = False
+        self.saved_at = 0.0
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self._load_index()
+            self._import_legacy()
+        except Exception as e:
+            print(f"✗ Asset store unavailable: {e}")
+
+    def _index_path(self):
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                assets = json.load(f).get('assets', {})
+        except (OSError, ValueError):
+            assets = {}
+        for digest, entry in assets.items():
+            if not os.path.exists(self._entry_path(digest, entry)):
+                continue  # Deleted behind our back
+            self.assets[digest] = entry
+            for prompt in entry.get('prompts', []):
+                self.by_prompt[normalize_prompt(prompt)] = digest
+
+    def _import_legacy(self):
+        """Index ai_<prompt>_<timestamp>.png files in place (once; they're in the index afterwards)."""
+        known = {entry['file'] for entry in self.assets.values() if 'file' in entry}
+        imported = 0
+        with self.lock:
+            for name in sorted(os.listdir(self.directory)):
+                match = LEGACY_FILE.match(name)
+                if match is None or name in known:
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    with open(path, 'rb') as f:
+                        digest = hashlib.sha256(f.read()).hexdigest()
+                    if digest in self.assets:
+                        os.remove(path)  # Same image already stored under its hash
+                        continue
+                except OSError:
+                    continue
+                prompt, created = match.group(1).replace('_', ' '), float(match.group(2))
+                self.assets[digest] = {'prompts': [prompt], 'stats': {}, 'size': os.path.getsize(path),
+                                       'created': created, 'last_used': created, 'file': name}
+                self.by_prompt.setdefault(normalize_prompt(prompt), digest)  # Newer forges win
+                imported += 1
+            if imported:
+                self._evict()
+                self._save_index()
+        if imported:
+            print(f"✓ Asset store: indexed {imported} older generated image(s)")
+
+    def _save_index(self, force=True):
+        """Write index.json atomically (throttled unless forced); caller holds the lock."""
+        if not force and time.time() - self.saved_at < INDEX_SAVE_INTERVAL:
+            self.dirty = True
+            return
+        tmp = self._index_path() + '.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'version': 1, 'assets': self.assets}, f)
+            os.replace(tmp, self._index_path())
+            self.dirty = False
+            self.saved_at = time.time()
+        except Exception as e:
+            print(f"✗ Asset index write failed: {e}")
+
+    def path(self, digest):
+        """File path of an asset."""
+        return self._entry_path(digest, self.assets.get(digest))
+
+    def _entry_path(self, digest, entry):
+        return os.path.join(self.directory, entry.get('file', digest + '.png') if entry else digest + '.png')
+
+    def has(self, digest):
+        return digest in self.assets
+
+    def find(self, prompt):
+        """Hash of the latest asset forged from this prompt, or None."""
+        return self.by_prompt.get(normalize_prompt(prompt))
+
+    def put(self, png_bytes, prompt=None, stats=None):
+        """Store image bytes (once per content) and record the prompt; returns the hash."""
+        digest = hashlib.sha256(png_bytes).hexdigest()
+        now = time.time()
+        with self.lock:
+            entry = self.assets.get(digest)
+            if entry is None:
+                path = self.path(digest)
+                try:
+                    with open(path + '.tmp', 'wb') as f:
+                        f.write(png_bytes)
+                    os.replace(path + '.tmp', path)
+                except Exception as e:
+                    print(f"✗ Asset write failed: {e}")
+                    return None
+                entry = {'prompts': [], 'stats': {}, 'size': len(png_bytes), 'created': now}
+                self.assets[digest] = entry
+            entry['last_used'] = now
+            if stats:
+                entry['stats'] = stats
+            if prompt and prompt not in entry['prompts']:
+                entry['prompts'].append(prompt)
+            if prompt:
+                self.by_prompt[normalize_prompt(prompt)] = digest
+            self._evict(keep=digest)
+            self._save_index()
+        return digest
+
+    def get(self, digest):
+        """Image bytes for a hash (marks it used), or None."""
+        with self.lock:
+            entry = self.assets.get(digest)
+            if entry is None:
+                return None
+            try:
+                with open(self.path(digest), 'rb') as f:
+                    png_bytes = f.read()
+            except OSError:
+                self._remove(digest)
+                self._save_index()
+                return None
+            entry['last_used'] = time.time()
+            self._save_index(force=False)
+        return png_bytes
+
+    def _evict(self, keep=None):
+        total = sum(entry['size'] for entry in self.assets.values())
+        if total <= self.max_bytes:
+            return
+        for digest, entry in sorted(self.assets.items(), key=lambda item: item[1].get('last_used', 0)):
+            if total <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            self._remove(digest)
+            total -= entry['size']
+
+    def _remove(self, digest):
+        entry = self.assets.pop(digest, None)
+        if entry is None:
+            return
+        path = self._entry_path(digest, entry)
+        for prompt in entry.get('prompts', []):
+            key = normalize_prompt(prompt)
+            if self.by_prompt.get(key) == digest:
+                del self.by_prompt[key]
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        if self.on_evict:
+            self.on_evict(digest)
+
+    def flush(self):
+        """Write pending last-used updates to the index."""
+        with self.lock:
+            if self.dirty:
+                self._save_index()
+
+    @property
+    def size_bytes(self):
+        with self.lock:
+            return sum(entry['size'] for entry in self.assets.values())
+
+    def stats(self):
+        return {'assets': len(self.assets), 'bytes': self.size_bytes, 'prompts': len(self.by_prompt)}
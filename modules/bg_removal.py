@@ -0,0 +1,103 @@
+# modules/bg_removal.py
+# Background Removal - local flood-fill matting for AI weapon sprites
+#
+# The image prompts ask for an isolated sprite on a flat background, so the
+# background is whatever colour dominates the border. Pixels close to that
+# colour and connected to the border are made transparent (pygame.mask does
+# the thresholding and flood fill in C), specks are dropped and the one-pixel
+# fringe next to the background is softened. Images whose border isn't flat
+# are left alone so the caller can fall back to remove.bg.
+
+import io
+from collections import Counter
+import pygame
+from settings import *
+
+
+def _border_pixels(surf):
+    w, h = surf.get_size()
+    step = max(1, min(w, h) // 64)  # ~256 samples is plenty to find the background
+    for x in range(0, w, step):
+        yield x, 0
+        yield x, h - 1
+    for y in range(0, h, step):
+        yield 0, y
+        yield w - 1, y
+
+
+def _background_color(surf):
+    """Dominant border colour and the fraction of border samples that match it."""
+    samples = [surf.get_at(pos)[:3] for pos in _border_pixels(surf)]
+    # Bucket to 16 levels per channel so JPEG-ish noise still votes together
+    buckets = Counter((r >> 4, g >> 4, b >> 4) for r, g, b in samples)
+    bucket, count = buckets.most_common(1)[0]
+    members = [c for c in samples if (c[0] >> 4, c[1] >> 4, c[2] >> 4) == bucket]
+    color = tuple(sum(c[i] for c in members) // len(members) for i in range(3))
+    return color, count / len(samples)
+
+
+def remove_background(surf, threshold=BG_REMOVE_THRESHOLD):
+    """Return a per-pixel-alpha copy of surf with its flat background cut out, or None.
+
+    None means the border isn't a flat colour (or nearly everything would be
+    removed), i.e. this image needs a real matting service.
+    """
+    w, h = surf.get_size()
+    if w < 3 or h < 3:
+        return None
+    rgba = pygame.Surface((w, h), pygame.SRCALPHA, 32)
+    rgba.blit(surf, (0, 0))
+
+    color, coverage = _background_color(rgba)
+    if coverage < BG_REMOVE_MIN_BORDER:
+        return None
+
+    # Everything close to the background colour...
+    similar = pygame.mask.from_threshold(rgba, (*color, 255), (threshold, threshold, threshold, 255))
+    # ...that is connected to the border (pixels of that colour inside the weapon stay)
+    background = pygame.mask.Mask((w, h))
+    for pos in _border_pixels(rgba):
+        if similar.get_at(pos) and not background.get_at(pos):
+            background.draw(similar.connected_component(pos), (0, 0))
+
+    removed = background.count() / (w * h)
+    if removed < 0.02 or removed > 0.97:
+        return None
+
+    # Drop specks of leftover background noise
+    foreground = background.copy()
+    foreground.invert()
+    kept = pygame.mask.Mask((w, h))
+    for component in foreground.connected_components(BG_REMOVE_MIN_SPECK):
+        kept.draw(component, (0, 0))
+    background = kept.copy()
+    background.invert()
+
+    # Fringe: foreground pixels touching the background get half alpha (hides colour halos)
+    interior = kept.copy()
+    for offset in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+        interior.erase(background, offset)
+    fringe = kept.copy()
+    fringe.erase(interior, (0, 0))
+
+    alpha = pygame.Surface((w, h), pygame.SRCALPHA, 32)
+    alpha.fill((255, 255, 255, 255))
+    fringe.to_surface(alpha, setcolor=(255, 255, 255, 128), unsetcolor=None)
+    background.to_surface(alpha, setcolor=(255, 255, 255, 0), unsetcolor=None)
+    rgba.blit(alpha, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
+    return rgba
+
+
+def remove_background_bytes(image_bytes, threshold=BG_REMOVE_THRESHOLD):
+    """remove_background() on encoded image bytes; returns PNG bytes or None."""
+    try:
+        surf = pygame.image.load(io.BytesIO(image_bytes))
+        cut = remove_background(surf, threshold)
+        if cut is None:
+            return None
+        out = io.BytesIO()
+        pygame.image.save(cut, out, 'weapon.png')
+        return out.getvalue()
+    except Exception as e:
+        print(f"✗ Local background removal failed: {e}")
+        return None
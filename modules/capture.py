@@ -0,0 +1,104 @@
+# modules/capture.py
+# Network traffic capture - compact binary log of every framed message
+#
+# File layout:
+#   header: b'PWCAP' | u8 format version | u8 protocol version | u8 role (0 client, 1 server)
+#   record: f64 seconds since capture start | u8 direction (0 in, 1 out) | u16 connection id
+#           | u16 body length | frame body (exactly what protocol.decode_body() takes)
+#
+# Direct P2P datagrams (UDP) are recorded with connection id CONN_PEER; their
+# body is the frame without the sequence number and length prefix.
+#
+# Used by GameClient/GameServer(capture_path=...) and replay_capture.py.
+
+import struct
+import threading
+import time
+from modules.protocol import PROTOCOL_VERSION
+
+CAPTURE_MAGIC = b'PWCAP'
+CAPTURE_FORMAT_VERSION = 1
+
+DIRECTION_IN = 0
+DIRECTION_OUT = 1
+
+ROLE_CLIENT = 0
+ROLE_SERVER = 1
+
+CONN_PEER = 0xFFFF  # Connection id of a client's direct P2P link
+
+_HEADER = struct.Struct('!5sBBB')
+_RECORD = struct.Struct('!dBHH')
+
+
+class CaptureWriter:
+    """Append framed messages with timestamps to a capture file (thread-safe)."""
+
+    def __init__(self, path, role):
+        self.path = path
+        self.role = role
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+        self.records = 0
+        self.file = open(path, 'wb')
+        self.file.write(_HEADER.pack(CAPTURE_MAGIC, CAPTURE_FORMAT_VERSION, PROTOCOL_VERSION, role))
+        print(f"✓ Capturing network traffic to {path}")
+
+    def record(self, direction, body, conn_id=0):
+        """Record one frame body (without its length prefix)."""
+        timestamp = time.perf_counter() - self.start_time
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(_RECORD.pack(timestamp, direction, conn_id, len(body)))
+            self.file.write(body)
+            self.records += 1
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+                print(f"✓ Capture saved: {self.path} ({self.records} frames)")
+
+
+class CaptureReader:
+    """Iterate the records of a capture file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        if len(self.data) < _HEADER.size:
+            raise ValueError(f'{path} is not a capture file (too short)')
+        magic, fmt_version, self.protocol_version, self.role = _HEADER.unpack_from(self.data, 0)
+        if magic != CAPTURE_MAGIC:
+            raise ValueError(f'{path} is not a capture file')
+        if fmt_version != CAPTURE_FORMAT_VERSION:
+            raise ValueError(f'Unsupported capture format version {fmt_version}')
+
+    def __iter__(self):
+        """Yield (timestamp, direction, conn_id, body) tuples in recorded order."""
+        data = self.data
+        offset = _HEADER.size
+        while offset + _RECORD.size <= len(data):
+            timestamp, direction, conn_id, length = _RECORD.unpack_from(data, offset)
+            offset += _RECORD.size
+            if offset + length > len(data):
+                break  # Truncated final record (capture not closed cleanly)
+            yield timestamp, direction, conn_id, data[offset:offset + length]
+            offset += length
+
+    def client_frames(self):
+        """Frames the client(s) sent to the server, whichever side recorded the capture."""
+        sent_by_client = DIRECTION_OUT if self.role == ROLE_CLIENT else DIRECTION_IN
+        return [r for r in self if r[1] == sent_by_client and r[2] != CONN_PEER]
+
+    def server_frames(self):
+        """Frames the server sent, whichever side recorded the capture."""
+        sent_by_server = DIRECTION_IN if self.role == ROLE_CLIENT else DIRECTION_OUT
+        return [r for r in self if r[1] == sent_by_server and r[2] != CONN_PEER]
+
+    def peer_frames(self):
+        """Direct P2P datagrams a client capture recorded, both directions."""
+        return [r for r in self if r[2] == CONN_PEER]
@@ -0,0 +1,118 @@
+# modules/circuit_breaker.py
+# Circuit Breaker - health tracking for the AI HTTP calls, per upstream and call kind
+#
+# Every call records success/failure and latency in the sliding window of its
+# (host, kind) breaker - refine, image, download and remove.bg calls each
+# have their own, since their latencies differ by an order of magnitude.
+# When the error rate or median latency goes bad the breaker opens and calls
+# fail at once (the forge falls back to the mock weapon instead of sitting
+# through retries). While open, a background thread probes the failing
+# endpoint every CIRCUIT_OPEN_SECONDS and closes the breaker once it answers.
+
+import time
+import threading
+from collections import deque
+from settings import *
+
+
+class UpstreamUnavailable(RuntimeError):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+def percentile(values, pct):
+    """pct-th percentile (0-100) of a list of numbers, nearest-rank."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+class CircuitBreaker:
+    """Closed / open state for one kind of call to one upstream, driven by recent calls."""
+
+    def __init__(self, name, probe=None):
+        self.name = name
+        self.probe = probe  # callable() -> bool, True if the upstream looks alive
+        self.lock = threading.Lock()
+        self.calls = deque(maxlen=CIRCUIT_WINDOW)  # (ok, seconds) of recent calls
+        self.state = 'closed'
+        self.opened_at = None
+        self.reason = ''
+        self.short_circuited = 0
+        self.probing = False
+
+    def check(self):
+        """Raise UpstreamUnavailable if calls to this upstream should fail fast."""
+        if self.state == 'open':
+            with self.lock:
+                self.short_circuited += 1
+            raise UpstreamUnavailable(f'{self.name} circuit open ({self.reason})')
+
+    def timeout_for(self, timeout):
+        """Cap a request timeout near what this kind of call normally needs (never below 10s)."""
+        with self.lock:
+            latencies = [seconds for ok, seconds in self.calls if ok]
+        if len(latencies) < CIRCUIT_MIN_CALLS:
+            return timeout
+        return min(timeout, max(10.0, percentile(latencies, 95) * CIRCUIT_TIMEOUT_FACTOR))
+
+    def record(self, ok, seconds):
+        """Record one finished call and open the breaker if the window looks unhealthy."""
+        with self.lock:
+            self.calls.append((ok, seconds))
+            if self.state != 'closed' or len(self.calls) < CIRCUIT_MIN_CALLS:
+                return
+            failures = sum(1 for call_ok, _ in self.calls if not call_ok)
+            error_rate = failures / len(self.calls)
+            median = percentile([s for _, s in self.calls], 50)
+            if error_rate >= CIRCUIT_ERROR_RATE:
+                reason = f'{error_rate:.0%} errors'
+            elif median >= CIRCUIT_SLOW_SECONDS:
+                reason = f'median {median:.1f}s'
+            else:
+                return
+            self.state = 'open'
+            self.opened_at = time.time()
+            self.reason = reason
+        print(f"[DEBUG] AI API: ✗ {self.name} unhealthy ({reason}), failing fast for now")
+        self._start_probe()
+
+    def _start_probe(self):
+        with self.lock:
+            if self.probing or self.probe is None:
+                return
+            self.probing = True
+        threading.Thread(target=self._probe_loop, daemon=True).start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(CIRCUIT_OPEN_SECONDS)
+            try:
+                healthy = self.probe()
+            except Exception:
+                healthy = False
+            if healthy:
+                with self.lock:
+                    self.calls.clear()
+                    self.state = 'closed'
+                    self.reason = ''
+                    self.probing = False
+                print(f"[DEBUG] AI API: ✓ {self.name} answered the probe, circuit closed")
+                return
+
+    def snapshot(self):
+        """State, error rate and latency percentiles over the window."""
+        with self.lock:
+            calls = list(self.calls)
+            state, reason, short = self.state, self.reason, self.short_circuited
+        latencies = [seconds for _, seconds in calls]
+        return {
+            'state': state,
+            'reason': reason,
+            'calls': len(calls),
+            'error_rate': sum(1 for ok, _ in calls if not ok) / len(calls) if calls else 0.0,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'short_circuited': short,
+        }
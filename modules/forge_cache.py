@@ -0,0 +1,150 @@
+# modules/forge_cache.py
+# Forge Cache - finished AI weapons keyed by normalized prompt
+#
+# Each entry is <key>.json (weapon stats and metadata) pointing at an image
+# in the AssetStore by content hash, so prompts that produced the same image
+# share one file. The key is a sha256 of the normalized prompt, the models
+# used and the pipeline version, so changing either invalidates old entries.
+# The disk budget is the asset store's; when it evicts an image the entries
+# using it go too. Cached prompts are also kept in a PromptIndex so
+# near-identical prompts ("flaming sword" vs "fire sword") can reuse an
+# entry via nearest().
+
+import os
+import json
+import time
+import hashlib
+import threading
+from modules.prompt_index import PromptIndex, normalize_prompt
+
+
+class ForgeCache:
+    """Prompt-keyed cache of forged weapon stats, with images in an AssetStore."""
+
+    def __init__(self, directory, assets, pipeline_version, models=()):
+        self.directory = directory
+        self.assets = assets
+        self.pipeline_version = pipeline_version
+        self.models = tuple(models)
+        # Never held while calling into the asset store (its evictions call back in here)
+        self.lock = threading.RLock()
+        self.entries = {}  # {key: meta} - meta['asset'] is the image's content hash
+        self.index = PromptIndex()  # Similarity index over cached prompts
+        self.hits = 0
+        self.misses = 0
+        assets.on_evict = self._asset_evicted
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self._scan()
+        except Exception as e:
+            print(f"✗ Forge cache unavailable: {e}")
+
+    def _scan(self):
+        """Rebuild the in-memory entries from the .json files on disk."""
+        for fname in os.listdir(self.directory):
+            path = os.path.join(self.directory, fname)
+            if fname.endswith('.png'):
+                os.remove(path)  # Images used to live here; they're in the asset store now
+                continue
+            if not fname.endswith('.json'):
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except Exception:
+                continue
+            if not self.assets.has(meta.get('asset')):
+                os.remove(path)  # Image evicted, or an entry from the old layout
+                continue
+            key = fname[:-5]
+            self.entries[key] = meta
+            self.index.add(key, meta.get('prompt', ''))
+
+    def _meta_path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def key_for(self, prompt):
+        """Cache key for a prompt under the current models and pipeline version."""
+        material = json.dumps([normalize_prompt(prompt), self.models, self.pipeline_version])
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def contains(self, prompt):
+        """True if this exact prompt is cached (doesn't count as a use)."""
+        meta = self.entries.get(self.key_for(prompt))
+        return meta is not None and self.assets.has(meta['asset'])
+
+    def image_path(self, meta):
+        """Path of the image behind a cached entry's meta."""
+        return self.assets.path(meta['asset'])
+
+    def get(self, prompt):
+        """Return (png_bytes, meta) for a cached prompt, or None."""
+        return self._read(self.key_for(prompt))
+
+    def nearest(self, prompt, threshold):
+        """Return (png_bytes, meta, score) for the most similar cached prompt, or None."""
+        with self.lock:
+            match = self.index.nearest(prompt, threshold)
+        if match is None:
+            return None
+        cached = self._read(match[0])
+        if cached is None:
+            return None
+        return cached[0], cached[1], match[2]
+
+    def _read(self, key):
+        with self.lock:
+            meta = self.entries.get(key)
+        png_bytes = self.assets.get(meta['asset']) if meta else None
+        with self.lock:
+            if png_bytes is None:
+                if meta is not None:
+                    self._remove(key)  # Image went missing - treat as a miss
+                self.misses += 1
+                return None
+            self.hits += 1
+        return png_bytes, meta
+
+    def put(self, prompt, png_bytes, meta):
+        """Store a finished forge; returns the image path (None if it couldn't be stored)."""
+        if not png_bytes:
+            return None
+        key = self.key_for(prompt)
+        digest = self.assets.put(png_bytes, prompt, meta)
+        if digest is None:
+            return None
+        meta = dict(meta, prompt=prompt, key=key, asset=digest, created=time.time())
+        meta_path = self._meta_path(key)
+        with self.lock:
+            try:
+                # Write to a temp file then rename so readers never see partial entries
+                with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump(meta, f)
+                os.replace(meta_path + '.tmp', meta_path)
+            except Exception as e:
+                print(f"✗ Forge cache write failed: {e}")
+                return None
+            self.entries[key] = meta
+            self.index.add(key, prompt)
+        return self.assets.path(digest)
+
+    def _asset_evicted(self, digest):
+        with self.lock:
+            for key in [k for k, meta in self.entries.items() if meta.get('asset') == digest]:
+                self._remove(key)
+
+    def _remove(self, key):
+        self.entries.pop(key, None)
+        self.index.remove(key)
+        try:
+            os.remove(self._meta_path(key))
+        except OSError:
+            pass
+
+    @property
+    def size_bytes(self):
+        return self.assets.size_bytes
+
+    def stats(self):
+        """Hit/miss counters and current footprint."""
+        return {'entries': len(self.entries), 'bytes': self.size_bytes, 'hits': self.hits, 'misses': self.misses}
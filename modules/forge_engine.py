@@ -0,0 +1,195 @@
+# modules/forge_engine.py
+# Forge Engine - runs every player's forge as a coroutine on one asyncio loop
+#
+# The loop lives on its own daemon thread and drives the same forge stages as
+# the thread pool (AIClient._forge_steps / _warm_steps): each stage yields an
+# op and the engine performs it here - HTTP through its transport (one pooled
+# aiohttp session, or requests on threads), blocking and CPU work via
+# to_thread, concurrent image attempts as tasks. Breakers, retries, hedging
+# and telemetry stay in ai_client. Finished weapons go back through
+# AIClient._complete_job, i.e. the usual process_pending_results().
+
+import asyncio
+import itertools
+import threading
+import aiohttp
+from settings import *
+from modules.ai_client import ForgeCancelled
+
+
+class AiohttpTransport:
+    """Forge HTTP on one pooled aiohttp session (created on the loop at first use)."""
+
+    name = 'aiohttp'
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.session = None
+
+    async def request(self, method, url, job, timeout, headers=None, json=None, data=None, upload=None):
+        """One HTTP call; returns (status, body bytes).
+
+        upload is (field, filename, bytes, content type) for multipart posts.
+        Cancelling the task aborts the request and drops its connection.
+        """
+        if job is not None:
+            job.check()
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.concurrency * 2, limit_per_host=self.concurrency)
+            self.session = aiohttp.ClientSession(connector=connector)
+        if upload:
+            form = aiohttp.FormData()
+            for key, value in (data or {}).items():
+                form.add_field(key, value)
+            field, filename, content, content_type = upload
+            form.add_field(field, content, filename=filename, content_type=content_type)
+            data = form
+        async with self.session.request(method, url, headers=headers, json=json, data=data,
+                                        timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+            return resp.status, await resp.read()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class ThreadTransport:
+    """Forge HTTP through AIClient's pooled requests sessions, one thread per call."""
+
+    name = 'requests via threads'
+
+    def __init__(self, client):
+        self.client = client
+
+    async def request(self, method, url, job, timeout, **kwargs):
+        return await asyncio.to_thread(self.client._send, method, url, job, timeout, **kwargs)
+
+    async def close(self):
+        pass
+
+
+def _retrieve(task):
+    """Done callback: fetch a spawned task's error so a losing attempt isn't logged as unhandled."""
+    if not task.cancelled():
+        task.exception()
+
+
+class AsyncForgeEngine:
+    """asyncio driver for the forge stages, shared by all players."""
+
+    def __init__(self, client, concurrency=FORGE_ASYNC_CONCURRENCY, transport=None):
+        self.client = client
+        self.concurrency = concurrency
+        if transport is None:
+            transport = AiohttpTransport(concurrency)
+        self.transport = transport
+        self.loop = asyncio.new_event_loop()
+        self.queue = None  # asyncio.PriorityQueue, created on the loop
+        self.seq = itertools.count()
+        self.tasks = {}  # {job: asyncio.Task} for jobs being forged
+        self.workers = []
+        self.closing = False
+        self.ready = threading.Event()
+        threading.Thread(target=self._run_loop, daemon=True).start()
+        self.ready.wait(5.0)
+        print(f"✓ Async forge engine started ({concurrency} concurrent, {transport.name})")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.queue = asyncio.PriorityQueue()
+        self.workers = [self.loop.create_task(self._worker()) for _ in range(self.concurrency)]
+        self.loop.call_soon(self.ready.set)
+        self.loop.run_forever()
+
+    def submit(self, job):
+        """Queue a job from any thread."""
+        job.on_cancel = lambda: self.loop.call_soon_threadsafe(self._cancel_task, job)
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (job.priority, next(self.seq), job))
+
+    def _cancel_task(self, job):
+        task = self.tasks.get(job)
+        if task is not None:
+            task.cancel()
+
+    def close(self):
+        """Stop the loop (pending forges are abandoned)."""
+        async def _shutdown():
+            self.closing = True
+            for task in self.workers + list(self.tasks.values()):
+                task.cancel()
+            await asyncio.gather(*self.workers, return_exceptions=True)
+            await self.transport.close()
+            self.loop.stop()
+        self.loop.call_soon_threadsafe(lambda: self.loop.create_task(_shutdown()))
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self.queue.get()
+            if job.cancelled.is_set():
+                continue
+            self.client._start_job(job)
+            steps = self.client._warm_steps(job) if job.warm else self.client._forge_steps(job)
+            task = asyncio.ensure_future(self._run_steps(steps))
+            self.tasks[job] = task
+            try:
+                weapon_data = await task
+            except asyncio.CancelledError:
+                if self.closing:
+                    raise
+                weapon_data = None  # Cancelled before its first stage ran
+            finally:
+                self.tasks.pop(job, None)
+            if job.warm:
+                self.client._finish_warm(job)
+            else:
+                self.client._complete_job(job, weapon_data)
+
+    async def _run_steps(self, steps):
+        """Drive a forge stage generator to its result on the loop (see AIClient._run_steps).
+
+        A cancelled task is turned into ForgeCancelled inside the stages, so
+        they unwind exactly as they do on a worker thread.
+        """
+        value = error = None
+        while True:
+            try:
+                op = steps.send(value) if error is None else steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            value = error = None
+            try:
+                value = await self._perform(op)
+            except asyncio.CancelledError:
+                if self.closing:
+                    steps.close()
+                    raise
+                error = ForgeCancelled()
+            except Exception as e:
+                error = e
+
+    async def _perform(self, op):
+        """Carry out one stage op on the loop."""
+        kind = op[0]
+        if kind == 'http':
+            _, method, url, job, timeout, kwargs = op
+            return await self.transport.request(method, url, job, timeout, **kwargs)
+        if kind == 'call':
+            return await asyncio.to_thread(op[1], *op[2])
+        if kind == 'sleep':
+            _, job, seconds = op
+            await asyncio.sleep(seconds)  # job.cancel() cancels the task, which ends this early
+            if job is not None:
+                job.check()
+            return None
+        if kind == 'spawn':
+            _, job, steps = op
+            task = asyncio.ensure_future(self._run_steps(steps))
+            task.add_done_callback(_retrieve)
+            job.on_cancel = lambda: self.loop.call_soon_threadsafe(task.cancel)
+            return task
+        if kind == 'wait':
+            _, job, handles, timeout = op
+            done, _ = await asyncio.wait(handles, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            return done
+        raise ValueError(f'Unknown forge op {kind!r}')
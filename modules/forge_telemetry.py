@@ -0,0 +1,165 @@
+# modules/forge_telemetry.py
+# Forge Telemetry - per-stage timings and outcomes of every forge
+#
+# Each forge carries a ForgeTrace (job.trace) that the pipeline fills in as it
+# goes: how long every stage took (cache lookup, refine, image generation,
+# download, background removal, decode, quantize, store), how many bytes it
+# moved, retries, whether the cache hit and how the forge ended. Finished
+# traces are kept in a ring buffer; summary() aggregates them into per-stage
+# percentiles and dump() writes everything to JSON for offline analysis.
+
+import os
+import json
+import time
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from settings import *
+from modules.circuit_breaker import percentile
+
+
+class ForgeTrace:
+    """What happened during one forge."""
+
+    def __init__(self, prompt, player_id, warm=False, queued=0.0, batch=None):
+        self.prompt = prompt
+        self.player_id = player_id  # None for warm and batch forges
+        self.batch = batch  # (batch number, item) of a forge_batch() job
+        self.warm = warm
+        self.queued = queued  # Seconds spent in the queue before a worker took it
+        self.started = time.time()
+        self.stages = []  # [{'stage', 'seconds', 'bytes', 'ok'(, 'error')}] in finishing order
+        self.retries = 0
+        self.cache = None  # 'hit', 'fuzzy' or 'miss'
+        self.refine = None  # 'request', 'memo' or 'speculative'
+        self.outcome = None
+        self.seconds = None
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block; set record['bytes'] inside it to log a payload size."""
+        record = {'stage': name, 'seconds': 0.0, 'bytes': 0, 'ok': False}
+        start = time.time()
+        try:
+            yield record
+            record['ok'] = True
+        except BaseException as e:
+            record['error'] = f'{type(e).__name__}: {e}'[:200]
+            raise
+        finally:
+            record['seconds'] = time.time() - start
+            with self.lock:
+                self.stages.append(record)
+
+    def to_dict(self):
+        with self.lock:
+            stages = [dict(record) for record in self.stages]
+        return {
+            'prompt': self.prompt,
+            'player_id': self.player_id,
+            'batch': self.batch,
+            'warm': self.warm,
+            'started': self.started,
+            'queued': self.queued,
+            'seconds': self.seconds,
+            'outcome': self.outcome,
+            'cache': self.cache,
+            'refine': self.refine,
+            'retries': self.retries,
+            'stages': stages,
+        }
+
+
+def stage(job, name):
+    """job.trace.stage(name), or a no-op block for untraced calls."""
+    trace = getattr(job, 'trace', None)
+    if trace is None:
+        return nullcontext({})
+    return trace.stage(name)
+
+
+def mark(job, **fields):
+    """Set fields (cache=, refine=) on the job's trace, if it has one."""
+    trace = getattr(job, 'trace', None)
+    if trace is not None:
+        for name, value in fields.items():
+            setattr(trace, name, value)
+
+
+def note_retry(job):
+    trace = getattr(job, 'trace', None)
+    if trace is not None:
+        with trace.lock:
+            trace.retries += 1
+
+
+def _distribution(values):
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p90': percentile(values, 90),
+        'p99': percentile(values, 99),
+        'max': max(values) if values else 0.0,
+    }
+
+
+class ForgeTelemetry:
+    """Ring buffer of finished ForgeTraces with aggregate views."""
+
+    def __init__(self, max_forges=FORGE_TELEMETRY_MAX):
+        self.lock = threading.Lock()
+        self.traces = deque(maxlen=max_forges)
+
+    def begin(self, job):
+        """Attach a fresh trace to a job that a worker just took."""
+        job.trace = ForgeTrace(job.prompt, job.player_id, job.warm, job.started_at - job.enqueued_at, job.batch)
+
+    def finish(self, job, outcome):
+        """Close the job's trace with an outcome and keep it."""
+        trace = getattr(job, 'trace', None)
+        if trace is None:
+            return
+        trace.outcome = outcome
+        trace.seconds = time.time() - trace.started
+        with self.lock:
+            self.traces.append(trace)
+
+    def summary(self):
+        """Outcome / cache counts plus latency percentiles per stage (seconds)."""
+        with self.lock:
+            traces = list(self.traces)
+        stages = {}
+        for trace in traces:
+            with trace.lock:
+                records = list(trace.stages)
+            for record in records:
+                stages.setdefault(record['stage'], []).append(record)
+
+        stage_stats = {}
+        for name, records in stages.items():
+            stats = _distribution([record['seconds'] for record in records])
+            stats['failures'] = sum(1 for record in records if not record['ok'])
+            sizes = [record['bytes'] for record in records if record['bytes']]
+            stats['avg_bytes'] = sum(sizes) / len(sizes) if sizes else 0
+            stage_stats[name] = stats
+        return {
+            'forges': len(traces),
+            'outcomes': dict(Counter(trace.outcome for trace in traces)),
+            'cache': dict(Counter(trace.cache for trace in traces if trace.cache)),
+            'refine': dict(Counter(trace.refine for trace in traces if trace.refine)),
+            'retries': sum(trace.retries for trace in traces),
+            'queued': _distribution([trace.queued for trace in traces]),
+            'total': _distribution([trace.seconds for trace in traces]),
+            'stages': stage_stats,
+        }
+
+    def dump(self, path):
+        """Write the summary and every kept trace to a JSON file; returns the path."""
+        with self.lock:
+            traces = [trace.to_dict() for trace in self.traces]
+        report = {'generated': time.time(), 'summary': self.summary(), 'forges': traces}
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        os.replace(path + '.tmp', path)
+        return path
@@ -0,0 +1,64 @@
+# modules/hedging.py
+# Hedging - second image request for forges that run into the latency tail
+#
+# Image generation usually lands within a few seconds but now and then takes
+# much longer. Once a request has been outstanding for longer than the recent
+# HEDGE_PERCENTILE latency, a second request is fired and whichever brings
+# back an image first wins; the other is cancelled. Hedges are budgeted so
+# they stay under HEDGE_MAX_FRACTION of image calls.
+
+import threading
+from collections import deque
+from settings import *
+from modules.circuit_breaker import percentile
+
+
+class HedgePolicy:
+    """Latency history and hedge budget for one kind of request."""
+
+    def __init__(self, enabled=HEDGE_IMAGE_REQUESTS):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=HEDGE_WINDOW)  # Seconds of recent successful calls
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def delay(self):
+        """Seconds to wait before hedging a new call, or None to not hedge it.
+
+        Also counts the call towards the budget, so call it once per request.
+        """
+        with self.lock:
+            self.calls += 1
+            if not self.enabled or len(self.latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            return max(HEDGE_MIN_DELAY, percentile(list(self.latencies), HEDGE_PERCENTILE))
+
+    def take(self):
+        """Claim a hedge from the budget; False if hedging now would exceed it."""
+        with self.lock:
+            if self.hedges + 1 > self.calls * HEDGE_MAX_FRACTION:
+                return False
+            self.hedges += 1
+            return True
+
+    def record(self, seconds, hedge_won=False):
+        """Record how long a successful call took (from its first request)."""
+        with self.lock:
+            self.latencies.append(seconds)
+            if hedge_won:
+                self.hedge_wins += 1
+
+    def snapshot(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            calls, hedges, wins = self.calls, self.hedges, self.hedge_wins
+        return {
+            'enabled': self.enabled,
+            'calls': calls,
+            'hedges': hedges,
+            'hedge_wins': wins,
+            'p50': percentile(latencies, 50),
+            'threshold': percentile(latencies, HEDGE_PERCENTILE),
+        }
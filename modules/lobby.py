@@ -43,6 +43,9 @@ class LobbyScreen:
             self.success_message = f"Successfully joined {host_name}'s lobby!"
             self.success_timer = 3.0
 
+        # (ready, total) weapons pre-forged in the background, set by the caller each frame
+        self.warm_status = None
+
         # Create buttons with clean positioning
         center_x = SCREEN_WIDTH // 2
         button_y = SCREEN_HEIGHT - 120
@@ -280,6 +283,13 @@ class LobbyScreen:
         status_rect = status_surf.get_rect(center=(SCREEN_WIDTH // 2, status_y))
         self.screen.blit(status_surf, status_rect)
 
+        # Warm pool progress (weapons being pre-forged while we wait)
+        if self.warm_status and self.warm_status[1]:
+            ready, total = self.warm_status
+            warm_surf = self.small_font.render(f"Warming up the forge: {ready}/{total} weapons ready", True, (150, 150, 150))
+            warm_rect = warm_surf.get_rect(center=(SCREEN_WIDTH // 2, status_y + 25))
+            self.screen.blit(warm_surf, warm_rect)
+
         # Draw buttons
         if self.is_host:
             self.start_button.draw(self.screen, self.font)
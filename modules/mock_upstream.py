@@ -0,0 +1,314 @@
+# modules/mock_upstream.py
+# Mock Upstream - local stand-in for the HackClub AI and remove.bg APIs
+#
+# Serves the chat-completions endpoint (refine text, or an image when the
+# request asks for the image modality), image downloads and the remove.bg
+# upload endpoint on localhost, with configurable latency, a slow tail, error
+# rate and image response shape. Images are generated retro sprites on a flat
+# background, one per prompt, so caching and background removal behave as
+# they would with real images. Nothing leaves the machine.
+#
+# In-process: MockUpstream(latency=1.0, error_rate=0.1).start().attach(client)
+#             (the client's cache moves to a temp dir for the run)
+# Standalone: python -m modules.mock_upstream --latency 1.5 --error-rate 0.1
+#             then run the game with the printed HACKCLUB_CHAT_URL / REMOVE_BG_URL
+#             (a non-default chat URL is part of the forge cache key).
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pygame
+from modules.sprite_generator import create_retro_weapon_sprite
+from modules.bg_removal import remove_background_bytes
+from modules.forge_cache import ForgeCache
+from modules.asset_store import AssetStore
+
+# How the image comes back in a chat completion (see ai_client.extract_image):
+#   images        - message.images[].image_url.url data URL (what the real proxy sends)
+#   content_parts - message.content is a list of image_url parts
+#   markdown      - data URL inline in the message text
+#   b64_json      - data[].b64_json, images-API style
+#   url           - message.images[].image_url.url is an http URL served by the mock
+#   none          - text only, no image (exercises the fallback prompt)
+IMAGE_SHAPES = ('images', 'content_parts', 'markdown', 'b64_json', 'url', 'none')
+
+_REFINE_PROMPT = re.compile(r'weapon image: (.*?)\. Output', re.S)
+_PNG_END = b'IEND\xaeB`\x82'
+
+
+class MockUpstream:
+    """Threaded localhost HTTP server imitating the forge's upstream APIs."""
+
+    def __init__(self, port=0, latency=0.5, jitter=0.3, slow_rate=0.0, slow_latency=10.0,
+                 error_rate=0.0, error_status=500, image_shape='images', image_size=256,
+                 removebg_latency=0.3, removebg_error_rate=0.0, seed=None):
+        self.port = port
+        self.latency = latency  # Typical seconds per chat call...
+        self.jitter = jitter  # ...varied by up to this fraction either way
+        self.slow_rate = slow_rate  # Share of chat calls that take slow_latency instead (the tail)
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate  # Share of chat calls answered with error_status
+        self.error_status = error_status
+        self.image_shape = image_shape  # One of IMAGE_SHAPES, or a list to pick from per call
+        self.image_size = image_size
+        self.removebg_latency = removebg_latency
+        self.removebg_error_rate = removebg_error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.images = {}  # {image id: png bytes} for the 'url' shape and repeat prompts
+        self.counts = {}  # {route: requests}
+        self.errors = 0
+        self.server = None
+
+    # --- Lifecycle ---
+    def start(self):
+        """Bind and serve on a daemon thread; returns self."""
+        self.server = ThreadingHTTPServer(('127.0.0.1', self.port), self._handler_class())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"✓ Mock AI upstream listening on http://127.0.0.1:{self.port}")
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    @property
+    def chat_url(self):
+        return self.base_url + '/v1/chat/completions'
+
+    @property
+    def removebg_url(self):
+        return self.base_url + '/v1.0/removebg'
+
+    def env(self):
+        """Environment variables that point a new game process at this server."""
+        return {'HACKCLUB_CHAT_URL': self.chat_url, 'REMOVE_BG_URL': self.removebg_url,
+                'HACKCLUB_API_KEY': 'mock', 'REMOVE_BG_API_KEY': 'mock'}
+
+    def attach(self, client):
+        """Point an AIClient at this server (with dummy keys so it takes the AI path).
+
+        The client's forge cache and asset store move to a throwaway temp
+        directory, so mock sprites never reach the real cache or warm pool.
+        """
+        client.chat_url = self.chat_url
+        client.removebg_url = self.removebg_url
+        client.hackclub_key = 'mock'
+        client.removebg_key = 'mock'
+        directory = tempfile.mkdtemp(prefix='promptwar-mock-')
+        cache = client.forge_cache
+        client.assets = AssetStore(os.path.join(directory, 'generated'), client.assets.max_bytes)
+        client.forge_cache = ForgeCache(os.path.join(directory, 'forge_cache'), client.assets,
+                                        cache.pipeline_version, models=cache.models + (self.chat_url,))
+        print(f"✓ Mock forges cached in {directory}")
+        return self
+
+    def stats(self):
+        with self.lock:
+            return {'requests': dict(self.counts), 'errors': self.errors, 'images': len(self.images)}
+
+    # --- Behaviour ---
+    def _count(self, route):
+        with self.lock:
+            self.counts[route] = self.counts.get(route, 0) + 1
+
+    def _roll(self, rate):
+        with self.lock:
+            return self.random.random() < rate
+
+    def _delay(self, latency, tail=True):
+        with self.lock:
+            if tail and self.random.random() < self.slow_rate:
+                seconds = self.slow_latency
+            else:
+                seconds = latency * (1 + self.random.uniform(-self.jitter, self.jitter))
+        time.sleep(max(0.0, seconds))
+
+    def _shape(self):
+        if isinstance(self.image_shape, str):
+            return self.image_shape
+        with self.lock:
+            return self.random.choice(list(self.image_shape))
+
+    def _image_for(self, text):
+        """PNG of a retro sprite for the prompt on a flat background; returns (id, bytes)."""
+        image_id = hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+        with self.lock:
+            png = self.images.get(image_id)
+        if png is not None:
+            return image_id, png
+        seed = int(image_id, 16)
+        background = (200 + seed % 56, 200 + (seed >> 8) % 56, 200 + (seed >> 16) % 56)
+        color = (80 + (seed >> 24) % 176, 40 + (seed >> 32) % 176, 40 + (seed >> 40) % 176)
+        size = self.image_size
+        canvas = pygame.Surface((size, size))
+        canvas.fill(background)
+        sprite = create_retro_weapon_sprite(text, color, size=32)
+        sprite = pygame.transform.scale(sprite, (size * 3 // 4, size * 3 // 4))
+        canvas.blit(sprite, sprite.get_rect(center=(size // 2, size // 2)))
+        out = io.BytesIO()
+        pygame.image.save(canvas, out, 'image.png')
+        png = out.getvalue()
+        with self.lock:
+            self.images[image_id] = png
+        return image_id, png
+
+    def _chat(self, request):
+        messages = request.get('messages') or [{}]
+        content = messages[-1].get('content') or ''
+        if 'image' not in (request.get('modalities') or []):
+            match = _REFINE_PROMPT.search(content)
+            prompt = match.group(1) if match else content[:80]
+            return {'choices': [{'message': {'role': 'assistant',
+                                             'content': f'Retro pixel-art {prompt}, centered, flat background'}}]}
+
+        image_id, png = self._image_for(content)
+        data_url = 'data:image/png;base64,' + base64.b64encode(png).decode('ascii')
+        shape = self._shape()
+        message = {'role': 'assistant', 'content': ''}
+        if shape == 'b64_json':
+            return {'data': [{'b64_json': data_url.split(',', 1)[1]}]}
+        if shape == 'content_parts':
+            message['content'] = [{'type': 'image_url', 'image_url': {'url': data_url}}]
+        elif shape == 'markdown':
+            message['content'] = f'Here is your weapon: ![weapon]({data_url})'
+        elif shape == 'url':
+            message['images'] = [{'type': 'image_url', 'image_url': {'url': f'{self.base_url}/images/{image_id}.png'}}]
+        elif shape == 'none':
+            message['content'] = 'I could not draw that one.'
+        else:
+            message['images'] = [{'type': 'image_url', 'image_url': {'url': data_url}}]
+        return {'choices': [{'message': message}]}
+
+    def _removebg(self, body):
+        """Cut the uploaded PNG out locally (it's flat-background by construction)."""
+        start = body.find(b'\x89PNG')
+        end = body.find(_PNG_END, start)
+        if start == -1 or end == -1:
+            return None
+        png = body[start:end + len(_PNG_END)]
+        return remove_background_bytes(png) or png
+
+    def _handler_class(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real APIs
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type='application/json'):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode('utf-8')
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Client gave up (cancelled or hedged away)
+
+            def _error(self, route):
+                with upstream.lock:
+                    upstream.errors += 1
+                self._send(upstream.error_status, {'error': {'message': f'mock {route} error'}})
+
+            def do_GET(self):
+                if self.path.startswith('/images/'):
+                    upstream._count('download')
+                    with upstream.lock:
+                        png = upstream.images.get(self.path[len('/images/'):].split('.')[0])
+                    if png is None:
+                        self._send(404, {'error': 'no such image'})
+                    else:
+                        self._send(200, png, 'image/png')
+                    return
+                upstream._count('probe')
+                self._send(200, {'status': 'ok'})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if self.path.endswith('/chat/completions'):
+                    upstream._count('chat')
+                    upstream._delay(upstream.latency)
+                    if upstream._roll(upstream.error_rate):
+                        return self._error('chat')
+                    try:
+                        request = json.loads(body)
+                    except ValueError:
+                        return self._send(400, {'error': {'message': 'invalid JSON'}})
+                    return self._send(200, upstream._chat(request))
+                if self.path.endswith('/removebg'):
+                    upstream._count('removebg')
+                    upstream._delay(upstream.removebg_latency, tail=False)
+                    if upstream._roll(upstream.removebg_error_rate):
+                        return self._error('removebg')
+                    png = upstream._removebg(body)
+                    if png is None:
+                        return self._send(400, {'errors': [{'title': 'No image_file'}]})
+                    return self._send(200, png, 'image/png')
+                self._send(404, {'error': 'unknown endpoint'})
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local mock of the HackClub AI and remove.bg APIs.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5, help='typical seconds per chat call')
+    parser.add_argument('--jitter', type=float, default=0.3, help='latency varies by this fraction')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='share of chat calls that are slow')
+    parser.add_argument('--slow-latency', type=float, default=10.0, help='seconds a slow call takes')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of chat calls that fail')
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--shape', default='images',
+                        help='image response shape: ' + ', '.join(IMAGE_SHAPES) + ' (comma list = random mix)')
+    parser.add_argument('--removebg-latency', type=float, default=0.3)
+    parser.add_argument('--removebg-error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    shapes = [shape.strip() for shape in args.shape.split(',') if shape.strip()]
+    for shape in shapes:
+        if shape not in IMAGE_SHAPES:
+            parser.error(f'unknown shape {shape!r}')
+    upstream = MockUpstream(port=args.port, latency=args.latency, jitter=args.jitter,
+                            slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+                            error_rate=args.error_rate, error_status=args.error_status,
+                            image_shape=shapes[0] if len(shapes) == 1 else shapes,
+                            removebg_latency=args.removebg_latency,
+                            removebg_error_rate=args.removebg_error_rate, seed=args.seed).start()
+    print('Point the game at it with:')
+    for name, value in upstream.env().items():
+        print(f'  {name}={value}')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    upstream.stop()
+    print(upstream.stats())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
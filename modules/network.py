@@ -2,20 +2,39 @@
 # Network module for online multiplayer
 
 import socket
-import pickle
+import select
 import threading
 import time
+import struct
+from collections import deque
+from modules.protocol import (
+    PROTOCOL_VERSION, MAX_FRAME_SIZE, MAX_HELLO_SIZE, COMPACT_FLAG, COMPACT_SINCE, ProtocolError, FrameBuffer,
+    encode_message, decode_body, decode_message, negotiate_version, peek_route, wrap_body, full_state_player
+)
+from modules.capture import CaptureWriter, DIRECTION_IN, DIRECTION_OUT, ROLE_CLIENT, ROLE_SERVER, CONN_PEER
+
+_SEQ = struct.Struct('!I')  # Sequence number prefixed to every P2P datagram
 
 
 class GameServer:
     """Server for hosting multiplayer games."""
 
-    def __init__(self, port=5555):
+    SPECTATOR_TICK_RATE = 30  # Snapshots per second fanned out to spectators
+
+    def __init__(self, port=5555, capture_path=None):
         self.port = port
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Allow address reuse
         self.host = socket.gethostbyname(socket.gethostname())
-        self.rooms = {}  # {room_code: {'players': [], 'player_names': [], 'game_state': {}}}
+        self.rooms = {}  # {room_code: {'players': [], 'player_names': [], 'spectators': [], 'snapshot': {}, 'game_state': {}}}
+        self.spectator_conns = {}  # {conn: room_code} for read-only watchers
+        self.spectator_lock = threading.Lock()
+        self.send_locks = {}  # {conn: Lock} so relays, responses and fan-out never interleave frames
+        self.spectator_out = {}  # {conn: {'buffer': unsent bytes, 'tick': last snapshot queued}} - non-blocking sockets
+        self.conn_versions = {}  # {conn: negotiated protocol version}
+        self.conn_ids = {}  # {conn: small id} used to tell connections apart in captures
+        self.next_conn_id = 0
+        self.capture = CaptureWriter(capture_path, ROLE_SERVER) if capture_path else None
         self.running = False
 
     def start(self):
@@ -29,6 +48,8 @@ class GameServer:
 
             # Start accepting connections in a thread
             threading.Thread(target=self._accept_connections, daemon=True).start()
+            # Spectator fan-out runs on its own thread so watchers never delay player relays
+            threading.Thread(target=self._spectator_loop, daemon=True).start()
             return True
         except Exception as e:
             print(f"✗ Server error: {e}")
@@ -40,6 +61,8 @@ class GameServer:
             try:
                 conn, addr = self.server_socket.accept()
                 print(f"✓ Connection from {addr}")
+                self.conn_ids[conn] = self.next_conn_id
+                self.next_conn_id = (self.next_conn_id + 1) % 0x10000
                 threading.Thread(target=self._handle_client, args=(conn, addr), daemon=True).start()
             except socket.timeout:
                 continue  # Just check if still running
@@ -48,27 +71,50 @@ class GameServer:
 
     def _handle_client(self, conn, addr):
         """Handle individual client connection."""
-        conn.settimeout(None)  # Remove timeout - use non-blocking with select or keep connection alive
+        conn.settimeout(1.0)  # Bounds blocking sends to players; spectators switch to non-blocking
+        frames = FrameBuffer(max_frame_size=MAX_HELLO_SIZE)
         try:
             while self.running:
                 try:
-                    # Set a short timeout just for recv to allow checking self.running
-                    conn.settimeout(1.0)
+                    # Wait at most a second for data so the loop can check self.running
+                    readable, _, _ = select.select([conn], [], [], 1.0)
+                    if not readable:
+                        continue
                     data = conn.recv(4096)
 
                     if not data:
                         print(f"Client {addr} disconnected")
                         break
 
-                    message = pickle.loads(data)
-                    response = self._process_message(message, conn)
+                    for body in frames.feed(data):
+                        if self.capture:
+                            self.capture.record(DIRECTION_IN, body, self.conn_ids.get(conn, 0))
+
+                        # Nothing but a hello is accepted until the version is negotiated
+                        if conn not in self.conn_versions:
+                            if not self._handshake(conn, addr, body):
+                                return
+                            frames.max_frame_size = MAX_FRAME_SIZE
+                            continue
+
+                        # Player updates are validated and relayed as raw frames - no re-encode
+                        msg_type, room_code, player_id = peek_route(body, self.conn_versions[conn])
+                        if msg_type == 'update':
+                            self._relay_update(conn, room_code, player_id, body)
+                            continue
+
+                        message = decode_body(body, self.conn_versions[conn])
+                        response = self._process_message(message, conn)
 
-                    if response:
-                        conn.send(pickle.dumps(response))
+                        if response:
+                            self._send(conn, response)
                 except socket.timeout:
                     # This is normal - just means no data received in 1 second
                     # Continue loop to check if server is still running
                     continue
+                except ProtocolError as e:
+                    print(f"✗ Rejected malformed message from {addr}: {e}")
+                    break
                 except Exception as e:
                     print(f"Error processing message from {addr}: {e}")
                     break
@@ -76,8 +122,111 @@ class GameServer:
             print(f"Client handler error for {addr}: {e}")
         finally:
             print(f"Closing connection to {addr}")
+            self._remove_spectator(conn)
+            self.conn_versions.pop(conn, None)
+            self.send_locks.pop(conn, None)
+            self.conn_ids.pop(conn, None)
             conn.close()
 
+    def _handshake(self, conn, addr, body):
+        """Negotiate the protocol version from a client's first frame."""
+        hello = decode_body(body)
+        if hello.get('type') != 'hello':
+            raise ProtocolError(f"expected hello, got {hello.get('type')}")
+        version = negotiate_version(hello)
+        if version is None:
+            print(f"✗ {addr} speaks protocol {hello.get('min_version')}-{hello.get('version')}, we speak {PROTOCOL_VERSION}")
+            self._send(conn, {'type': 'hello_ack', 'status': 'error', 'version': PROTOCOL_VERSION,
+                              'message': f'Unsupported protocol version (server speaks {PROTOCOL_VERSION})'})
+            return False
+        self.conn_versions[conn] = version
+        self._send(conn, {'type': 'hello_ack', 'status': 'success', 'version': version})
+        return True
+
+    def _send(self, conn, message):
+        """Encode and send one message to a connection."""
+        self._send_frame(conn, encode_message(message, self.conn_versions.get(conn, PROTOCOL_VERSION)))
+
+    def _send_frame(self, conn, frame):
+        """Send an already-encoded frame, serialised per connection."""
+        lock = self.send_locks.setdefault(conn, threading.Lock())
+        with lock:
+            outgoing = self.spectator_out.get(conn)
+            if outgoing is None:
+                conn.sendall(frame)
+            else:
+                # Spectator sockets never block: queue the frame and write what fits
+                outgoing['buffer'] += frame
+                self._flush_spectator(conn, outgoing)
+        if self.capture:
+            self.capture.record(DIRECTION_OUT, frame[2:], self.conn_ids.get(conn, 0))
+
+    def _flush_spectator(self, conn, outgoing):
+        """Write as much of a spectator's queued bytes as the socket takes (send lock held)."""
+        buffer = outgoing['buffer']
+        if not buffer:
+            return
+        try:
+            sent = conn.send(buffer)
+        except (BlockingIOError, InterruptedError):
+            return  # Receive window full - try again next tick
+        del buffer[:sent]
+
+    def _broadcast(self, conns, message):
+        """Encode a message once per protocol version and send it to every connection; returns failed indices."""
+        frames = {}  # {version: frame}
+        failed = []
+        for i, other_conn in enumerate(conns):
+            try:
+                version = self.conn_versions.get(other_conn, PROTOCOL_VERSION)
+                if version not in frames:
+                    frames[version] = encode_message(message, version)
+                self._send_frame(other_conn, frames[version])
+            except Exception:
+                failed.append(i)
+        return failed
+
+    def _relay_update(self, conn, room_code, player_id, body):
+        """Forward a player's update frame to the rest of the room unchanged.
+
+        Only the sender's own updates for a room it plays in are relayed, so
+        nobody can inject state into another room or impersonate a player.
+        """
+        room = self.rooms.get(room_code)
+        if room is None:
+            return
+        if conn in self.spectator_conns:
+            # Spectators are read-only - never let them act as a player
+            self._send(conn, {'type': 'ack', 'status': 'error', 'message': 'Spectators are read-only'})
+            return
+        players = room['players']
+        if conn not in players or players.index(conn) != player_id:
+            self._send(conn, {'type': 'ack', 'status': 'error', 'message': 'Not a player in this room'})
+            return
+        frame = wrap_body(body)
+        legacy = {}  # {version: frame} re-encoded for players too old for compact frames
+        for player_conn in room['players']:
+            if player_conn != conn:
+                try:
+                    version = self.conn_versions.get(player_conn, PROTOCOL_VERSION)
+                    if body[0] & COMPACT_FLAG and version < COMPACT_SINCE:
+                        if version not in legacy:
+                            legacy[version] = encode_message(decode_body(body), version)
+                        self._send_frame(player_conn, legacy[version])
+                    else:
+                        self._send_frame(player_conn, frame)
+                except Exception:
+                    pass
+        if room['spectators']:
+            # Decoding for the snapshot happens on the fan-out thread, not here. A full
+            # state frame supersedes the player's earlier ones, so only the newest is kept.
+            player_id = full_state_player(body)
+            with self.spectator_lock:
+                if player_id is None:
+                    room['spectator_backlog'].append(body)
+                else:
+                    room['spectator_latest'][player_id] = body
+
     def _process_message(self, message, conn):
         """Process client messages."""
         msg_type = message.get('type')
@@ -88,9 +237,35 @@ class GameServer:
             self.rooms[room_code] = {
                 'players': [conn],
                 'player_names': [player_name],
+                'spectators': [],
+                'spectator_backlog': [],  # Relayed events/partial updates not yet in the snapshot
+                'spectator_latest': {},  # {player_id: newest full state frame body}
+                'snapshot': {'players': {}, 'weapons': {}},
+                'snapshot_dirty': False,
+                'snapshot_frame': (0, None),  # (tick, encoded snapshot) last fanned out
+                'peer_endpoints': {},  # {conn: (host, udp port)} offered for direct P2P
                 'game_state': {'player_count': 1}
             }
-            return {'status': 'success', 'player_id': 0, 'room_code': room_code, 'players': [player_name]}
+            return {'type': 'create_room_response', 'status': 'success', 'player_id': 0, 'room_code': room_code, 'players': [player_name]}
+
+        elif msg_type == 'join_room' and message.get('role') == 'spectator':
+            room_code = message['room_code']
+            if room_code in self.rooms:
+                room = self.rooms[room_code]
+                with self.spectator_lock:
+                    with self.send_locks.setdefault(conn, threading.Lock()):
+                        conn.setblocking(False)
+                        self.spectator_out[conn] = {'buffer': bytearray(), 'tick': 0}
+                    room['spectators'].append(conn)
+                    self.spectator_conns[conn] = room_code
+                    room['snapshot_dirty'] = True  # Push a full snapshot on the next tick
+                print(f"✓ Spectator joined room {room_code} ({len(room['spectators'])} watching)")
+                return {'type': 'spectate_response', 'status': 'success', 'room_code': room_code, 'players': room['player_names']}
+            return {'type': 'spectate_response', 'status': 'error', 'message': 'Room not found'}
+
+        elif conn in self.spectator_conns and msg_type in ('start_game', 'create_room', 'join_room'):
+            # Spectators are read-only - never let them act as a player
+            return {'type': 'ack', 'status': 'error', 'message': 'Spectators are read-only'}
 
         elif msg_type == 'join_room':
             room_code = message['room_code']
@@ -103,29 +278,37 @@ class GameServer:
 
                 # Notify all players about new player
                 player_list = self.rooms[room_code]['player_names']
-                for i, player_conn in enumerate(self.rooms[room_code]['players']):
-                    try:
-                        notify_msg = {
-                            'type': 'player_joined',
-                            'players': player_list,
-                            'new_player': player_name
-                        }
-                        player_conn.send(pickle.dumps(notify_msg))
-                    except:
-                        pass
-
-                return {'status': 'success', 'player_id': player_id, 'room_code': room_code, 'players': player_list}
-            return {'status': 'error', 'message': 'Room not found'}
+                notify_msg = {
+                    'type': 'player_joined',
+                    'players': player_list,
+                    'new_player': player_name
+                }
+                self._broadcast(self.rooms[room_code]['players'], notify_msg)
+
+                return {'type': 'join_room_response', 'status': 'success', 'player_id': player_id, 'room_code': room_code, 'players': player_list}
+            return {'type': 'join_room_response', 'status': 'error', 'message': 'Room not found'}
+
+        elif msg_type == 'peer_offer':
+            # A player can take UDP traffic directly - remember where, introduce at game start
+            room = self.rooms.get(message['room_code'])
+            if room is not None and conn in room['players'] and message.get('port'):
+                room['peer_endpoints'][conn] = (conn.getpeername()[0], message['port'])
+            return None
+
+        elif msg_type == 'ping':
+            # RTT probe for the client's send scheduler - echo straight back
+            return {'type': 'pong', 'seq': message.get('seq', 0)}
 
         elif msg_type == 'get_lobby':
             room_code = message['room_code']
             if room_code in self.rooms:
                 return {
+                    'type': 'lobby_info',
                     'status': 'success',
                     'players': self.rooms[room_code]['player_names'],
                     'player_count': len(self.rooms[room_code]['players'])
                 }
-            return {'status': 'error', 'message': 'Room not found'}
+            return {'type': 'lobby_info', 'status': 'error', 'message': 'Room not found'}
 
         elif msg_type == 'start_game':
             # Host is starting the game - broadcast to all players in room
@@ -135,46 +318,347 @@ class GameServer:
                 print(f"✓ Starting game in room {room_code}")
 
                 # Broadcast to ALL players including host
-                for i, player_conn in enumerate(self.rooms[room_code]['players']):
-                    try:
-                        start_msg = {
-                            'type': 'game_starting',
-                            'room_code': room_code
-                        }
-                        player_conn.send(pickle.dumps(start_msg))
+                start_msg = {
+                    'type': 'game_starting',
+                    'room_code': room_code
+                }
+                self._introduce_peers(room_code)
+                players = self.rooms[room_code]['players']
+                failed = self._broadcast(players, start_msg)
+                for i in range(len(players)):
+                    if i in failed:
+                        print(f"✗ Failed to send game_starting to player {i}")
+                    else:
                         print(f"✓ Sent game_starting to player {i}")
-                    except Exception as e:
-                        print(f"✗ Failed to send to player {i}: {e}")
 
                 # Return success to the requesting host
-                return {'status': 'success', 'message': 'game_starting'}
-            return {'status': 'error', 'message': 'Room not found'}
+                return {'type': 'ack', 'status': 'success', 'message': 'game_starting'}
+            return {'type': 'ack', 'status': 'error', 'message': 'Room not found'}
 
-        elif msg_type == 'update':
-            room_code = message['room_code']
-            if room_code in self.rooms:
-                # Broadcast to all players in room (including weapon_forged messages)
-                update_data = message.get('data', {})
-                for player_conn in self.rooms[room_code]['players']:
-                    if player_conn != conn:
+        return {'type': 'ack', 'status': 'unknown', 'message': f'Unknown message type {msg_type}'}
+
+    def _introduce_peers(self, room_code):
+        """Tell both players of a 1v1 room where to reach each other directly.
+
+        Only two-player rooms where both clients offered a UDP port (and speak
+        protocol v3) get introduced; everyone else keeps using the relay.
+        """
+        room = self.rooms[room_code]
+        players = room['players']
+        endpoints = room['peer_endpoints']
+        if len(players) != 2 or not all(conn in endpoints for conn in players):
+            return
+        for player_id, conn in enumerate(players):
+            other_id = 1 - player_id
+            host, port = endpoints[players[other_id]]
+            try:
+                self._send(conn, {'type': 'peer_info', 'room_code': room_code, 'player_id': other_id,
+                                  'host': host, 'port': port})
+            except Exception as e:
+                print(f"✗ Failed to send peer_info to player {player_id}: {e}")
+                return
+        print(f"✓ Room {room_code}: players introduced for direct P2P")
+
+    def _record_snapshot(self, room, player_id, update_data):
+        """Fold a player's update into the room snapshot that spectators receive."""
+        if player_id is None or not isinstance(update_data, dict):
+            return
+        snapshot = room['snapshot']
+        if update_data.get('type') == 'weapon_forged':
+            snapshot['weapons'][player_id] = update_data.get('weapon_name', 'Unknown')
+        else:
+            snapshot['players'].setdefault(player_id, {}).update(update_data)
+        room['snapshot_dirty'] = True
+
+    def _spectator_loop(self):
+        """Fan out each room's snapshot to its spectators once per tick.
+
+        The snapshot is encoded once per room per tick and the same bytes are
+        queued for every spectator. Spectator sockets are non-blocking with a
+        per-spectator outgoing buffer: a watcher that still has an older frame
+        unsent skips this tick's snapshot (latest-wins) and gets the newest one
+        once it has drained, so a slow watcher never stalls the fan-out, the
+        other spectators or the players.
+        """
+        interval = 1.0 / self.SPECTATOR_TICK_RATE
+        tick = 0
+        while self.running:
+            start = time.time()
+            tick += 1
+            with self.spectator_lock:
+                for room in list(self.rooms.values()):
+                    backlog, room['spectator_backlog'] = room['spectator_backlog'], []
+                    latest, room['spectator_latest'] = room['spectator_latest'], {}
+                    for body in backlog + list(latest.values()):
                         try:
-                            player_conn.send(pickle.dumps(message))
-                        except:
-                            pass
-                return {'status': 'ok'}
+                            update = decode_body(body)
+                        except ProtocolError:
+                            continue
+                        self._record_snapshot(room, update.get('player_id'), update.get('data'))
+                rooms = [(code, room, room['spectators'][:]) for code, room in list(self.rooms.items())
+                         if room.get('spectators')]
+
+            for room_code, room, spectators in rooms:
+                if room['snapshot_dirty']:
+                    room['snapshot_dirty'] = False
+                    snapshot_msg = {
+                        'type': 'snapshot',
+                        'room_code': room_code,
+                        'tick': tick,
+                        'player_names': room['player_names'],
+                        'players': {pid: dict(state) for pid, state in room['snapshot']['players'].items()},
+                        'weapons': dict(room['snapshot']['weapons'])
+                    }
+                    try:
+                        room['snapshot_frame'] = (tick, encode_message(snapshot_msg))
+                    except Exception as e:
+                        print(f"✗ Snapshot encode failed for room {room_code}: {e}")
+                frame_tick, payload = room['snapshot_frame']
 
-        return {'status': 'unknown'}
+                for spectator_conn in spectators:
+                    lock = self.send_locks.get(spectator_conn)
+                    outgoing = self.spectator_out.get(spectator_conn)
+                    if lock is None or outgoing is None:
+                        continue
+                    queued = False
+                    try:
+                        with lock:
+                            self._flush_spectator(spectator_conn, outgoing)
+                            # Lagging (older bytes still unsent) or already up to date: nothing to add
+                            if payload is not None and outgoing['tick'] < frame_tick and not outgoing['buffer']:
+                                outgoing['buffer'] += payload
+                                outgoing['tick'] = frame_tick
+                                self._flush_spectator(spectator_conn, outgoing)
+                                queued = True
+                    except Exception:
+                        self._remove_spectator(spectator_conn)
+                        continue
+                    if queued and self.capture:
+                        self.capture.record(DIRECTION_OUT, payload[2:], self.conn_ids.get(spectator_conn, 0))
+
+            elapsed = time.time() - start
+            time.sleep(max(0.0, interval - elapsed))
+
+    def _remove_spectator(self, conn):
+        """Forget a spectator connection (no-op for players)."""
+        with self.spectator_lock:
+            room_code = self.spectator_conns.pop(conn, None)
+            self.spectator_out.pop(conn, None)
+            if room_code in self.rooms and conn in self.rooms[room_code]['spectators']:
+                self.rooms[room_code]['spectators'].remove(conn)
+                print(f"Spectator left room {room_code}")
 
     def stop(self):
         """Stop the server."""
         self.running = False
         self.server_socket.close()
+        if self.capture:
+            self.capture.close()
+
+
+class SendScheduler:
+    """Congestion-aware snapshot rate control for GameClient.
+
+    Measures RTT with ping/pong and watches the client's own outbox. When
+    queueing delay (smoothed RTT above the best RTT seen), blocked sends or
+    snapshots waiting in the outbox show the link is backing up, the snapshot
+    rate is cut multiplicatively; otherwise it climbs additively back towards
+    MAX_RATE. A snapshot replaced by a newer one before it was sent is not a
+    congestion signal - the game may simply produce state faster than the rate.
+    Cosmetic fields are quantized more coarsely as the rate drops, but never
+    removed.
+    """
+
+    MIN_RATE = 10  # Hz
+    MAX_RATE = 60  # Hz
+    START_RATE = 30  # Hz (the old fixed 0.033s timer)
+    EVAL_INTERVAL = 0.5  # Seconds between rate decisions
+    PING_INTERVAL = 0.5  # Seconds between RTT probes
+    QUEUE_DELAY_LIMIT = 0.04  # Seconds of RTT inflation (or outbox wait) treated as congestion
+    COSMETIC_FIELDS = ('vx', 'vy')  # Only used to smooth remote motion
+    # (rate below, quantization step): binary fractions, so float32 carries them exactly
+    COSMETIC_STEPS = ((MIN_RATE + 6, 0.5), (40, 0.125))
+
+    def __init__(self):
+        self.rate = self.START_RATE
+        self.srtt = None  # Smoothed RTT
+        self.min_rtt = None  # Best RTT seen (propagation delay estimate)
+        self.send_timer = 0.0
+        self.eval_timer = 0.0
+        self.blocked_time = 0.0  # Seconds spent inside sendall this window
+        self.outbox_wait = 0.0  # Longest a snapshot sat in the outbox before sending, this window
+        self.lock = threading.Lock()
+
+    def on_rtt(self, rtt):
+        """Record an RTT sample from a pong."""
+        with self.lock:
+            self.srtt = rtt if self.srtt is None else self.srtt * 0.8 + rtt * 0.2
+            self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+
+    def on_send(self, seconds):
+        """Record how long a send blocked (TCP send buffer full = queue growth)."""
+        with self.lock:
+            self.blocked_time += seconds
+
+    def on_dequeue(self, waited):
+        """Record how long a snapshot waited in the outbox (sender thread backlog)."""
+        with self.lock:
+            self.outbox_wait = max(self.outbox_wait, waited)
+
+    @property
+    def queue_delay(self):
+        if self.srtt is None or self.min_rtt is None:
+            return 0.0
+        return max(0.0, self.srtt - self.min_rtt)
+
+    def update(self, dt):
+        """Advance timers; returns True when a snapshot should be sent this frame."""
+        self.eval_timer += dt
+        if self.eval_timer >= self.EVAL_INTERVAL:
+            with self.lock:
+                congested = (self.queue_delay > self.QUEUE_DELAY_LIMIT
+                             or self.blocked_time > self.eval_timer * 0.1
+                             or self.outbox_wait > self.QUEUE_DELAY_LIMIT)
+                self.blocked_time = 0.0
+                self.outbox_wait = 0.0
+            if congested:
+                self.rate = max(self.MIN_RATE, self.rate * 0.7)
+            else:
+                self.rate = min(self.MAX_RATE, self.rate + 5)
+            self.eval_timer = 0.0
+
+        self.send_timer += dt
+        if self.send_timer >= 1.0 / self.rate:
+            self.send_timer = 0.0
+            return True
+        return False
+
+    def shape(self, data):
+        """Quantize cosmetic fields to a step that grows as the rate drops."""
+        for below, step in self.COSMETIC_STEPS:
+            if self.rate < below:
+                break
+        else:
+            return data
+        shaped = dict(data)
+        for key in self.COSMETIC_FIELDS:
+            value = shaped.get(key)
+            if isinstance(value, (int, float)):
+                shaped[key] = round(value / step) * step
+        return shaped
+
+
+class PeerSession:
+    """Direct UDP link to the other player of a 1v1 room.
+
+    Carries only player state snapshots - gameplay events stay on the reliable
+    relay. Every datagram is a u32 sequence number followed by a normal
+    protocol frame, so late or reordered snapshots are simply dropped. The
+    session only counts as active once the peer has been heard from, and
+    falls back to inactive (relay) if it goes quiet for PEER_TIMEOUT.
+    """
+
+    HELLO_INTERVAL = 0.25  # Seconds between hellos/keepalives
+    PEER_TIMEOUT = 2.0  # Seconds of silence before falling back to the relay
+    WIRE_VERSION = 3  # The peer's own version is unknown; every build with peer sessions speaks v3
+
+    def __init__(self, capture=None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('', 0))
+        self.sock.settimeout(self.HELLO_INTERVAL)
+        self.port = self.sock.getsockname()[1]
+        self.room_code = None
+        self.player_id = None
+        self.peer_addr = None
+        self.peer_id = None
+        self.send_seq = 0
+        self.recv_seq = 0
+        self.last_heard = 0.0
+        self.running = False
+        self.on_state = None  # Callback(data) for fresh peer snapshots
+        self.capture = capture  # The client's CaptureWriter; datagrams are tagged CONN_PEER
+
+    @property
+    def active(self):
+        return self.running and time.time() - self.last_heard < self.PEER_TIMEOUT
+
+    def start(self, room_code, player_id, peer_host, peer_port, peer_id):
+        """Begin talking to the peer the server introduced."""
+        self.room_code = room_code
+        self.player_id = player_id
+        self.peer_addr = (peer_host, peer_port)
+        self.peer_id = peer_id
+        self.running = True
+        print(f"✓ P2P: trying direct link to {peer_host}:{peer_port}")
+        threading.Thread(target=self._receive_loop, daemon=True).start()
+
+    def send(self, message):
+        """Send one message to the peer (fire and forget)."""
+        self.send_seq = (self.send_seq + 1) & 0xFFFFFFFF
+        frame = encode_message(message, self.WIRE_VERSION)
+        try:
+            self.sock.sendto(_SEQ.pack(self.send_seq) + frame, self.peer_addr)
+        except OSError:
+            return  # Unreachable peer just means we stay on the relay
+        if self.capture:
+            self.capture.record(DIRECTION_OUT, frame[2:], CONN_PEER)
+
+    def _receive_loop(self):
+        next_hello = 0.0
+        was_active = False
+        while self.running:
+            now = time.time()
+            if now >= next_hello:
+                self.send({'type': 'peer_hello', 'room_code': self.room_code, 'player_id': self.player_id})
+                next_hello = now + self.HELLO_INTERVAL
+            if was_active and not self.active:
+                print("✗ P2P: peer went quiet - falling back to relay")
+            was_active = self.active
+
+            try:
+                data, addr = self.sock.recvfrom(MAX_FRAME_SIZE + _SEQ.size)
+            except socket.timeout:
+                continue
+            except OSError:
+                if self.running:
+                    continue
+                break
+            if addr[0] != self.peer_addr[0] or len(data) < _SEQ.size:
+                continue  # Not our peer
+            if self.capture and len(data) > _SEQ.size + 2:
+                self.capture.record(DIRECTION_IN, data[_SEQ.size + 2:], CONN_PEER)
+            try:
+                message = decode_message(data[_SEQ.size:])
+            except ProtocolError:
+                continue
+            if message.get('room_code') != self.room_code or message.get('player_id') != self.peer_id:
+                continue
+
+            if not self.active:
+                print(f"✓ P2P: direct link to player {self.peer_id} established")
+            self.last_heard = time.time()
+            if message['type'] == 'update':
+                seq = _SEQ.unpack_from(data)[0]
+                if seq <= self.recv_seq:
+                    continue  # Late or duplicate - a newer snapshot already arrived
+                self.recv_seq = seq
+                if self.on_state:
+                    self.on_state(message.get('data') or {})
+
+    def close(self):
+        self.running = False
+        try:
+            self.sock.close()
+        except:
+            pass
 
 
 class GameClient:
     """Client for connecting to multiplayer games."""
 
-    def __init__(self):
+    P2P_MIRROR_INTERVAL = 0.2  # While on P2P, still relay a snapshot this often (spectators, fallback)
+
+    def __init__(self, capture_path=None, p2p=True):
         self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.client_socket.settimeout(10.0)  # Set 10 second timeout to prevent infinite blocking
         self.connected = False
@@ -189,6 +673,26 @@ class GameClient:
         self.response_lock = threading.Lock()
         self.pending_response = None
         self.game_starting = False  # Separate flag for game start signal
+        self.is_spectator = False
+        self.snapshot = {}  # Latest room snapshot (spectators only)
+        self.protocol_version = None  # Negotiated with the server in connect()
+        self.send_lock = threading.Lock()
+
+        # Outbox: events are never dropped and always go first; only the
+        # latest snapshot is kept so a slow link can't build up latency
+        self.scheduler = SendScheduler()
+        self.outbox = threading.Condition()
+        self.pending_events = deque()
+        self.pending_snapshot = None
+        self.pending_snapshot_at = 0.0
+        self.received_events = deque()
+        self.ping_seq = 0
+        self.ping_sent = {}  # {seq: send time}
+        self.send_thread = None
+        self.capture = CaptureWriter(capture_path, ROLE_CLIENT) if capture_path else None
+        self.p2p = p2p  # Offer a direct UDP link for 1v1 rooms
+        self.peer = None  # PeerSession once offered
+        self.last_mirror = 0.0
 
     def connect(self, host):
         """Connect to server."""
@@ -203,10 +707,15 @@ class GameClient:
             self.receive_thread = threading.Thread(target=self._receive_messages, daemon=True)
             self.receive_thread.start()
 
-            # Give the thread a moment to start
-            time.sleep(0.1)
+            # Negotiate the protocol version before anything else
+            if not self._handshake():
+                self.disconnect()
+                return False
+
+            self.send_thread = threading.Thread(target=self._send_messages, daemon=True)
+            self.send_thread.start()
 
-            print(f"✓ Connected to server at {host}")
+            print(f"✓ Connected to server at {host} (protocol v{self.protocol_version})")
             return True
         except socket.timeout:
             print(f"✗ Connection timeout - server didn't respond")
@@ -215,12 +724,40 @@ class GameClient:
             print(f"✗ Connection error: {e}")
             return False
 
+    def _handshake(self):
+        """Send hello and wait for the server to pick a protocol version."""
+        self._send({'type': 'hello'}, version=PROTOCOL_VERSION)
+        start_time = time.time()
+        while time.time() - start_time < 5.0 and self.connected:  # 5 second timeout
+            with self.response_lock:
+                if self.pending_response and self.pending_response.get('type') == 'hello_ack':
+                    response = self.pending_response
+                    self.pending_response = None
+
+                    if response['status'] == 'success':
+                        self.protocol_version = response['version']
+                        return True
+                    print(f"✗ {response.get('message', 'Protocol version rejected')}")
+                    return False
+            time.sleep(0.02)
+
+        print("✗ Timeout waiting for protocol handshake")
+        return False
+
+    def _send(self, message, version=None):
+        """Encode and send one message to the server."""
+        frame = encode_message(message, version or self.protocol_version or PROTOCOL_VERSION)
+        with self.send_lock:
+            self.client_socket.sendall(frame)
+        if self.capture:
+            self.capture.record(DIRECTION_OUT, frame[2:])
+
     def create_room(self, room_code, player_name='Host'):
         """Create a new room."""
         try:
             message = {'type': 'create_room', 'room_code': room_code, 'player_name': player_name}
             print(f"Sending create_room request for: {room_code}")
-            self.client_socket.send(pickle.dumps(message))
+            self._send(message)
 
             # Wait for response with timeout
             print("Waiting for server response...")
@@ -236,6 +773,7 @@ class GameClient:
                             self.room_code = response['room_code']
                             self.lobby_players = response.get('players', [player_name])
                             print(f"✓ Room created: {room_code}, Player ID: {self.player_id}")
+                            self._offer_peer()
                             return True
                         return False
                 time.sleep(0.05)  # Small delay to prevent busy waiting
@@ -254,7 +792,7 @@ class GameClient:
 
             message = {'type': 'join_room', 'room_code': room_code, 'player_name': player_name}
             print(f"Sending join_room request for: {room_code}")
-            self.client_socket.send(pickle.dumps(message))
+            self._send(message)
 
             # Wait for response with timeout
             print("Waiting for server response...")
@@ -271,6 +809,7 @@ class GameClient:
                             self.room_code = response['room_code']
                             self.lobby_players = response.get('players', [])
                             print(f"✓ Joined room: {room_code}, Player ID: {self.player_id}")
+                            self._offer_peer()
                             return True
                         else:
                             print(f"✗ {response.get('message', 'Failed to join')}")
@@ -298,6 +837,58 @@ class GameClient:
             self.room_code = None  # Reset on error
             return False
 
+    def spectate_room(self, room_code, spectator_name='Spectator'):
+        """Join an existing room as a read-only spectator."""
+        try:
+            message = {'type': 'join_room', 'role': 'spectator', 'room_code': room_code, 'player_name': spectator_name}
+            print(f"Sending spectate request for: {room_code}")
+            self._send(message)
+
+            start_time = time.time()
+            while time.time() - start_time < 5.0:  # 5 second timeout
+                with self.response_lock:
+                    if self.pending_response and self.pending_response.get('type') == 'spectate_response':
+                        response = self.pending_response
+                        self.pending_response = None
+
+                        if response['status'] == 'success':
+                            self.is_spectator = True
+                            self.room_code = response['room_code']
+                            self.lobby_players = response.get('players', [])
+                            print(f"✓ Spectating room: {room_code}")
+                            return True
+                        print(f"✗ {response.get('message', 'Failed to spectate')}")
+                        return False
+                time.sleep(0.05)
+
+            print("✗ Timeout waiting for spectate response")
+            return False
+        except Exception as e:
+            print(f"✗ Spectate error: {e}")
+            return False
+
+    def _offer_peer(self):
+        """Tell the server we can take direct UDP traffic (used if the room stays 1v1)."""
+        if not self.p2p or (self.protocol_version or 1) < 3:
+            return
+        try:
+            if self.peer is None:
+                self.peer = PeerSession(self.capture)
+                self.peer.on_state = self._on_peer_state
+            self._send({'type': 'peer_offer', 'room_code': self.room_code, 'player_id': self.player_id,
+                        'port': self.peer.port})
+        except Exception as e:
+            print(f"✗ P2P offer failed, staying on relay: {e}")
+            self.peer = None
+
+    def _on_peer_state(self, data):
+        self.game_state = data
+
+    @property
+    def direct(self):
+        """True while snapshots travel over the direct P2P link."""
+        return self.peer is not None and self.peer.active
+
     def get_lobby_info(self):
         """Get current lobby information - non-blocking version."""
         if not self.connected or not self.room_code:
@@ -305,25 +896,98 @@ class GameClient:
 
         try:
             message = {'type': 'get_lobby', 'room_code': self.room_code}
-            self.client_socket.send(pickle.dumps(message))
+            self._send(message)
             # Don't wait for response - it will be processed by receive thread
             return True
         except Exception as e:
             print(f"Get lobby error: {e}")
             return None
 
+    def should_send_snapshot(self, dt):
+        """Advance the adaptive scheduler; True when it's time to send a snapshot."""
+        return self.scheduler.update(dt)
+
     def send_update(self, data):
-        """Send game state update to server."""
-        try:
-            message = {
-                'type': 'update',
-                'room_code': self.room_code,
-                'player_id': self.player_id,
-                'data': data
-            }
-            self.client_socket.send(pickle.dumps(message))
-        except Exception as e:
-            print(f"Send error: {e}")
+        """Queue a game state snapshot (latest wins) - events are routed to send_event."""
+        if isinstance(data, dict) and 'type' in data:
+            self.send_event(data)
+            return
+        message = {
+            'type': 'update',
+            'room_code': self.room_code,
+            'player_id': self.player_id,
+            'data': self.scheduler.shape(data)
+        }
+        with self.outbox:
+            if self.pending_snapshot is None:
+                self.pending_snapshot_at = time.time()  # Oldest unsent state, for backlog detection
+            self.pending_snapshot = message
+            self.outbox.notify()
+
+    def send_event(self, data):
+        """Queue a gameplay event (e.g. weapon_forged); sent before any snapshot."""
+        message = {
+            'type': 'update',
+            'room_code': self.room_code,
+            'player_id': self.player_id,
+            'data': data
+        }
+        with self.outbox:
+            self.pending_events.append(message)
+            self.outbox.notify()
+
+    def poll_events(self):
+        """Return and clear gameplay events received from other players."""
+        events = []
+        while self.received_events:
+            events.append(self.received_events.popleft())
+        return events
+
+    def _send_messages(self):
+        """Drain the outbox: events first, then the newest snapshot, plus RTT probes."""
+        next_ping = time.time()
+        can_ping = (self.protocol_version or 1) >= 2
+        while self.connected:
+            with self.outbox:
+                timeout = max(0.0, next_ping - time.time()) if can_ping else 0.5
+                if not self.pending_events and self.pending_snapshot is None:
+                    self.outbox.wait(timeout)
+                events = list(self.pending_events)
+                self.pending_events.clear()
+                snapshot, self.pending_snapshot = self.pending_snapshot, None
+                if snapshot:
+                    self.scheduler.on_dequeue(time.time() - self.pending_snapshot_at)
+
+            try:
+                for message in events:
+                    start = time.time()
+                    self._send(message)
+                    self.scheduler.on_send(time.time() - start)
+
+                if snapshot:
+                    start = time.time()
+                    if self.direct:
+                        self.peer.send(snapshot)
+                        # A slow trickle still goes via the relay for spectators and fallback
+                        if start - self.last_mirror >= self.P2P_MIRROR_INTERVAL:
+                            self.last_mirror = start
+                            self._send(snapshot)
+                    else:
+                        self._send(snapshot)
+                    self.scheduler.on_send(time.time() - start)
+
+                if can_ping and time.time() >= next_ping:
+                    self.ping_seq += 1
+                    self.ping_sent[self.ping_seq] = time.time()
+                    self._send({'type': 'ping', 'seq': self.ping_seq})
+                    next_ping = time.time() + SendScheduler.PING_INTERVAL
+                    # Forget probes that never came back
+                    for seq in [seq for seq in self.ping_sent if seq < self.ping_seq - 10]:
+                        del self.ping_sent[seq]
+            except Exception as e:
+                if self.connected:
+                    print(f"Send error: {e}")
+                break
 
     def send_start_game(self):
         """Send message that the game is starting."""
@@ -332,7 +996,7 @@ class GameClient:
                 'type': 'start_game',
                 'room_code': self.room_code
             }
-            self.client_socket.send(pickle.dumps(message))
+            self._send(message)
             print("✓ Sent start game signal to server")
         except Exception as e:
             print(f"Start game error: {e}")
@@ -340,16 +1004,34 @@ class GameClient:
     def _receive_messages(self):
         """Receive messages from server."""
         self.client_socket.settimeout(1.0)  # Use timeout in receive loop
+        frames = FrameBuffer()
         while self.connected:
             try:
                 data = self.client_socket.recv(4096)
-                if data:
-                    message = pickle.loads(data)
+                if not data:
+                    break
+                for body in frames.feed(data):
+                    if self.capture:
+                        self.capture.record(DIRECTION_IN, body)
+                    message = decode_body(body, self.protocol_version or PROTOCOL_VERSION)
                     msg_type = message.get('type')
 
                     if msg_type == 'update':
-                        # Update game state with received data
-                        self.game_state = message.get('data', {})
+                        data = message.get('data') or {}
+                        if 'type' in data:
+                            # Gameplay event - queue it so a later snapshot can't overwrite it
+                            self.received_events.append(data)
+                        elif not self.direct:
+                            # Update game state with received data (P2P carries fresher state)
+                            self.game_state = data
+                    elif msg_type == 'pong':
+                        sent_at = self.ping_sent.pop(message.get('seq'), None)
+                        if sent_at is not None:
+                            self.scheduler.on_rtt(time.time() - sent_at)
+                    elif msg_type == 'snapshot':
+                        # Read-only room snapshot pushed to spectators every tick
+                        self.snapshot = message
+                        self.lobby_players = message.get('player_names', self.lobby_players)
                     elif msg_type == 'player_joined':
                         # Update lobby players list
                         self.lobby_players = message.get('players', [])
@@ -360,30 +1042,27 @@ class GameClient:
                         print("✓ Host is starting the game!")
                         with self.response_lock:
                             self.game_starting = True  # Use separate flag only
+                    elif msg_type == 'peer_info':
+                        # Server introduced the other player - try the direct link
+                        if self.peer is not None and not self.peer.running:
+                            self.peer.start(message['room_code'], self.player_id,
+                                            message['host'], message['port'], message['player_id'])
+                    elif msg_type == 'lobby_info':
+                        # Update lobby players from get_lobby response
+                        if message.get('status') == 'success':
+                            self.lobby_players = message.get('players', [])
+                    elif msg_type == 'ack':
+                        if message.get('status') == 'error':
+                            print(f"✗ Server: {message.get('message')}")
                     else:
-                        # Store response for pending requests
+                        # Store response for pending requests (hello_ack, *_response)
                         with self.response_lock:
-                            # Check if this is a lobby info response
-                            if message.get('status') == 'success' and 'player_count' in message:
-                                # Update lobby players from get_lobby response
-                                self.lobby_players = message.get('players', [])
-
-                            # Tag the response type for easier matching
-                            if message.get('status') in ['success', 'error']:
-                                # This is a response to a request
-                                self.pending_response = message
-                                # Infer response type from context
-                                if 'player_id' in message:
-                                    if self.room_code is None:
-                                        message['type'] = 'create_room_response'
-                                    else:
-                                        message['type'] = 'join_room_response'
-                                elif 'player_count' in message:
-                                    message['type'] = 'get_lobby_response'
-                else:
-                    break
+                            self.pending_response = message
             except socket.timeout:
                 continue  # Just check if still connected
+            except ProtocolError as e:
+                print(f"✗ Malformed message from server: {e}")
+                break
             except Exception as e:
                 if self.connected:
                     print(f"Receive error: {e}")
@@ -393,9 +1072,19 @@ class GameClient:
         """Get current game state."""
         return self.game_state
 
+    def get_snapshot(self):
+        """Get the latest room snapshot (spectators only)."""
+        return self.snapshot
+
     def disconnect(self):
         """Disconnect from server."""
         self.connected = False
+        with self.outbox:
+            self.outbox.notify()
+        if self.peer:
+            self.peer.close()
+        if self.capture:
+            self.capture.close()
         try:
             self.client_socket.close()
         except:
@@ -403,10 +1092,10 @@ class GameClient:
 
 
 # Utility functions
-def start_server():
+def start_server(capture_path=None):
     """Start a game server."""
     try:
-        server = GameServer()
+        server = GameServer(capture_path=capture_path)
         if server.start():
             # Store server instance globally so it stays running
             globals()['_game_server'] = server
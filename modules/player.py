@@ -398,19 +398,8 @@ class Player:
                 hand_x = self.rect.centerx + (self.rect.width // 4 if self.facing_right else -self.rect.width // 4)
                 hand_y = self.rect.centery
 
-                # Get weapon surface and scale/flip for facing
-                surf = w.get_surface()
-                if not self.facing_right:
-                    try:
-                        surf = pygame.transform.flip(surf, True, False)
-                    except Exception:
-                        pass
-
-                # Scale surface to weapon size if needed
-                try:
-                    surf = pygame.transform.smoothscale(surf, (w.size, w.size))
-                except Exception:
-                    pass
+                # Weapon surface at weapon size, flipped for facing (cached by the weapon)
+                surf = w.get_surface(w.size, flipped=not self.facing_right)
 
                 surf_rect = surf.get_rect(center=(hand_x, hand_y))
                 screen.blit(surf, surf_rect)
@@ -0,0 +1,117 @@
+# modules/prompt_index.py
+# Prompt Index - finds the most similar previously forged prompt (no network)
+#
+# Prompts are reduced to canonical tokens (stopwords dropped, common synonyms
+# folded, plurals trimmed, sorted so word order doesn't matter) and compared
+# with a blend of token Jaccard and character trigram cosine similarity.
+# An inverted trigram index keeps lookups to the prompts that share text.
+
+import re
+import math
+from collections import Counter
+
+STOPWORDS = {'a', 'an', 'the', 'of', 'with', 'and', 'made', 'in', 'that', 'is'}
+
+# Fold words players use interchangeably onto one token
+SYNONYMS = {
+    'flaming': 'fire', 'flame': 'fire', 'flames': 'fire', 'fiery': 'fire', 'burning': 'fire', 'blazing': 'fire',
+    'frozen': 'ice', 'icy': 'ice', 'frost': 'ice', 'freezing': 'ice',
+    'electric': 'lightning', 'thunder': 'lightning', 'storm': 'lightning', 'shock': 'lightning',
+    'huge': 'massive', 'giant': 'massive', 'big': 'massive',
+    'quick': 'swift', 'fast': 'swift', 'rapid': 'swift',
+    'blade': 'sword', 'katana': 'sword', 'sabre': 'sword', 'saber': 'sword',
+    'mace': 'hammer', 'warhammer': 'hammer', 'lance': 'spear', 'pike': 'spear', 'hatchet': 'axe',
+}
+
+
+def normalize_prompt(prompt):
+    """Lowercase, collapse whitespace and strip punctuation so trivial variants share a key."""
+    text = (prompt or '').lower()
+    text = re.sub(r"[^\w\s'-]", ' ', text)
+    return ' '.join(text.split())
+
+
+def canonical_tokens(prompt):
+    """Sorted, de-duplicated canonical tokens of a prompt."""
+    tokens = set()
+    for word in normalize_prompt(prompt).replace("'", ' ').replace('-', ' ').split():
+        if word in STOPWORDS:
+            continue
+        word = SYNONYMS.get(word, word)
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = SYNONYMS.get(word[:-1], word[:-1])
+        tokens.add(word)
+    return tuple(sorted(tokens))
+
+
+def _trigrams(tokens):
+    text = ' '.join(tokens)
+    padded = f"  {text} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class PromptIndex:
+    """In-memory similarity index over forged prompts, keyed by cache key."""
+
+    def __init__(self, token_weight=0.5):
+        self.token_weight = token_weight  # Rest of the score is the trigram cosine
+        self.entries = {}  # {key: (prompt, tokens, trigram counts, norm)}
+        self.postings = {}  # {trigram: set of keys}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, key, prompt):
+        self.remove(key)
+        tokens = canonical_tokens(prompt)
+        grams = _trigrams(tokens)
+        norm = math.sqrt(sum(c * c for c in grams.values()))
+        self.entries[key] = (prompt, tokens, grams, norm)
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for gram in entry[2]:
+            keys = self.postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[gram]
+
+    def similarity(self, a, b):
+        """Score in [0, 1] between two prompts."""
+        ta, tb = canonical_tokens(a), canonical_tokens(b)
+        ga, gb = _trigrams(ta), _trigrams(tb)
+        return self._score(ta, ga, math.sqrt(sum(c * c for c in ga.values())),
+                           tb, gb, math.sqrt(sum(c * c for c in gb.values())))
+
+    def _score(self, ta, ga, na, tb, gb, nb):
+        if not ta or not tb:
+            return 0.0
+        sa, sb = set(ta), set(tb)
+        jaccard = len(sa & sb) / len(sa | sb)
+        dot = sum(count * gb.get(gram, 0) for gram, count in ga.items())
+        cosine = dot / (na * nb) if na and nb else 0.0
+        return self.token_weight * jaccard + (1 - self.token_weight) * cosine
+
+    def nearest(self, prompt, threshold=0.0):
+        """(key, matched prompt, score) of the closest indexed prompt at or above threshold, or None."""
+        tokens = canonical_tokens(prompt)
+        if not tokens:
+            return None
+        grams = _trigrams(tokens)
+        norm = math.sqrt(sum(c * c for c in grams.values()))
+        candidates = set()
+        for gram in grams:
+            candidates |= self.postings.get(gram, set())
+
+        best = None
+        for key in candidates:
+            other_prompt, other_tokens, other_grams, other_norm = self.entries[key]
+            score = self._score(tokens, grams, norm, other_tokens, other_grams, other_norm)
+            if score >= threshold and (best is None or score > best[2]):
+                best = (key, other_prompt, score)
+        return best
@@ -0,0 +1,661 @@
+# modules/protocol.py
+# Wire protocol - schema-versioned binary codec for network messages
+#
+# Every message is a dict with a 'type' key, exactly like the old pickle
+# traffic, but only the fields declared in MESSAGE_SCHEMAS go on the wire.
+#
+# Frame layout:   [u16 body length][u8 type id][fields...]
+# Field types:    u8, u16, u32, pid (u8, 255 = None), str (u16 len + utf-8),
+#                 str_list (u8 count + str...), value (tagged, see below)
+#
+# Player state updates skip the tagged encoding: a full update is one fixed
+# struct (STATE_TYPE_ID), and from v4 a partial one is a struct holding only
+# the fields its mask says are present (STATE_TYPE_ID | COMPACT_FLAG).
+# Control messages are rare enough that the schema encoding above is kept.
+#
+# Decoding never executes anything from the wire: unknown types, oversized
+# frames, truncated fields and trailing bytes all raise ProtocolError.
+
+import struct
+import timeit
+import pickle
+
+PROTOCOL_VERSION = 4  # Bump when MESSAGE_SCHEMAS changes incompatibly
+MIN_PROTOCOL_VERSION = 1  # Oldest version this build can still talk to
+MAX_FRAME_SIZE = 0xFFFF  # u16 length prefix
+MAX_HELLO_SIZE = 16  # Frames larger than this before the handshake are rejected outright
+MAX_VALUE_DEPTH = 8  # Nesting limit for tagged values
+MAX_COLLECTION_SIZE = 1024  # Element limit for tagged lists/dicts
+
+
+class ProtocolError(Exception):
+    """Raised when a frame or message does not match the declared schema."""
+
+
+# type name -> (type id, [(field name, field type, default), ...])
+MESSAGE_SCHEMAS = {
+    # Connection handshake / version negotiation
+    'hello': (1, [('version', 'u8', PROTOCOL_VERSION), ('min_version', 'u8', MIN_PROTOCOL_VERSION)]),
+    'hello_ack': (2, [('status', 'str', 'success'), ('version', 'u8', PROTOCOL_VERSION), ('message', 'str', '')]),
+
+    # Client -> server requests
+    'create_room': (3, [('room_code', 'str', ''), ('player_name', 'str', 'Host')]),
+    'join_room': (4, [('room_code', 'str', ''), ('player_name', 'str', 'Player'), ('role', 'str', 'player')]),
+    'get_lobby': (5, [('room_code', 'str', '')]),
+    'start_game': (6, [('room_code', 'str', '')]),
+    'update': (7, [('room_code', 'str', ''), ('player_id', 'pid', None), ('data', 'value', None)]),
+
+    # Server -> client notifications
+    'player_joined': (8, [('players', 'str_list', ()), ('new_player', 'str', '')]),
+    'game_starting': (9, [('room_code', 'str', '')]),
+    'snapshot': (10, [('room_code', 'str', ''), ('tick', 'u32', 0), ('player_names', 'str_list', ()),
+                      ('players', 'value', None), ('weapons', 'value', None)]),
+
+    # Server -> client responses
+    'create_room_response': (11, [('status', 'str', 'error'), ('message', 'str', ''), ('player_id', 'pid', None),
+                                  ('room_code', 'str', ''), ('players', 'str_list', ())]),
+    'join_room_response': (12, [('status', 'str', 'error'), ('message', 'str', ''), ('player_id', 'pid', None),
+                                ('room_code', 'str', ''), ('players', 'str_list', ())]),
+    'spectate_response': (13, [('status', 'str', 'error'), ('message', 'str', ''), ('room_code', 'str', ''),
+                               ('players', 'str_list', ())]),
+    'lobby_info': (14, [('status', 'str', 'error'), ('message', 'str', ''), ('players', 'str_list', ()),
+                        ('player_count', 'u8', 0)]),
+    'ack': (15, [('status', 'str', 'ok'), ('message', 'str', '')]),
+
+    # v2: RTT probes for the adaptive send scheduler
+    'ping': (17, [('seq', 'u32', 0)]),
+    'pong': (18, [('seq', 'u32', 0)]),
+
+    # v3: direct peer-to-peer sessions for two-player rooms
+    'peer_offer': (19, [('room_code', 'str', ''), ('player_id', 'pid', None), ('port', 'u16', 0)]),
+    'peer_info': (20, [('room_code', 'str', ''), ('player_id', 'pid', None), ('host', 'str', ''), ('port', 'u16', 0)]),
+    'peer_hello': (21, [('room_code', 'str', ''), ('player_id', 'pid', None)]),
+}
+
+# Message types added after v1: type name -> first protocol version that has it
+MESSAGE_SINCE = {'ping': 2, 'pong': 2, 'peer_offer': 3, 'peer_info': 3, 'peer_hello': 3}
+
+_TYPE_BY_ID = {type_id: (name, fields) for name, (type_id, fields) in MESSAGE_SCHEMAS.items()}
+
+COMPACT_SINCE = 4  # First version with masked partial state frames
+COMPACT_FLAG = 0x40  # Type id bit marking a compact (masked) frame
+
+# Player state updates are by far the most common message, so they get a
+# fixed-layout fast path instead of the generic tagged 'value' encoding.
+STATE_TYPE_ID = 16
+STATE_FIELDS = ('x', 'y', 'vx', 'vy', 'health', 'alive', 'facing_right', 'attack_state')
+_STATE_KEYS = frozenset(STATE_FIELDS)
+_STATE = struct.Struct('!BBhhffhBB')  # player_id, present mask, x, y, vx, vy, health, flags, attack_state
+_STATE_CODES = ('h', 'h', 'f', 'f', 'h', '?', '?', 'B')  # Per STATE_FIELDS entry, for partial frames
+
+_U8 = struct.Struct('!B')
+_U16 = struct.Struct('!H')
+_U32 = struct.Struct('!I')
+_I64 = struct.Struct('!q')
+_F64 = struct.Struct('!d')
+
+_NO_PLAYER = 255
+
+
+# ═══════════════════════════════════════════════════
+# ENCODING
+# ═══════════════════════════════════════════════════
+
+_str_cache = {}  # Room codes and player names repeat constantly; cache their encoding
+
+
+def _encode_str(parts, value):
+    if value is None:
+        value = ''
+    encoded = _str_cache.get(value)
+    if encoded is None:
+        raw = str(value).encode('utf-8')
+        if len(raw) > MAX_FRAME_SIZE:
+            raise ProtocolError('string too long')
+        encoded = _U16.pack(len(raw)) + raw
+        if len(_str_cache) < 4096 and len(raw) <= 64:
+            _str_cache[value] = encoded
+    parts.append(encoded)
+
+
+def _encode_value(parts, value, depth=0):
+    """Tagged encoding for free-form data: N T F i d s l m."""
+    kind = type(value)
+    if kind is str:
+        parts.append(b's')
+        _encode_str(parts, value)
+    elif value is None:
+        parts.append(b'N')
+    elif kind is bool:
+        parts.append(b'T' if value else b'F')
+    elif kind is int:
+        parts.append(b'i' + _I64.pack(value))
+    elif kind is float:
+        parts.append(b'd' + _F64.pack(value))
+    elif kind is dict or kind is list or kind is tuple:
+        if depth >= MAX_VALUE_DEPTH:
+            raise ProtocolError('value nested too deeply')
+        if len(value) > MAX_COLLECTION_SIZE:
+            raise ProtocolError('collection too large')
+        if kind is dict:
+            parts.append(b'm' + _U16.pack(len(value)))
+            for key, item in value.items():
+                _encode_value(parts, key, depth + 1)
+                _encode_value(parts, item, depth + 1)
+        else:
+            parts.append(b'l' + _U16.pack(len(value)))
+            for item in value:
+                _encode_value(parts, item, depth + 1)
+    else:
+        raise ProtocolError(f'cannot encode value of type {kind.__name__}')
+
+
+def _encode_pid(parts, value):
+    parts.append(_U8.pack(_NO_PLAYER if value is None else value))
+
+
+def _encode_str_list(parts, value):
+    items = value or ()
+    if len(items) > 255:
+        raise ProtocolError('too many strings')
+    parts.append(_U8.pack(len(items)))
+    for item in items:
+        _encode_str(parts, item)
+
+
+_FIELD_ENCODERS = {
+    'str': _encode_str,
+    'u8': lambda parts, value: parts.append(_U8.pack(value or 0)),
+    'u16': lambda parts, value: parts.append(_U16.pack(value or 0)),
+    'u32': lambda parts, value: parts.append(_U32.pack(value or 0)),
+    'pid': _encode_pid,
+    'str_list': _encode_str_list,
+    'value': _encode_value,
+}
+
+
+def _compile_encoder(msg_type, type_id, fields):
+    """Build a specialised encoder for one message type from its schema."""
+    steps = tuple((name, _FIELD_ENCODERS[field_type], default) for name, field_type, default in fields)
+    head = _U8.pack(type_id)
+
+    def encode(message):
+        parts = [head]
+        get = message.get
+        try:
+            for name, encode_field, default in steps:
+                encode_field(parts, get(name, default))
+        except (struct.error, TypeError) as e:
+            raise ProtocolError(f'bad field in {msg_type}: {e}')
+        body = b''.join(parts)
+        if len(body) > MAX_FRAME_SIZE:
+            raise ProtocolError('message too large')
+        return _U16.pack(len(body)) + body
+
+    return encode
+
+
+_ENCODERS = {name: _compile_encoder(name, type_id, fields) for name, (type_id, fields) in MESSAGE_SCHEMAS.items()}
+_FULL_STATE_MASK = (1 << len(STATE_FIELDS)) - 1
+_PARTIAL_STATE_ID = STATE_TYPE_ID | COMPACT_FLAG
+
+
+def _partial_layout(mask):
+    """(mask, frame struct, body struct, present keys) of one partial state mask."""
+    keys = tuple(key for bit, key in enumerate(STATE_FIELDS) if mask & (1 << bit))
+    codes = ''.join(_STATE_CODES[STATE_FIELDS.index(key)] for key in keys)
+    return mask, struct.Struct('!HBBB' + codes), struct.Struct('!BBB' + codes), keys
+
+
+# Partial body: [type id][player_id][mask][present fields, in STATE_FIELDS order][room code utf-8]
+_PARTIAL_STATES = {mask: _partial_layout(mask) for mask in range(1, _FULL_STATE_MASK)}
+_partial_by_keys = {}  # tuple(data) -> layout; a sender builds its dicts the same way every tick
+
+
+def _partial_for(data):
+    order = tuple(data)
+    layout = _partial_by_keys.get(order)
+    if layout is None:
+        if not data or not data.keys() <= _STATE_KEYS:
+            return None
+        layout = _PARTIAL_STATES[sum(1 << STATE_FIELDS.index(key) for key in data)]
+        if len(_partial_by_keys) < 1024:
+            _partial_by_keys[order] = layout
+    return layout
+
+
+def _room_bytes(room_code):
+    room_raw = str(room_code).encode('utf-8')
+    if len(room_raw) > 255:
+        return None
+    if len(_room_cache) < 256:
+        _room_cache[room_code] = room_raw
+    return room_raw
+
+
+def _encode_state(message, partial=False):
+    """Fixed-layout fast path for player state updates; returns None if not applicable.
+
+    Full body: [type id][_STATE][room code utf-8 filling the rest of the frame].
+    With partial (v4+), updates carrying only some fields get their masked
+    layout. Values a layout can't hold exactly - float coordinates, out of
+    range numbers - return None, so the generic encoding carries them as is.
+    """
+    data = message.get('data')
+    if type(data) is not dict:
+        return None
+    if len(data) == len(STATE_FIELDS) and data.keys() == _STATE_KEYS:
+        layout = None
+    elif partial:
+        layout = _partial_for(data)
+        if layout is None:
+            return None
+    else:
+        return None
+    room_code = message.get('room_code') or ''
+    room_raw = _room_cache.get(room_code) or _room_bytes(room_code)
+    if room_raw is None:
+        return None
+    player_id = message.get('player_id')
+    if player_id is None:
+        player_id = _NO_PLAYER
+    try:
+        if layout is None:
+            flags = (1 if data['alive'] else 0) | (2 if data['facing_right'] else 0)
+            return _STATE_FRAME.pack(_STATE_FRAME.size - 2 + len(room_raw), STATE_TYPE_ID, player_id,
+                                     _FULL_STATE_MASK, data['x'], data['y'], data['vx'], data['vy'],
+                                     data['health'], flags, data['attack_state']) + room_raw
+        mask, frame, _, keys = layout
+        return frame.pack(frame.size - 2 + len(room_raw), _PARTIAL_STATE_ID, player_id, mask,
+                          *map(data.__getitem__, keys)) + room_raw
+    except struct.error:
+        return None
+
+
+_room_cache = {}
+_STATE_FRAME = struct.Struct('!HB' + _STATE.format[1:])  # length + type id + state in one pack
+
+
+def _encode_update(message):
+    """State fast path, else the tagged encoding."""
+    return _encode_state(message) or _ENCODERS['update'](message)
+
+
+def _encode_update_compact(message):
+    """v4: partial state updates get their masked layout too."""
+    return _encode_state(message, True) or _ENCODERS['update'](message)
+
+
+def encode_message(message, version=PROTOCOL_VERSION):
+    """Encode a message dict into a length-prefixed frame (bytes)."""
+    encoders = _VERSION_ENCODERS.get(version)
+    if encoders is None:
+        raise ProtocolError(f'unsupported protocol version {version}')
+    msg_type = message.get('type')
+    encoder = encoders.get(msg_type)
+    if encoder is None:
+        if msg_type in MESSAGE_SCHEMAS:
+            raise ProtocolError(f'{msg_type} needs protocol v{MESSAGE_SINCE[msg_type]}, peer speaks v{version}')
+        raise ProtocolError(f'unknown message type {msg_type!r}')
+    return encoder(message)
+
+
+# ═══════════════════════════════════════════════════
+# DECODING
+# ═══════════════════════════════════════════════════
+
+def _decode_str(buf, off):
+    end = off + 2
+    if end > len(buf):
+        raise ProtocolError('truncated string length')
+    end += _U16.unpack_from(buf, off)[0]
+    if end > len(buf):
+        raise ProtocolError('truncated string')
+    try:
+        return str(buf[off + 2:end], 'utf-8'), end
+    except UnicodeDecodeError:
+        raise ProtocolError('invalid utf-8 string')
+
+
+def _decode_value(buf, off, depth=0):
+    if off >= len(buf):
+        raise ProtocolError('truncated value')
+    tag = buf[off]
+    off += 1
+    if tag == 0x73:  # s
+        return _decode_str(buf, off)
+    if tag == 0x69:  # i
+        if off + 8 > len(buf):
+            raise ProtocolError('truncated int')
+        return _I64.unpack_from(buf, off)[0], off + 8
+    if tag == 0x54:  # T
+        return True, off
+    if tag == 0x46:  # F
+        return False, off
+    if tag == 0x4E:  # N
+        return None, off
+    if tag == 0x64:  # d
+        if off + 8 > len(buf):
+            raise ProtocolError('truncated float')
+        return _F64.unpack_from(buf, off)[0], off + 8
+    if tag == 0x6C or tag == 0x6D:  # l, m
+        if depth >= MAX_VALUE_DEPTH:
+            raise ProtocolError('value nested too deeply')
+        if off + 2 > len(buf):
+            raise ProtocolError('truncated collection')
+        count = _U16.unpack_from(buf, off)[0]
+        off += 2
+        # Every element needs at least one byte, so bogus counts fail fast
+        if count > MAX_COLLECTION_SIZE or count > len(buf) - off:
+            raise ProtocolError('collection too large')
+        if tag == 0x6C:
+            items = []
+            for _ in range(count):
+                item, off = _decode_value(buf, off, depth + 1)
+                items.append(item)
+            return items, off
+        result = {}
+        for _ in range(count):
+            key, off = _decode_value(buf, off, depth + 1)
+            if type(key) is list or type(key) is dict:
+                raise ProtocolError('unhashable dict key')
+            result[key], off = _decode_value(buf, off, depth + 1)
+        return result, off
+    raise ProtocolError(f'unknown value tag {tag}')
+
+
+def _fixed_decoder(packer, field_type):
+    size = packer.size
+
+    def decode(buf, off):
+        if off + size > len(buf):
+            raise ProtocolError(f'truncated {field_type}')
+        value = packer.unpack_from(buf, off)[0]
+        if field_type == 'pid' and value == _NO_PLAYER:
+            value = None
+        return value, off + size
+
+    return decode
+
+
+def _decode_str_list(buf, off):
+    if off >= len(buf):
+        raise ProtocolError('truncated list')
+    count = buf[off]
+    off += 1
+    items = []
+    for _ in range(count):
+        item, off = _decode_str(buf, off)
+        items.append(item)
+    return items, off
+
+
+_FIELD_DECODERS = {
+    'str': _decode_str,
+    'u8': _fixed_decoder(_U8, 'u8'),
+    'u16': _fixed_decoder(_U16, 'u16'),
+    'u32': _fixed_decoder(_U32, 'u32'),
+    'pid': _fixed_decoder(_U8, 'pid'),
+    'str_list': _decode_str_list,
+    'value': _decode_value,
+}
+
+
+def _compile_decoder(msg_type, fields):
+    """Build a specialised decoder for one message type from its schema."""
+    steps = tuple((name, _FIELD_DECODERS[field_type]) for name, field_type, _ in fields)
+
+    def decode(buf):
+        message = {'type': msg_type}
+        off = 1
+        for name, decode_field in steps:
+            message[name], off = decode_field(buf, off)
+        if off != len(buf):
+            raise ProtocolError(f'{len(buf) - off} trailing bytes in {msg_type}')
+        return message
+
+    return decode
+
+
+_DECODERS = {type_id: _compile_decoder(name, fields) for name, (type_id, fields) in MESSAGE_SCHEMAS.items()}
+
+
+def _decode_state(buf):
+    if len(buf) < 1 + _STATE.size:
+        raise ProtocolError('truncated state frame')
+    player_id, mask, x, y, vx, vy, health, flags, attack_state = _STATE.unpack_from(buf, 1)
+    try:
+        room_code = str(buf[1 + _STATE.size:], 'utf-8')
+    except UnicodeDecodeError:
+        raise ProtocolError('invalid utf-8 string')
+    if mask == _FULL_STATE_MASK:
+        data = {'x': x, 'y': y, 'vx': vx, 'vy': vy, 'health': health,
+                'alive': (flags & 1) != 0, 'facing_right': (flags & 2) != 0, 'attack_state': attack_state}
+    else:
+        values = (x, y, vx, vy, health, (flags & 1) != 0, (flags & 2) != 0, attack_state)
+        data = {key: values[bit] for bit, key in enumerate(STATE_FIELDS) if mask & (1 << bit)}
+    return {
+        'type': 'update',
+        'room_code': room_code,
+        'player_id': None if player_id == _NO_PLAYER else player_id,
+        'data': data
+    }
+
+
+def _decode_partial_state(buf):
+    layout = _PARTIAL_STATES.get(buf[2]) if len(buf) > 2 else None
+    if layout is None:
+        raise ProtocolError('truncated state frame' if len(buf) < 3 else f'bad state field mask {buf[2]}')
+    _, _, body, keys = layout
+    if len(buf) < body.size:
+        raise ProtocolError('truncated state frame')
+    _, player_id, _, *values = body.unpack_from(buf)
+    try:
+        room_code = str(buf[body.size:], 'utf-8')
+    except UnicodeDecodeError:
+        raise ProtocolError('invalid utf-8 string')
+    return {
+        'type': 'update',
+        'room_code': room_code,
+        'player_id': None if player_id == _NO_PLAYER else player_id,
+        'data': dict(zip(keys, values))
+    }
+
+
+def _encoders_for(version):
+    table = {name: _ENCODERS[name] for name in MESSAGE_SCHEMAS if MESSAGE_SINCE.get(name, 1) <= version}
+    table['update'] = _encode_update_compact if version >= COMPACT_SINCE else _encode_update
+    return table
+
+
+def _decoders_for(version):
+    table = {type_id: _DECODERS[type_id] for name, (type_id, _) in MESSAGE_SCHEMAS.items()
+             if MESSAGE_SINCE.get(name, 1) <= version}
+    table[STATE_TYPE_ID] = _decode_state
+    if version >= COMPACT_SINCE:
+        table[_PARTIAL_STATE_ID] = _decode_partial_state
+    return table
+
+
+# Per-version dispatch, so version and type checks cost one dict lookup each
+_VERSION_ENCODERS = {version: _encoders_for(version) for version in range(MIN_PROTOCOL_VERSION, PROTOCOL_VERSION + 1)}
+_VERSION_DECODERS = {version: _decoders_for(version) for version in range(MIN_PROTOCOL_VERSION, PROTOCOL_VERSION + 1)}
+
+
+def decode_body(body, version=PROTOCOL_VERSION):
+    """Decode one frame body (without the length prefix) into a message dict."""
+    decoders = _VERSION_DECODERS.get(version)
+    if decoders is None:
+        raise ProtocolError(f'unsupported protocol version {version}')
+    if not body:
+        raise ProtocolError('empty frame')
+    decoder = decoders.get(body[0])
+    if decoder is None:
+        type_id = body[0]
+        if type_id == _PARTIAL_STATE_ID:
+            raise ProtocolError(f'compact frames are not part of protocol v{version}')
+        if type_id in _TYPE_BY_ID:
+            raise ProtocolError(f'{_TYPE_BY_ID[type_id][0]} is not part of protocol v{version}')
+        raise ProtocolError(f'unknown message type id {type_id}')
+    try:
+        return decoder(body)
+    except struct.error as e:
+        raise ProtocolError(f'malformed frame: {e}')
+    except UnicodeDecodeError:
+        raise ProtocolError('invalid utf-8 string')
+
+
+def peek_route(body, version=PROTOCOL_VERSION):
+    """Validate an update frame body for relaying; return (message type, room code, player id).
+
+    Lets the relay forward player updates as raw bytes instead of decoding and
+    re-encoding them, while still guaranteeing every receiver can decode what
+    it is sent: fixed-layout and masked state frames get a size, mask and
+    utf-8 check, and the rare generic updates (gameplay events) are decoded
+    in full.
+    Returns (None, None, None) for any other message type.
+    """
+    if not body:
+        raise ProtocolError('empty frame')
+    type_id = body[0]
+    if type_id == STATE_TYPE_ID:
+        if len(body) < 1 + _STATE.size:
+            raise ProtocolError('truncated state frame')
+        if len(body) > 1 + _STATE.size + 255:
+            raise ProtocolError('oversized state frame')
+        player_id, mask = body[1], body[2]
+        if mask == 0 or mask > _FULL_STATE_MASK:
+            raise ProtocolError(f'bad state field mask {mask}')
+        try:
+            room_code = str(body[1 + _STATE.size:], 'utf-8')
+        except UnicodeDecodeError:
+            raise ProtocolError('invalid utf-8 string')
+        return 'update', room_code, None if player_id == _NO_PLAYER else player_id
+    if type_id == _PARTIAL_STATE_ID:
+        if version < COMPACT_SINCE:
+            raise ProtocolError(f'compact frames are not part of protocol v{version}')
+        layout = _PARTIAL_STATES.get(body[2]) if len(body) > 2 else None
+        if layout is None:
+            raise ProtocolError('truncated state frame' if len(body) < 3 else f'bad state field mask {body[2]}')
+        size = layout[2].size
+        if len(body) < size:
+            raise ProtocolError('truncated state frame')
+        if len(body) > size + 255:
+            raise ProtocolError('oversized state frame')
+        try:
+            room_code = str(body[size:], 'utf-8')
+        except UnicodeDecodeError:
+            raise ProtocolError('invalid utf-8 string')
+        return 'update', room_code, None if body[1] == _NO_PLAYER else body[1]
+    if type_id == MESSAGE_SCHEMAS['update'][0]:
+        message = decode_body(body, version)
+        return 'update', message['room_code'], message['player_id']
+    return None, None, None
+
+
+def full_state_player(body):
+    """Player id of a fixed-layout update that carries every state field, else None.
+
+    Such a frame fully supersedes any earlier state from the same player, so
+    the spectator snapshot only needs to decode the newest one.
+    """
+    if len(body) > 2 and body[0] == STATE_TYPE_ID and body[2] == _FULL_STATE_MASK:
+        return body[1]
+    return None
+
+
+def wrap_body(body):
+    """Re-attach the length prefix to a frame body (for relaying it unchanged)."""
+    return _U16.pack(len(body)) + body
+
+
+def decode_message(frame, version=PROTOCOL_VERSION):
+    """Decode a complete frame (with length prefix) into a message dict."""
+    if len(frame) < 2:
+        raise ProtocolError('truncated frame header')
+    if _U16.unpack_from(frame, 0)[0] != len(frame) - 2:
+        raise ProtocolError('frame length mismatch')
+    return decode_body(frame[2:], version)
+
+
+def negotiate_version(hello):
+    """Pick the protocol version for a peer's hello, or None if incompatible."""
+    peer_max = hello.get('version', 0)
+    peer_min = hello.get('min_version', peer_max)
+    version = min(PROTOCOL_VERSION, peer_max)
+    if version < max(MIN_PROTOCOL_VERSION, peer_min):
+        return None
+    return version
+
+
+class FrameBuffer:
+    """Reassemble frames from a TCP byte stream.
+
+    TCP may split or coalesce sends, so feed() every recv() chunk and handle
+    each returned body. Length prefixes above max_frame_size are rejected as
+    soon as the two header bytes arrive, before any payload is buffered.
+    """
+
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        self.buffer = bytearray()
+        self.max_frame_size = max_frame_size
+
+    def feed(self, data):
+        """Add received bytes; return a list of complete frame bodies."""
+        self.buffer += data
+        bodies = []
+        offset = 0
+        while len(self.buffer) - offset >= 2:
+            (length,) = _U16.unpack_from(self.buffer, offset)
+            if length == 0 or length > self.max_frame_size:
+                raise ProtocolError(f'bad frame length {length}')
+            end = offset + 2 + length
+            if end > len(self.buffer):
+                break
+            bodies.append(bytes(self.buffer[offset + 2:end]))
+            offset = end
+        if offset:
+            del self.buffer[:offset]
+        return bodies
+
+
+# ═══════════════════════════════════════════════════
+# BENCHMARK
+# ═══════════════════════════════════════════════════
+
+def benchmark(number=20000, repeat=5):
+    """Compare this codec against pickle on our real message shapes."""
+    samples = {
+        'update (state)': {'type': 'update', 'room_code': 'EPIC_BATTLE', 'player_id': 1, 'data': {
+            'x': 640, 'y': 408, 'vx': 6.5, 'vy': -3.25, 'health': 85, 'alive': True,
+            'facing_right': False, 'attack_state': 1}},
+        'update (partial)': {'type': 'update', 'room_code': 'EPIC_BATTLE', 'player_id': 1, 'data': {
+            'x': 640, 'y': 408, 'facing_right': True}},
+        'update (event)': {'type': 'update', 'room_code': 'EPIC_BATTLE', 'player_id': 0, 'data': {
+            'type': 'weapon_forged', 'player_id': 0, 'weapon_name': 'Flaming Forged Sword', 'forged': True}},
+        'join_room': {'type': 'join_room', 'room_code': 'EPIC_BATTLE', 'player_name': 'Player2', 'role': 'player'},
+        'player_joined': {'type': 'player_joined', 'players': ['Host', 'Player2'], 'new_player': 'Player2'},
+        'game_starting': {'type': 'game_starting', 'room_code': 'EPIC_BATTLE'},
+    }
+
+    def best_us(fn):
+        return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+    print(f"{'message':<16} {'bytes':>6} {'pickle':>7} {'enc+dec us':>11} {'pickle us':>10} {'relay us':>9} {'pickle relay':>13}")
+    for label, message in samples.items():
+        frame = encode_message(message)
+        body = frame[2:]
+        pickled = pickle.dumps(message)
+
+        codec_us = best_us(lambda: decode_body(encode_message(message)[2:]))
+        pickle_us = best_us(lambda: pickle.loads(pickle.dumps(message)))
+        # Relay cost: what the server does per forwarded update
+        relay_us = best_us(lambda: peek_route(body)) if message['type'] == 'update' else float('nan')
+        pickle_relay_us = best_us(lambda: pickle.dumps(pickle.loads(pickled)))
+
+        print(f"{label:<16} {len(frame):>6} {len(pickled):>7} {codec_us:>11.2f} {pickle_us:>10.2f} "
+              f"{relay_us:>9.2f} {pickle_relay_us:>13.2f}")
+
+
+if __name__ == "__main__":
+    benchmark()
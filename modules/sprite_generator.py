@@ -1,6 +1,10 @@
 # modules/sprite_generator.py
-# Generate retro pixel art character sprites
+# Generate retro pixel art character sprites (and fit AI images to sprite size)
 
+import math
+import zlib
+import struct
+from collections import Counter
 import pygame
 
 
@@ -84,3 +88,137 @@ def create_retro_weapon_sprite(weapon_name, color, size=30):
 
     return sprite
 
+
+def fit_weapon_sprite(image, size):
+    """Trim transparent borders off an AI image and shrink it onto a size x size sprite.
+
+    Aspect ratio is kept and the weapon is centered. Meant to run on the forge
+    worker so only the small surface ever reaches the game loop.
+    """
+    rgba = pygame.Surface(image.get_size(), pygame.SRCALPHA, 32)
+    rgba.blit(image, (0, 0))
+    bounds = rgba.get_bounding_rect()
+    if bounds.width == 0 or bounds.height == 0:
+        bounds = rgba.get_rect()
+    trimmed = rgba.subsurface(bounds)
+
+    scale = size / max(bounds.width, bounds.height)
+    target = (max(1, round(bounds.width * scale)), max(1, round(bounds.height * scale)))
+    if scale < 1:
+        scaled = pygame.transform.smoothscale(trimmed, target)
+    else:
+        scaled = pygame.transform.scale(trimmed, target)  # Upscaling pixel art: keep it crisp
+
+    sprite = pygame.Surface((size, size), pygame.SRCALPHA, 32)
+    sprite.blit(scaled, scaled.get_rect(center=(size // 2, size // 2)))
+    return sprite
+
+
+def _median_cut(colors, max_colors):
+    """Palette of up to max_colors from a {rgb: count} histogram (median cut)."""
+    boxes = [list(colors.items())]
+    while len(boxes) < max_colors:
+        # Split the box with the widest channel range (ties: most pixels)
+        best, best_key = None, None
+        for i, box in enumerate(boxes):
+            if len(box) < 2:
+                continue
+            ranges = [max(c[ch] for c, _ in box) - min(c[ch] for c, _ in box) for ch in range(3)]
+            key = (max(ranges), sum(n for _, n in box))
+            if best_key is None or key > best_key:
+                best, best_key = i, key
+        if best is None:
+            break
+        box = boxes.pop(best)
+        ranges = [max(c[ch] for c, _ in box) - min(c[ch] for c, _ in box) for ch in range(3)]
+        channel = ranges.index(max(ranges))
+        box.sort(key=lambda item: item[0][channel])
+        total = sum(n for _, n in box)
+        running, split = 0, 1
+        for split in range(1, len(box)):
+            running += box[split - 1][1]
+            if running >= total / 2:
+                break
+        boxes += [box[:split], box[split:]]
+
+    palette = []
+    for box in boxes:
+        total = sum(n for _, n in box)
+        palette.append(tuple(sum(c[ch] * n for c, n in box) // total for ch in range(3)))
+    return palette
+
+
+def quantize_sprite(sprite, max_colors=32):
+    """Reduce an RGBA sprite to an 8-bit palettized surface with a colorkey.
+
+    Pixels under half alpha become the colorkey, the rest are mapped to a
+    median-cut palette. Returns (surface, psnr) where psnr (dB, opaque pixels)
+    measures how close the result is to the original. The surface is meant
+    for storage (see encode_indexed_png); convert it before drawing it.
+    """
+    w, h = sprite.get_size()
+    # One bulk read; the work below is per distinct colour, not per pixel
+    rgba = pygame.image.tobytes(sprite, 'RGBA')
+    pixels = Counter(rgba[i:i + 4] for i in range(0, len(rgba), 4))
+    colors = {}
+    for pixel, count in pixels.items():
+        if pixel[3] >= 128:
+            rgb = (pixel[0], pixel[1], pixel[2])
+            colors[rgb] = colors.get(rgb, 0) + count
+    if not colors:
+        return None, 0.0
+
+    palette = _median_cut(colors, max(1, min(max_colors, 255)))
+    nearest = {}
+    squared_error = 0
+    for color, count in colors.items():
+        index = min(range(len(palette)), key=lambda i: sum((color[ch] - palette[i][ch]) ** 2 for ch in range(3)))
+        nearest[color] = index
+        squared_error += count * sum((color[ch] - palette[index][ch]) ** 2 for ch in range(3))
+
+    # Colorkey gets the last index, in a colour the palette doesn't use
+    key_color = (255, 0, 255)
+    while key_color in palette:
+        key_color = (key_color[0], key_color[1] + 1, key_color[2])
+    key_index = len(palette)
+
+    index_of = {pixel: nearest[pixel[0], pixel[1], pixel[2]] if pixel[3] >= 128 else key_index for pixel in pixels}
+    indices = bytes(index_of[rgba[i:i + 4]] for i in range(0, len(rgba), 4))
+    surface = pygame.image.frombytes(indices, (w, h), 'P')
+    surface.set_palette(palette + [key_color] + [(0, 0, 0)] * (255 - key_index))
+    surface.set_colorkey(key_index)
+
+    mse = squared_error / (3 * sum(colors.values()))
+    psnr = 10 * math.log10(255 ** 2 / mse) if mse else 99.0
+    return surface, psnr
+
+
+def _png_chunk(tag, data):
+    return struct.pack('!I', len(data)) + tag + data + struct.pack('!I', zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def encode_indexed_png(surface):
+    """PNG bytes for an 8-bit palettized surface, keeping its colorkey as transparency.
+
+    pygame.image.save drops the colorkey of 8-bit surfaces, so the PNG is
+    written here (PLTE + tRNS chunks); pygame.image.load brings the colorkey back.
+    """
+    w, h = surface.get_size()
+    colorkey = surface.get_colorkey()
+    key_index = surface.map_rgb(colorkey) if colorkey else None
+    indices = pygame.image.tobytes(surface, 'P')
+    rows = b''.join(b'\0' + indices[y * w:(y + 1) * w] for y in range(h))  # filter: none
+
+    palette = surface.get_palette()
+    used = max(indices) + 1 if h and w else 1
+    if key_index is not None:
+        used = max(used, key_index + 1)
+    chunks = [
+        _png_chunk(b'IHDR', struct.pack('!IIBBBBB', w, h, 8, 3, 0, 0, 0)),
+        _png_chunk(b'PLTE', b''.join(bytes(palette[i][:3]) for i in range(used))),
+    ]
+    if key_index is not None:
+        chunks.append(_png_chunk(b'tRNS', bytes([255] * key_index + [0])))
+    chunks.append(_png_chunk(b'IDAT', zlib.compress(bytes(rows), 9)))
+    chunks.append(_png_chunk(b'IEND', b''))
+    return b'\x89PNG\r\n\x1a\n' + b''.join(chunks)
@@ -51,6 +51,7 @@ class UI:
 
         # Callbacks (not used in melee-only mode)
         self.forge_weapon_callback = None
+        self.speculate_callback = None  # callback(text, player_id) once typing pauses
         
         # Weapon input fields for forging
         self.input_text = ""
@@ -58,6 +59,11 @@ class UI:
         self.input_rect = pygame.Rect(SCREEN_WIDTH // 2 - 200, SCREEN_HEIGHT - 80, 300, 40)
         self.forge_button_rect = pygame.Rect(SCREEN_WIDTH // 2 + 110, SCREEN_HEIGHT - 80, 100, 40)
 
+        # Speculative refine: seconds since the last keystroke (None = nothing pending)
+        self.typing_idle = None
+        self.typing_player_id = 0
+        self.speculated_text = ""
+
         # Animation effects
         self.pulse_time = 0
         self.scan_line_offset = 0
@@ -72,6 +78,10 @@ class UI:
         """Set callback for forging weapon."""
         self.forge_weapon_callback = callback
 
+    def set_speculate_callback(self, callback):
+        """Set callback fired with the current prompt when the player pauses typing."""
+        self.speculate_callback = callback
+
     def register_player(self, player_id, color, initial_health=MAX_HEALTH, name=None):
         """Register a player for health bar display."""
         self.player_health[player_id] = initial_health
@@ -131,6 +141,17 @@ class UI:
             current = self.health_animations[player_id]
             self.health_animations[player_id] += (target - current) * dt * 5
         
+        # Debounced speculative refine of the prompt being typed
+        if self.typing_idle is not None:
+            self.typing_idle += dt
+            if self.typing_idle >= SPECULATIVE_REFINE_DELAY:
+                self.typing_idle = None
+                text = self.input_text.strip()
+                if (len(text) >= SPECULATIVE_MIN_CHARS and text != self.speculated_text
+                        and self.speculate_callback):
+                    self.speculated_text = text
+                    self.speculate_callback(text, self.typing_player_id)
+
         # Update pulse animation
         self.pulse_time += dt
         
@@ -168,15 +189,22 @@ class UI:
                 return True
             elif event.key == pygame.K_BACKSPACE:
                 self.input_text = self.input_text[:-1]
+                self._typed(current_player_id)
                 return True
             elif event.key == pygame.K_ESCAPE:
                 self.input_active = False
                 return True
             elif len(self.input_text) < 50 and event.unicode.isprintable():
                 self.input_text += event.unicode
+                self._typed(current_player_id)
                 return True
 
         return False
+
+    def _typed(self, player_id):
+        """Restart the speculative refine debounce after a keystroke."""
+        self.typing_idle = 0.0
+        self.typing_player_id = player_id
     
     def _attempt_forge(self, player_id):
         """Attempt to forge a weapon."""
@@ -185,6 +213,8 @@ class UI:
                 self.forge_weapon_callback(self.input_text, player_id)
                 self.input_text = ""
                 self.input_active = False
+                self.typing_idle = None
+                self.speculated_text = ""
             else:
                 cooldown = int(self.forge_cooldowns[player_id]) + 1
                 self.add_notification(f"COOLDOWN: {cooldown}S!", 1.5, self.retro_orange)
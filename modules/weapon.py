@@ -51,6 +51,21 @@ class Weapon:
         self.saved_path = weapon_data.get('saved_path') if isinstance(weapon_data, dict) else None
         # Store AI-provided image surface if present
         self.image = weapon_data.get('image') if isinstance(weapon_data, dict) else None
+        self.surface_cache = {}  # {(size, flipped): Surface} so drawing doesn't rescale every frame
+
+    def upgrade(self, weapon_data):
+        """Hot-swap a finished forge into this weapon (image and stats), e.g. over a placeholder."""
+        for attr in ('name', 'damage', 'knockback', 'size', 'speed', 'color'):
+            if attr in weapon_data:
+                setattr(self, attr, weapon_data[attr])
+        # Keep the hitbox centred where it is and the weapon flying the same way
+        center = self.rect.center
+        self.rect.size = (self.size, self.size)
+        self.rect.center = center
+        self.velocity_x = self.speed * (-1 if self.velocity_x < 0 else 1)
+        self.image = weapon_data.get('image', self.image)
+        self.saved_path = weapon_data.get('saved_path', self.saved_path)
+        self.surface_cache.clear()
 
     def set_direction(self, direction_x):
         """Set weapon travel direction (-1 for left, 1 for right)."""
@@ -155,20 +170,32 @@ class Weapon:
                                (trail_x, self.rect.centery),
                                (trail_x, self.rect.centery), 2)
 
-    def get_surface(self, desired_size=None):
+    def get_surface(self, desired_size=None, flipped=False):
         """Return a pygame.Surface for this weapon: AI image if present, else generated sprite.
 
         desired_size: optional (w,h) or single int for square.
+        flipped: mirror horizontally (facing left).
+        Results are cached per size, so this is cheap to call every frame.
         """
-        # If AI supplied an image surface, return a copy (scaled if requested)
+        if isinstance(desired_size, int):
+            desired_size = (desired_size, desired_size)
+        key = (tuple(desired_size) if desired_size else None, flipped)
+        surf = self.surface_cache.get(key)
+        if surf is None:
+            surf = self._render_surface(desired_size)
+            if flipped:
+                surf = pygame.transform.flip(surf, True, False)
+            self.surface_cache[key] = surf
+        return surf
+
+    def _render_surface(self, size=None):
+        # AI images arrive already trimmed and shrunk to the weapon size by the forge worker
         if getattr(self, 'image', None):
             try:
                 surf = self.image
-                if desired_size:
-                    if isinstance(desired_size, int):
-                        size = (desired_size, desired_size)
-                    else:
-                        size = desired_size
+                if size and surf.get_size() != size:
+                    if surf.get_colorkey() is not None:
+                        return pygame.transform.scale(surf, size)  # smoothscale would blend the colorkey into the edges
                     return pygame.transform.smoothscale(surf, size)
                 return surf
             except Exception:
@@ -0,0 +1,196 @@
+"""
+Replay and inspect network captures recorded with `python main.py --capture`.
+
+Usage:
+  python replay_capture.py info   <capture>
+  python replay_capture.py server <capture> [--host IP] [--port 5555] [--speed 1.0]
+  python replay_capture.py client <capture> [--port 5555] [--speed 1.0] [--conn ID]
+  python replay_capture.py bench  <capture>
+
+  info    Summarise a capture: duration, frames and bytes per message type,
+          split by link (tcp relay, or p2p datagrams recorded by a client).
+  server  Replay the frames the client(s) sent against a running GameServer,
+          one connection per recorded client, with the original timing.
+  client  Pretend to be the server: wait for a GameClient to connect and send
+          it the frames the server sent (for a server capture, pick which
+          connection with --conn). Whatever the client sends is read and ignored.
+  bench   Decode/encode every real frame with modules/protocol.py and compare
+          against pickle on the same messages.
+
+--speed scales the recorded gaps (2.0 = twice as fast, 0 = as fast as possible).
+"""
+
+import sys
+import time
+import socket
+import pickle
+import argparse
+import threading
+from collections import defaultdict
+from modules.capture import CaptureReader, ROLE_CLIENT, CONN_PEER
+from modules.protocol import ProtocolError, decode_body, encode_message, wrap_body
+
+
+def _message_type(body):
+    try:
+        return decode_body(body).get('type', '?')
+    except ProtocolError:
+        return 'malformed'
+
+
+def _wait_until(start, timestamp, speed):
+    """Sleep until the recorded timestamp (scaled by speed) has passed."""
+    if speed <= 0:
+        return
+    delay = start + timestamp / speed - time.perf_counter()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def _drain(sock):
+    """Read and discard whatever the other side sends until it closes."""
+    try:
+        while sock.recv(65536):
+            pass
+    except OSError:
+        pass
+
+
+def show_info(reader):
+    records = list(reader)
+    role = 'client' if reader.role == ROLE_CLIENT else 'server'
+    duration = records[-1][0] if records else 0.0
+    print(f"Capture: {reader.path}")
+    print(f"Recorded by: {role}, protocol v{reader.protocol_version}")
+    print(f"Frames: {len(records)}, duration: {duration:.2f}s, "
+          f"connections: {len({r[2] for r in records if r[2] != CONN_PEER})}, "
+          f"p2p datagrams: {sum(1 for r in records if r[2] == CONN_PEER)}")
+
+    stats = defaultdict(lambda: [0, 0])
+    for _, direction, conn_id, body in records:
+        link = 'p2p' if conn_id == CONN_PEER else 'tcp'
+        key = (('in ' if direction == 0 else 'out') + ' ' + link, _message_type(body))
+        stats[key][0] += 1
+        stats[key][1] += len(body) + 2
+    print(f"\n{'dir':<8} {'type':<22} {'frames':>7} {'bytes':>9}")
+    for (direction, msg_type), (count, size) in sorted(stats.items()):
+        print(f"{direction:<8} {msg_type:<22} {count:>7} {size:>9}")
+
+
+def replay_against_server(reader, host, port, speed):
+    frames = reader.client_frames()
+    if not frames:
+        print("✗ Capture has no client-sent frames")
+        return
+    sockets = {}
+    for conn_id in sorted({conn_id for _, _, conn_id, _ in frames}):
+        sock = socket.create_connection((host, port), timeout=10)
+        threading.Thread(target=_drain, args=(sock,), daemon=True).start()
+        sockets[conn_id] = sock
+    print(f"✓ Replaying {len(frames)} frames over {len(sockets)} connection(s) to {host}:{port}")
+
+    start = time.perf_counter()
+    for timestamp, _, conn_id, body in frames:
+        _wait_until(start, timestamp, speed)
+        sockets[conn_id].sendall(wrap_body(body))
+    elapsed = time.perf_counter() - start
+    print(f"✓ Replay complete in {elapsed:.2f}s ({len(frames) / max(elapsed, 1e-9):.0f} frames/s)")
+
+    time.sleep(0.5)  # Let the server process the tail before we hang up
+    for sock in sockets.values():
+        sock.close()
+
+
+def replay_to_client(reader, port, speed, conn_id=None):
+    frames = reader.server_frames()
+    if conn_id is None and frames:
+        conn_id = frames[0][2]
+    frames = [f for f in frames if f[2] == conn_id]
+    if not frames:
+        print("✗ Capture has no server-sent frames for that connection")
+        return
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('', port))
+    listener.listen(1)
+    print(f"✓ Waiting for a GameClient on port {port} ({len(frames)} frames to replay)...")
+    conn, addr = listener.accept()
+    print(f"✓ Client connected from {addr}")
+    # Like the real server, say nothing until the client's hello arrives
+    conn.settimeout(10)
+    conn.recv(65536)
+    conn.settimeout(None)
+    threading.Thread(target=_drain, args=(conn,), daemon=True).start()
+
+    # Timing is relative to the first server frame (the hello_ack)
+    base = frames[0][0]
+    start = time.perf_counter()
+    for index, (timestamp, _, _, body) in enumerate(frames):
+        _wait_until(start, timestamp - base, speed)
+        conn.sendall(wrap_body(body))
+        if index == 0:
+            time.sleep(0.1)  # Give the client's handshake time to pick up the hello_ack
+    print(f"✓ Replay complete in {time.perf_counter() - start:.2f}s")
+
+    time.sleep(0.5)
+    conn.close()
+    listener.close()
+
+
+def run_bench(reader, repeat=5):
+    bodies = [body for _, _, _, body in reader]
+    messages = []
+    for body in bodies:
+        try:
+            messages.append(decode_body(body))
+        except ProtocolError:
+            pass
+    if not messages:
+        print("✗ Capture has no decodable frames")
+        return
+    pickled = [pickle.dumps(m) for m in messages]
+
+    def best(fn):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    codec_decode = best(lambda: [decode_body(b) for b in bodies])
+    codec_encode = best(lambda: [encode_message(m) for m in messages])
+    pickle_decode = best(lambda: [pickle.loads(p) for p in pickled])
+    pickle_encode = best(lambda: [pickle.dumps(m) for m in messages])
+
+    n = len(messages)
+    print(f"Benchmark on {n} real messages from {reader.path}")
+    print(f"{'':<8} {'bytes':>10} {'encode us/msg':>14} {'decode us/msg':>14}")
+    print(f"{'codec':<8} {sum(len(b) + 2 for b in bodies):>10} {codec_encode / n * 1e6:>14.2f} {codec_decode / n * 1e6:>14.2f}")
+    print(f"{'pickle':<8} {sum(len(p) for p in pickled):>10} {pickle_encode / n * 1e6:>14.2f} {pickle_decode / n * 1e6:>14.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay and inspect Prompt Wars network captures.')
+    parser.add_argument('mode', choices=['info', 'server', 'client', 'bench'])
+    parser.add_argument('capture')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--conn', type=int, default=None, help='connection id to replay (client mode)')
+    args = parser.parse_args(argv)
+
+    reader = CaptureReader(args.capture)
+    if args.mode == 'info':
+        show_info(reader)
+    elif args.mode == 'server':
+        replay_against_server(reader, args.host, args.port, args.speed)
+    elif args.mode == 'client':
+        replay_to_client(reader, args.port, args.speed, args.conn)
+    elif args.mode == 'bench':
+        run_bench(reader)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -71,6 +71,48 @@ INPUT_BOX_HEIGHT = 40
 
 # Weapon settings
 WEAPON_COOLDOWN = 5  # seconds between weapon forges
+FORGE_WORKERS = 3  # concurrent AI forges (each can hold an upstream call for up to 90s)
+FORGE_QUEUE_LIMIT = 16  # queued forges beyond this are rejected
+FORGE_ENGINE = 'async'  # 'async': all forges on one asyncio loop (aiohttp); 'threads': worker pool
+FORGE_ASYNC_CONCURRENCY = 8  # forges in flight at once on the async engine
+SPECULATIVE_REFINE_DELAY = 0.6  # seconds of typing pause before the prompt is refined in the background
+SPECULATIVE_MIN_CHARS = 3  # don't speculate on shorter prompts
+FORGE_CACHE_DIR = 'assets/forge_cache'  # Finished AI weapons (stats), reused for repeat prompts
+ASSET_STORE_MAX_BYTES = 100 * 1024 * 1024  # Generated images on disk; least recently used are evicted past this
+REFINE_CACHE_TTL = 30 * 60  # seconds a refined (LLM-expanded) prompt is reused
+REFINE_CACHE_MAX_ENTRIES = 256
+FORGE_PHASE_TIMEOUT = 60  # seconds before players still without a weapon get one from the warm pool
+WARM_POOL_SIZE = 8  # weapons pre-forged in the background while the lobby is open
+WARM_POOL_PRIORITY = 10  # queue priority of warm forges (players' forges use 0 and run first)
+WARM_POOL_PROMPTS = [  # popular prompts, forged first
+    'fire sword', 'ice axe', 'lightning spear', 'hammer',
+    'massive hammer', 'swift sword',
+]
+WARM_POOL_ELEMENTS = ['fire', 'ice', 'lightning']  # randomized warm prompts are element + weapon
+WARM_POOL_WEAPONS = ['sword', 'hammer', 'spear', 'axe']
+FUZZY_MATCH_THRESHOLD = 0.8  # reuse the closest cached weapon scoring at least this (0-1); None disables
+PROGRESSIVE_FORGE = True  # equip a procedural placeholder at once, swap in the AI sprite when it lands
+FUZZY_MATCH_REFRESH = True  # after a close-match hit, forge the exact prompt in the background for next time
+CIRCUIT_WINDOW = 20  # recent calls per upstream and call kind the circuit breaker looks at
+CIRCUIT_MIN_CALLS = 4  # calls needed in the window before it can trip
+CIRCUIT_ERROR_RATE = 0.5  # trip when this share of recent calls failed (errors, 5xx, 429)...
+CIRCUIT_SLOW_SECONDS = 45  # ...or when the median call took this long
+CIRCUIT_OPEN_SECONDS = 20  # while tripped, probe the upstream this often
+CIRCUIT_TIMEOUT_FACTOR = 3  # request timeouts are capped at this multiple of the upstream's p95 latency
+HEDGE_IMAGE_REQUESTS = True  # fire a second image request when the first runs into the latency tail
+HEDGE_PERCENTILE = 75  # ...once it has taken longer than this percentile of recent image calls
+HEDGE_MIN_DELAY = 3.0  # never hedge sooner than this (seconds)
+HEDGE_MIN_SAMPLES = 8  # image calls to observe before hedging at all
+HEDGE_WINDOW = 50  # recent image call latencies the threshold is taken from
+HEDGE_MAX_FRACTION = 0.1  # hedges stay under this share of image calls
+FORGE_TELEMETRY_MAX = 500  # finished forges whose per-stage timings are kept for forge_telemetry()
+FORGE_TELEMETRY_DUMP = None  # path to write the forge telemetry JSON to when the client closes (None = don't)
+SPRITE_PALETTE_COLORS = 64  # forged sprites are quantized to this many colours (+ colorkey); 0 disables
+SPRITE_MIN_PSNR = 28.0  # dB; sprites that quantize worse than this stay 32-bit RGBA
+BG_REMOVE_LOCAL = True  # cut flat backgrounds out locally; remove.bg is only tried when this can't
+BG_REMOVE_THRESHOLD = 40  # per-channel distance from the border colour that still counts as background
+BG_REMOVE_MIN_BORDER = 0.6  # share of border pixels that must match for the background to count as flat
+BG_REMOVE_MIN_SPECK = 12  # foreground blobs smaller than this (pixels) are treated as background noise
 
 # Audio settings
 AUDIO_ICON_SIZE = 50  # Larger for better visibility
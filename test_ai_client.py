@@ -0,0 +1,226 @@
+# test_ai_client.py
+# Offline checks for the AI client's plumbing (modules/ai_client.py)
+# Everything runs against a stand-in upstream on localhost - no API keys, no network.
+
+import io
+import os
+import json
+import base64
+import time
+import tempfile
+import threading
+import pygame
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import modules.ai_client as ai_client
+import modules.hedging as hedging
+from modules.ai_client import AIClient, ForgeJob, extract_image
+from modules.forge_cache import ForgeCache, normalize_prompt
+from modules.asset_store import AssetStore
+from modules.hedging import HedgePolicy
+from modules.forge_telemetry import ForgeTelemetry, stage, mark, note_retry
+
+
+class Upstream(BaseHTTPRequestHandler):
+    """GET answers 'ok'; POST answers a chat completion after a short delay. Records every request."""
+
+    protocol_version = 'HTTP/1.1'
+    ports = []  # Client port of each request
+    posts = []  # Decoded JSON bodies of POSTs
+    delay = 0.3
+
+    def do_GET(self):
+        Upstream.ports.append(self.client_address[1])
+        self._reply(b'ok', 'text/plain')
+
+    def do_POST(self):
+        Upstream.ports.append(self.client_address[1])
+        Upstream.posts.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+        time.sleep(Upstream.delay)
+        reply = {'choices': [{'message': {'content': 'A gleaming pixel-art blade, centered, flat background'}}]}
+        self._reply(json.dumps(reply).encode(), 'application/json')
+
+    def _reply(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def wait_until(condition, timeout=3.0):
+    """Poll condition() until it holds or timeout passes; returns its last value."""
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+server = ThreadingHTTPServer(('127.0.0.1', 0), Upstream)
+server.daemon_threads = True
+threading.Thread(target=server.serve_forever, daemon=True).start()
+base = f'http://127.0.0.1:{server.server_port}'
+
+client = AIClient()
+
+# --- Pooled keep-alive sessions ---
+session = client._session_for(base + '/a')
+assert client._session_for(base + '/b') is session
+assert client._session_for(f'http://localhost:{server.server_port}/a') is not session
+for path in ('/1', '/2', '/3'):
+    assert session.get(base + path, timeout=5).text == 'ok'
+assert len(set(Upstream.ports)) == 1, Upstream.ports
+client.close()
+assert not client.sessions
+print("✓ One pooled session per host; three requests shared one connection")
+
+# --- Speculative refinement while typing ---
+client.chat_url = base + '/v1/chat/completions'
+client.hackclub_key = 'test'
+assert client.speculate_refine('flami', 0)
+assert client.speculate_refine('flaming sword', 0)  # Kept typing: the first refine is stale
+assert client.speculate_refine('flaming sword!', 0)  # Same text, already in flight
+time.sleep(0.05)
+# The forge starts before the speculation lands: it waits for it instead of asking again
+refined = client._run_steps(client._refine_prompt('flaming sword', client._hackclub_headers()))
+assert refined.startswith('A gleaming pixel-art blade'), refined
+assert client._memoized_refine('Flaming Sword') == refined
+assert client.speculate_refine('flaming sword', 0)  # Already memoized, nothing sent
+time.sleep(Upstream.delay + 0.2)
+sent = [post['messages'][-1]['content'] for post in Upstream.posts]
+assert sum('flaming sword' in text for text in sent) == 1, sent
+assert not client.speculate_refine('   ', 1)
+print(f"✓ Speculative refine: {len(Upstream.posts)} requests for 3 keystroke pauses and a forge")
+
+# --- Warm pool ---
+client.hackclub_key = None
+assert client.prewarm() == 0  # Mock weapons are instant: nothing to warm
+with tempfile.TemporaryDirectory(prefix='promptwar-warm-') as cache_dir:
+    client.forge_cache = ForgeCache(cache_dir, AssetStore(os.path.join(cache_dir, 'assets'), 1 << 20), 1, ('test',))
+    icon = pygame.Surface((16, 16))
+    icon.fill((200, 40, 40))
+    png = io.BytesIO()
+    pygame.image.save(icon, png, 'icon.png')
+    client.forge_cache.put('ember axe', png.getvalue(), {'name': 'Ember Axe', 'damage': 14})
+    client.warm_prompts = ['ember axe']
+    assert client.warm_pool_status() == (1, 1)
+    assert client.take_warm_weapon()['name'] == 'Ember Axe'
+    fallback = client.take_warm_weapon()  # The only warm weapon is taken: a mock one instead
+    assert not fallback.get('cached') and fallback['name']
+
+    # A player typing a prompt that is being warmed waits for that forge...
+    warm = ForgeJob('ember axe', None)
+    warm.warm, warm.state = True, 'running'
+    client.warm_jobs[normalize_prompt('Ember Axe')] = warm
+    threading.Timer(0.3, warm.done.set).start()
+    started = time.time()
+    client._wait_for_warm('Ember Axe')
+    assert time.time() - started >= 0.25
+    # ...but a warm job still in the queue would start after theirs, so they don't wait
+    queued = ForgeJob('frost bow', None)
+    queued.warm = True
+    client.warm_jobs['frost bow'] = queued
+    started = time.time()
+    client._wait_for_warm('frost bow')
+    assert time.time() - started < 0.1
+    client.stop_prewarm()
+    assert not client.warm_jobs and queued.cancelled.is_set()
+print("✓ Warm pool: cached weapon handed out once, waits only on a running warm forge")
+
+# --- Image extraction from the response shapes we've seen ---
+blob = b'\x89PNG\r\n\x1a\n' + bytes(range(64))
+data_url = 'data:image/png;base64,' + base64.b64encode(blob).decode()
+shapes = {
+    'image_url.url': {'choices': [{'message': {'images': [{'type': 'image_url', 'image_url': {'url': data_url}}]}}]},
+    'content part': {'choices': [{'message': {'content': [{'type': 'text', 'text': 'Here'}, {'image_url': data_url}]}}]},
+    'inline in text': {'choices': [{'message': {'content': f'Here you go: ![weapon]({data_url}) enjoy'}}]},
+    'b64_json': {'data': [{'b64_json': base64.b64encode(blob).decode()}]},
+}
+for shape, out in shapes.items():
+    assert extract_image(out) == (blob, None), shape
+# A plain URL is returned for download, but an inline image later in the response wins
+linked = {'data': [{'url': 'https://cdn.example/weapon.png'}]}
+assert extract_image(linked) == (None, 'https://cdn.example/weapon.png')
+linked['data'].append({'b64_json': base64.b64encode(blob).decode()})
+assert extract_image(linked) == (blob, None)
+assert extract_image({'choices': [{'message': {'content': 'No image, sorry'}}]}) == (None, None)
+print(f"✓ extract_image: {len(shapes)} inline shapes, URL fallback, empty response")
+
+# --- Hedging image requests in the latency tail ---
+hedging.HEDGE_MIN_DELAY = 0.1
+policy = HedgePolicy(enabled=True)
+for _ in range(hedging.HEDGE_MIN_SAMPLES - 1):
+    assert policy.delay() is None  # Not enough history yet
+    policy.record(0.2)
+policy.record(0.2)
+assert abs(policy.delay() - 0.2) < 1e-9
+assert not policy.take()  # 8 calls so far: no hedge in the budget yet
+policy.delay(), policy.delay()
+assert sum(policy.take() for _ in range(5)) == 1  # 10 calls: budget for one hedge
+assert not HedgePolicy(enabled=False).delay()
+
+client.hedging = policy
+policy.calls = 40
+cancelled = []
+
+
+def slow_then_fast(specific_prompt, headers, job, fallback=False):
+    """Image stage stub: the primary request is stuck in the tail, the fallback answers at once."""
+    while not fallback:
+        try:
+            yield ai_client._sleep(job, 0.02)
+        except ai_client.ForgeCancelled:
+            cancelled.append(job)
+            raise
+    return b'fallback image'
+
+
+client._image_attempt = slow_then_fast
+started = time.time()
+assert client._run_steps(client._generate_image('a flaming sword', {})) == b'fallback image'
+assert 0.15 < time.time() - started < 1.0
+assert wait_until(lambda: cancelled)
+snapshot = policy.snapshot()
+assert snapshot['hedges'] == 2 and snapshot['hedge_wins'] == 1, snapshot
+print(f"✓ Hedging: fallback fired after {snapshot['threshold']:.1f}s threshold, won, slow request cancelled")
+
+# --- Forge telemetry ---
+telemetry = ForgeTelemetry(max_forges=2)
+with stage(ForgeJob('untraced', 0), 'refine') as record:
+    record['bytes'] = 10  # No trace: a no-op block
+for prompt, fails in (('old', False), ('icy spear', False), ('giant tiger', True)):
+    job = ForgeJob(prompt, 1)
+    job.state, job.started_at = 'running', job.enqueued_at + 0.25
+    telemetry.begin(job)
+    mark(job, cache='miss', refine='memo')
+    with stage(job, 'refine'):
+        pass
+    try:
+        with stage(job, 'image') as record:
+            record['bytes'] = 2048
+            note_retry(job)
+            if fails:
+                raise RuntimeError('upstream 503')
+    except RuntimeError:
+        pass
+    telemetry.finish(job, 'mock' if fails else 'ai')
+telemetry.finish(ForgeJob('never started', 0), 'ai')  # No trace: ignored
+
+summary = telemetry.summary()
+assert summary['forges'] == 2 and summary['outcomes'] == {'ai': 1, 'mock': 1}, summary  # 'old' fell out
+assert summary['cache'] == {'miss': 2} and summary['refine'] == {'memo': 2} and summary['retries'] == 2
+assert abs(summary['queued']['p50'] - 0.25) < 1e-6
+image = summary['stages']['image']
+assert image['count'] == 2 and image['failures'] == 1 and image['avg_bytes'] == 2048
+with tempfile.TemporaryDirectory() as dump_dir:
+    with open(telemetry.dump(os.path.join(dump_dir, 'forges.json')), encoding='utf-8') as f:
+        report = json.load(f)
+assert [forge['prompt'] for forge in report['forges']] == ['icy spear', 'giant tiger']
+assert report['forges'][1]['stages'][1]['error'] == 'RuntimeError: upstream 503'
+print("✓ Telemetry: stage timings, failures, sizes and retries aggregated and dumped")
+
+client.close()
+server.shutdown()
+print("\nAll AI client checks passed")
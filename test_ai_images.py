@@ -1,6 +1,7 @@
 """
-Test AI image generation: forge three sample prompts and report whether an AI image surface
-was attached to the returned weapon_data. Any returned surfaces are saved as PNGs.
+Test AI image generation: forge three sample prompts as one concurrent batch and report
+whether an AI image surface was attached to each returned weapon_data, plus throughput
+(forges/minute) and the latency distribution. Any returned surfaces are saved as PNGs in captures/.
 
 Usage:
   .\venv312\Scripts\Activate
@@ -11,11 +12,14 @@ This script respects environment variables:
   REMOVE_BG_API_KEY (optional)
 
 If no HACKCLUB_API_KEY is set the script will report that the mock generator was used.
+Pass --mock to forge against a local stand-in for the AI APIs instead (no network, no keys).
 """
 
 import os
+import sys
+import time
 import pygame
-from modules.ai_client import AIClient
+from modules.ai_client import AIClient, batch_report
 
 pygame.init()
 
@@ -26,41 +30,42 @@ prompts = [
 ]
 
 ai = AIClient()
-results = []
+if '--mock' in sys.argv:
+    from modules.mock_upstream import MockUpstream
+    MockUpstream().start().attach(ai)
 
-# Callback will be used by AIClient when it completes (synchronous in current impl)
-def _cb(weapon_data, player_id):
-    has_image = 'image' in weapon_data and weapon_data['image'] is not None
+print('HACKCLUB_API_KEY set:', bool(os.environ.get('HACKCLUB_API_KEY')))
+print('REMOVE_BG_API_KEY set:', bool(os.environ.get('REMOVE_BG_API_KEY')))
+
+print(f"\nForging {len(prompts)} prompts as one batch...")
+start = time.time()
+results = ai.forge_batch(prompts)
+elapsed = time.time() - start
+
+# Summary
+print('\nResults:')
+for i, r in enumerate(results):
+    weapon_data = r['weapon'] or {}
+    surf = weapon_data.get('image')
     size = None
     path = None
-    bg_removed = weapon_data.get('bg_removed') if isinstance(weapon_data, dict) else None
-    bg_has_alpha = weapon_data.get('bg_has_alpha') if isinstance(weapon_data, dict) else None
-    if has_image:
-        surf = weapon_data['image']
+    if surf is not None:
         try:
             size = surf.get_size()
-            # Save to disk for inspection
-            fname = f"ai_image_{player_id}_{weapon_data.get('name','weapon').replace(' ','_')}.png"
+            # Save to disk for inspection (captures/ is ignored by git, unlike the sample images at the root)
+            os.makedirs('captures', exist_ok=True)
+            fname = os.path.join('captures', f"ai_image_{i}_{weapon_data.get('name','weapon').replace(' ','_')}.png")
             pygame.image.save(surf, fname)
             path = os.path.abspath(fname)
         except Exception as e:
             path = f"save_failed: {e}"
-    results.append({'prompt': cur_prompt, 'has_image': has_image, 'size': size, 'path': path, 'bg_removed': bg_removed, 'bg_has_alpha': bg_has_alpha, 'data': weapon_data})
-
-ai.set_weapon_spawned_callback(_cb)
+    print(f"Prompt: {r['prompt']}, outcome: {r['outcome']}, time: {r['seconds']:.1f}s, has_image: {surf is not None}, "
+          f"size: {size}, saved: {path}, bg_removed: {weapon_data.get('bg_removed')}, bg_has_alpha: {weapon_data.get('bg_has_alpha')}")
 
-print('HACKCLUB_API_KEY set:', bool(os.environ.get('HACKCLUB_API_KEY')))
-print('REMOVE_BG_API_KEY set:', bool(os.environ.get('REMOVE_BG_API_KEY')))
-
-for i, p in enumerate(prompts):
-    cur_prompt = p
-    print(f"\nForging prompt ({i+1}/3): {p}")
-    ai.forge_weapon(p, i)
-
-# Summary
-print('\nResults:')
-for r in results:
-    print(f"Prompt: {r['prompt']}, has_image: {r['has_image']}, size: {r['size']}, saved: {r['path']}, bg_removed: {r['bg_removed']}, bg_has_alpha: {r['bg_has_alpha']}")
+report = batch_report(results, elapsed)
+print(f"\n{report['forges']} forges in {report['elapsed']:.1f}s ({report['forges_per_minute']:.1f} forges/minute)")
+print(f"Latency: p50 {report['p50']:.1f}s, p90 {report['p90']:.1f}s, p99 {report['p99']:.1f}s, max {report['max']:.1f}s")
+print('Outcomes:', report['outcomes'])
 
+ai.close()
 pygame.quit()
-
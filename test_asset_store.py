@@ -0,0 +1,103 @@
+# test_asset_store.py
+# Dedup, index and eviction checks for the content-addressed asset store (modules/asset_store.py)
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+from modules.asset_store import AssetStore, INDEX_FILE
+
+# The store never decodes images, so any bytes will do
+SWORD = b'sword' * 80
+SPEAR = b'spear' * 80
+TIGER = b'tiger' * 80
+
+
+def test_dedup():
+    """Identical images share one file; every prompt that produced them is recorded."""
+    with tempfile.TemporaryDirectory() as directory:
+        store = AssetStore(directory, max_bytes=10_000)
+        digest = store.put(SWORD, 'flaming sword', {'name': 'Flaming Sword'})
+        assert digest == hashlib.sha256(SWORD).hexdigest()
+        assert store.put(SWORD, 'Fire Sword!') == digest
+        assert sorted(os.listdir(directory)) == sorted([digest + '.png', INDEX_FILE])
+        assert store.assets[digest]['prompts'] == ['flaming sword', 'Fire Sword!']
+        assert store.assets[digest]['stats'] == {'name': 'Flaming Sword'}
+        assert store.find('FLAMING  sword') == store.find('fire sword') == digest
+        assert store.get(digest) == SWORD and store.get('0' * 64) is None
+
+        # A re-forged prompt points at its newest image; the other prompt keeps the old one
+        newer = store.put(SPEAR, 'flaming sword')
+        assert store.find('flaming sword') == newer and store.find('fire sword') == digest
+        assert store.stats() == {'assets': 2, 'bytes': len(SWORD) + len(SPEAR), 'prompts': 2}
+    print("✓ Identical images stored once; prompts resolve to their newest image")
+
+
+def test_eviction():
+    """Over budget the least recently used image goes, never the one just stored."""
+    with tempfile.TemporaryDirectory() as directory:
+        store = AssetStore(directory, max_bytes=len(SWORD) * 2 + 100)
+        evicted = []
+        store.on_evict = evicted.append
+        sword = store.put(SWORD, 'flaming sword')
+        spear = store.put(SPEAR, 'icy spear')
+        time.sleep(0.01)
+        store.get(sword)  # The spear is now the least recently used
+        tiger = store.put(TIGER, 'giant tiger')
+        assert evicted == [spear] and not os.path.exists(store.path(spear))
+        assert store.has(sword) and store.has(tiger) and store.find('icy spear') is None
+        assert store.size_bytes <= store.max_bytes
+
+        os.remove(store.path(tiger))  # Deleted behind the store's back: a miss, and dropped
+        assert store.get(tiger) is None and not store.has(tiger)
+
+        tiny = AssetStore(os.path.join(directory, 'tiny'), max_bytes=10)
+        assert tiny.has(tiny.put(SWORD, 'too big'))  # Kept even though it alone is over budget
+    print("✓ LRU eviction calls on_evict; missing files are dropped on read")
+
+
+def test_reload():
+    """index.json brings the assets and prompts back after a restart."""
+    with tempfile.TemporaryDirectory() as directory:
+        store = AssetStore(directory, max_bytes=10_000)
+        digest = store.put(SWORD, 'flaming sword')
+        store.get(digest)
+        store.flush()
+        with open(os.path.join(directory, INDEX_FILE), encoding='utf-8') as f:
+            assert digest in json.load(f)['assets']
+        reopened = AssetStore(directory, store.max_bytes)
+        assert reopened.find('Flaming sword') == digest and reopened.get(digest) == SWORD
+    print("✓ Index reloads from disk")
+
+
+def test_legacy_files():
+    """ai_<prompt>_<timestamp>.png files from before the store are indexed in place and count towards the cap."""
+    with tempfile.TemporaryDirectory() as directory:
+        for name, content in (('ai_icy_spear_1770500472.png', SPEAR), ('ai_giant_Tiger_1770500513.png', TIGER),
+                              ('ai_spear_copy_1770500600.png', SPEAR), ('notes.png', SWORD)):
+            with open(os.path.join(directory, name), 'wb') as f:
+                f.write(content)
+        store = AssetStore(directory, max_bytes=len(SPEAR) * 2 + 100)
+        spear, tiger = hashlib.sha256(SPEAR).hexdigest(), hashlib.sha256(TIGER).hexdigest()
+        assert store.find('icy spear') == spear and store.find('Giant tiger') == tiger
+        assert store.get(spear) == SPEAR and store.path(spear).endswith('ai_icy_spear_1770500472.png')
+        assert not os.path.exists(os.path.join(directory, 'ai_spear_copy_1770500600.png'))  # Duplicate cleaned
+        assert os.path.exists(os.path.join(directory, 'notes.png'))  # Not ours: left alone
+        assert store.size_bytes == len(SPEAR) + len(TIGER)
+
+        # They are evicted like any other asset, file name and all (the spear was just read)
+        evicted = []
+        store.on_evict = evicted.append
+        store.put(SWORD, 'flaming sword')
+        assert evicted == [tiger] and not os.path.exists(os.path.join(directory, 'ai_giant_Tiger_1770500513.png'))
+        reopened = AssetStore(directory, store.max_bytes)
+        assert reopened.find('icy spear') == spear and reopened.stats() == store.stats()
+    print("✓ Older ai_*.png images indexed in place, deduplicated and evicted by the same budget")
+
+
+test_dedup()
+test_eviction()
+test_reload()
+test_legacy_files()
+print("\nAll asset store checks passed")
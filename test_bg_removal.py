@@ -0,0 +1,62 @@
+# test_bg_removal.py
+# Behaviour checks for local background removal (modules/bg_removal.py)
+
+import io
+import random
+import pygame
+from modules.bg_removal import remove_background, remove_background_bytes
+
+pygame.init()
+random.seed(1)
+
+WHITE = (250, 250, 250)
+RED = (200, 30, 30)
+
+
+def sprite():
+    """A red ring on a slightly noisy white background, with a stray speck in the corner."""
+    surf = pygame.Surface((64, 64))
+    surf.fill(WHITE)
+    for _ in range(200):
+        shade = random.randint(235, 255)  # JPEG-ish noise, within the threshold
+        surf.set_at((random.randrange(64), random.randrange(64)), (shade, shade, shade))
+    pygame.draw.circle(surf, RED, (32, 32), 20, 6)  # White centre isn't connected to the border
+    surf.fill((20, 20, 20), (4, 4, 2, 2))  # Speck below BG_REMOVE_MIN_SPECK
+    return surf
+
+
+cut = remove_background(sprite())
+assert cut is not None and cut.get_flags() & pygame.SRCALPHA
+assert cut.get_at((0, 0)).a == 0 and cut.get_at((63, 63)).a == 0
+assert cut.get_at((4, 4)).a == 0
+print("✓ Border-connected background and specks are transparent")
+
+assert cut.get_at((32, 32)).a == 255
+assert tuple(cut.get_at((32, 15)))[:3] == RED and cut.get_at((32, 15)).a == 255
+assert cut.get_at((32, 12)).a == 128
+print("✓ Weapon and its enclosed background stay opaque, the outer edge is softened")
+
+# Not a flat background: leave it for remove.bg
+noise = pygame.Surface((64, 64))
+for x in range(64):
+    for y in range(64):
+        noise.set_at((x, y), (random.randrange(256), random.randrange(256), random.randrange(256)))
+assert remove_background(noise) is None
+flat = pygame.Surface((64, 64))
+flat.fill(WHITE)
+assert remove_background(flat) is None  # Nothing but background
+assert remove_background(pygame.Surface((2, 2))) is None
+print("✓ Noisy, empty and tiny images are left alone")
+
+# Encoded bytes in, PNG bytes out
+encoded = io.BytesIO()
+pygame.image.save(sprite(), encoded, 'weapon.png')
+png_bytes = remove_background_bytes(encoded.getvalue())
+assert png_bytes and png_bytes[:8] == b'\x89PNG\r\n\x1a\n'
+loaded = pygame.image.load(io.BytesIO(png_bytes))
+assert loaded.get_at((0, 0)).a == 0 and loaded.get_at((32, 32)).a == 255
+assert remove_background_bytes(b'not an image') is None
+print(f"✓ remove_background_bytes -> {len(png_bytes)} byte PNG")
+
+pygame.quit()
+print("\nAll background removal checks passed")
@@ -0,0 +1,139 @@
+# test_circuit_breaker.py
+# Open / probe (half-open) / close checks for the AI upstream circuit breakers (modules/circuit_breaker.py)
+
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import modules.circuit_breaker as circuit_breaker
+from modules.circuit_breaker import CircuitBreaker, UpstreamUnavailable, percentile
+from modules.ai_client import AIClient
+from settings import *
+
+circuit_breaker.CIRCUIT_OPEN_SECONDS = 0.05  # Probe quickly instead of every 20s
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+assert percentile([], 50) == 0.0
+assert percentile([3, 1, 2], 50) == 2 and percentile(list(range(1, 101)), 95) == 95
+print("✓ Nearest-rank percentiles")
+
+# Closed: failures below the minimum window, or below the error rate, don't trip it
+breaker = CircuitBreaker('test image')
+for _ in range(CIRCUIT_MIN_CALLS - 1):
+    breaker.record(False, 0.1)
+assert breaker.state == 'closed'
+breaker.check()
+breaker = CircuitBreaker('test image')
+for ok in [True, True, True, False] * 3:
+    breaker.record(ok, 0.1)
+assert breaker.state == 'closed'
+print("✓ Stays closed under the minimum window and error rate")
+
+# Open on errors: calls fail fast
+probe_answers = [False, False, True]
+probes = []
+
+
+def probe():
+    probes.append(time.time())
+    return probe_answers[min(len(probes), len(probe_answers)) - 1]
+
+
+breaker = CircuitBreaker('test image', probe=probe)
+for _ in range(CIRCUIT_MIN_CALLS):
+    breaker.record(False, 0.1)
+assert breaker.state == 'open' and 'errors' in breaker.reason
+try:
+    breaker.check()
+    raise AssertionError('open breaker let a call through')
+except UpstreamUnavailable as e:
+    print(f"✓ Opened on errors, calls fail fast: {e}")
+assert breaker.snapshot()['short_circuited'] == 1
+
+# Half-open: the probe runs in the background until the upstream answers, then it closes
+assert wait_for(lambda: breaker.state == 'closed')
+assert len(probes) == 3 and not breaker.probing and not breaker.calls
+breaker.check()
+print(f"✓ Closed after {len(probes)} probes (2 failed)")
+
+# Open on a slow median, without a probe it stays open
+breaker = CircuitBreaker('test refine')
+for _ in range(CIRCUIT_MIN_CALLS):
+    breaker.record(True, CIRCUIT_SLOW_SECONDS + 1)
+assert breaker.state == 'open' and 'median' in breaker.reason
+time.sleep(0.1)
+assert breaker.state == 'open'
+print(f"✓ Opened on latency ({breaker.reason})")
+
+# Timeout caps follow the kind's p95 but never drop below 10s
+breaker = CircuitBreaker('test download')
+assert breaker.timeout_for(60) == 60  # Not enough calls yet
+for _ in range(CIRCUIT_WINDOW):
+    breaker.record(True, 0.5)
+assert breaker.timeout_for(60) == 10.0
+for _ in range(CIRCUIT_WINDOW):
+    breaker.record(True, 8.0)
+assert breaker.timeout_for(60) == 8.0 * CIRCUIT_TIMEOUT_FACTOR and breaker.timeout_for(5) == 5
+print("✓ Timeout cap: p95 x factor, 10s floor")
+
+
+# One breaker per (host, call kind); the probe POSTs to the failing endpoint
+class Upstream(BaseHTTPRequestHandler):
+    statuses = [503, 429, 400]
+    requests = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        Upstream.requests.append((self.path, body))
+        self.send_response(Upstream.statuses[min(len(Upstream.requests), len(Upstream.statuses)) - 1])
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        Upstream.requests.append((self.path, b''))
+        self.send_response(404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+server = ThreadingHTTPServer(('127.0.0.1', 0), Upstream)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+url = f'http://127.0.0.1:{server.server_port}'
+client = AIClient()
+try:
+    refine = client._breaker_for('refine', 'POST', url + '/chat')
+    image = client._breaker_for('image', 'POST', url + '/image')
+    assert refine is not image and refine is client._breaker_for('refine', 'POST', url + '/chat')
+    assert image.name == '127.0.0.1 image'
+    for _ in range(CIRCUIT_MIN_CALLS):
+        image.record(False, 0.1)
+    assert image.state == 'open' and refine.state == 'closed'
+    assert wait_for(lambda: image.state == 'closed')
+    assert [path for path, _ in Upstream.requests] == ['/image'] * 3 and Upstream.requests[0][1] == b'{}'
+    print("✓ Per-kind breakers: image tripped alone, probe retried /image through 503 and 429 until a 400")
+
+    # Download URLs differ per image: the probe fetches the newest one, not the first ever seen
+    Upstream.requests.clear()
+    download = client._breaker_for('download', 'GET', url + '/old.png')
+    assert client._breaker_for('download', 'GET', url + '/new.png') is download
+    for _ in range(CIRCUIT_MIN_CALLS):
+        download.record(False, 0.1)
+    assert wait_for(lambda: download.state == 'closed')
+    assert Upstream.requests == [('/new.png', b'')]
+    print("✓ Download probe follows the latest URL")
+finally:
+    client.close()
+    server.shutdown()
+
+print("\nAll circuit breaker checks passed")
@@ -0,0 +1,74 @@
+# test_forge_cache.py
+# Hit / miss / eviction checks for the forge cache (modules/forge_cache.py) on top of its asset store
+
+import io
+import os
+import time
+import tempfile
+import pygame
+from modules.forge_cache import ForgeCache, normalize_prompt
+from modules.asset_store import AssetStore
+from settings import FUZZY_MATCH_THRESHOLD
+
+pygame.init()
+
+
+def sprite_png(color):
+    """A small solid sprite encoded as PNG, like a finished forge."""
+    surf = pygame.Surface((24, 24))
+    surf.fill(color)
+    out = io.BytesIO()
+    pygame.image.save(surf, out, 'weapon.png')
+    return out.getvalue()
+
+
+sword, spear, tiger = sprite_png((220, 60, 20)), sprite_png((80, 160, 255)), sprite_png((250, 180, 0))
+assert normalize_prompt('  Flaming   SWORD!! ') == 'flaming sword'
+
+with tempfile.TemporaryDirectory(prefix='promptwar-test-') as directory:
+    budget = len(sword) + len(spear) + len(tiger) // 2  # Room for two of the three images
+    assets_dir, entries_dir = os.path.join(directory, 'assets'), os.path.join(directory, 'cache')
+    models = ('chat-model', 'image-model')
+    cache = ForgeCache(entries_dir, AssetStore(assets_dir, budget), pipeline_version=1, models=models)
+
+    assert cache.get('flaming sword') is None
+    cache.put('flaming sword', sword, {'name': 'Flaming Sword', 'damage': 12})
+    png_bytes, meta = cache.get('Flaming sword!')
+    assert png_bytes == sword and meta['name'] == 'Flaming Sword' and meta['prompt'] == 'flaming sword'
+    assert cache.contains('FLAMING SWORD') and not cache.contains('icy spear')
+    print("✓ Miss, then a hit for a trivially different spelling")
+
+    # Two prompts that produced the same image share one file
+    path = cache.put('shiny sword', sword, {'name': 'Shiny Sword'})
+    assert path == cache.image_path(meta) and len(cache.assets.assets) == 1
+    print("✓ Same image under two prompts stored once")
+
+    cache.put('icy spear', spear, {'name': 'Icy Spear'})
+    time.sleep(0.01)
+    cache.get('flaming sword')  # The spear is now the least recently used
+    cache.put('giant tiger', tiger, {'name': 'Giant Tiger'})
+    assert cache.get('icy spear') is None and not os.path.exists(os.path.join(entries_dir, cache.key_for('icy spear') + '.json'))
+    assert cache.get('flaming sword') and cache.get('shiny sword') and cache.get('giant tiger')
+    assert cache.size_bytes <= budget
+    print(f"✓ Evicting an image drops the entries using it ({cache.size_bytes} / {budget} bytes)")
+
+    stats = cache.stats()
+    assert stats['entries'] == 3 and stats['hits'] == 5 and stats['misses'] == 2, stats
+    cache.assets.flush()
+
+    # Entries survive a restart; other models or a pipeline bump don't see them
+    assert ForgeCache(entries_dir, AssetStore(assets_dir, budget), 1, models).get('giant tiger')[1]['name'] == 'Giant Tiger'
+    assert ForgeCache(entries_dir, AssetStore(assets_dir, budget), 2, models).get('giant tiger') is None
+    assert ForgeCache(entries_dir, AssetStore(assets_dir, budget), 1, ('other-model',)).get('giant tiger') is None
+    print("✓ Reloaded from disk; new models or pipeline version miss")
+
+    # A reworded prompt reuses the closest entry; an unrelated one doesn't
+    png_bytes, meta, score = cache.nearest('sword of fire', FUZZY_MATCH_THRESHOLD)
+    assert meta['name'] == 'Flaming Sword' and score >= FUZZY_MATCH_THRESHOLD
+    assert cache.nearest('banana', FUZZY_MATCH_THRESHOLD) is None
+    reloaded = ForgeCache(entries_dir, AssetStore(assets_dir, budget), 1, models)
+    assert reloaded.nearest('huge tiger', FUZZY_MATCH_THRESHOLD)
+    print(f"✓ 'sword of fire' reuses 'flaming sword' ({score:.2f}), also after a reload")
+
+pygame.quit()
+print("\nAll forge cache checks passed")
@@ -0,0 +1,198 @@
+# test_forge_queue.py
+# End-to-end checks for how forges are queued and run (modules/ai_client.py, modules/forge_engine.py)
+# Every forge goes to a MockUpstream on localhost; the cache lives in a temp dir.
+
+import os
+import time
+import tempfile
+import pygame
+import modules.ai_client as ai_client
+from modules.ai_client import AIClient, batch_report
+from modules.asset_store import AssetStore
+from modules.forge_cache import ForgeCache
+from modules.forge_engine import AsyncForgeEngine, AiohttpTransport, ThreadTransport
+from modules.mock_upstream import MockUpstream
+
+pygame.init()
+scratch = tempfile.TemporaryDirectory(prefix='promptwar-forge-')
+upstream = MockUpstream(latency=0.3, jitter=0.0, removebg_latency=0.1, seed=7).start()
+slow = MockUpstream(latency=3.0, jitter=0.0, seed=3).start()  # Keeps forges running while we look
+
+
+def wait_until(condition, timeout=5.0):
+    """Poll condition() until it holds or timeout passes; returns its last value."""
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def offline_client(name):
+    """An AIClient wired to the mock upstream, with a cache of its own."""
+    client = AIClient()
+    upstream.attach(client)
+    root = os.path.join(scratch.name, name)
+    client.assets = AssetStore(os.path.join(root, 'assets'), 1 << 26)
+    client.forge_cache = ForgeCache(os.path.join(root, 'cache'), client.assets, 1, ('mock',))
+    return client
+
+
+def test_async_engine(transport_name):
+    """Both transports run a batch concurrently through the same pipeline."""
+    client = offline_client(transport_name)
+    transport = ThreadTransport(client) if transport_name == 'threads' else None
+    client.engine = AsyncForgeEngine(client, 4, transport=transport)
+    assert isinstance(client.engine.transport, ThreadTransport if transport_name == 'threads' else AiohttpTransport)
+
+    prompts = [f'{element} {transport_name} blade' for element in ('fire', 'ice', 'storm', 'venom')]
+    started = time.time()
+    results = client.forge_batch(prompts, timeout=30)
+    elapsed = time.time() - started
+    assert [r['outcome'] for r in results] == ['ai'] * 4, [r['outcome'] for r in results]
+    slowest = max(r['seconds'] for r in results)
+    assert elapsed < slowest * 2, (elapsed, slowest)  # One forge's time, not four
+    assert all(r['weapon']['image'] is not None and 'image' in r['stages'] for r in results)
+
+    again = client.forge_batch(prompts[:1], timeout=30)
+    assert again[0]['outcome'] == 'cached'
+    client.close()
+    print(f"✓ Async engine ({transport_name}): 4 forges in {elapsed:.2f}s, slowest {slowest:.2f}s")
+
+
+def test_cancel():
+    """Cancelling or retyping aborts the running forge's request instead of waiting it out."""
+    client = offline_client('cancel')
+    slow.attach(client)
+    assert client.forge_weapon('thunder hammer', 0, progressive=False) == 'queued'
+    assert wait_until(lambda: slow.stats()['requests'])  # Refine request now in flight
+    job = client.player_jobs[0]
+    started = time.time()
+    assert client.cancel_forge(0) and not client.cancel_forge(0)
+    assert wait_until(lambda: client.forge_metrics()['cancelled'] == 1, timeout=1.0)
+    aborted = time.time() - started
+    assert aborted < 1.0 and job.cancelled.is_set()
+
+    # Retyping supersedes the running forge; only the new prompt's weapon arrives
+    assert client.forge_weapon('frost hammer', 1, progressive=False) == 'queued'
+    assert wait_until(lambda: client.player_jobs[1].state == 'running')
+    first = client.player_jobs[1]
+    assert client.forge_weapon('frost hammer!', 1, progressive=False) == 'running'  # Same prompt: keep going
+    assert client.forge_weapon('storm hammer', 1, progressive=False) == 'queued'
+    assert first.cancelled.is_set()
+    delivered = []
+    client.set_weapon_spawned_callback(lambda weapon, player_id: delivered.append(weapon['name']))
+    assert wait_until(lambda: client.process_pending_results() or delivered, timeout=20)
+    time.sleep(0.2)
+    client.process_pending_results()
+    metrics = client.forge_metrics()
+    assert len(delivered) == 1 and metrics['completed'] == 1 and metrics['cancelled'] == 2, (delivered, metrics)
+    client.close()
+    print(f"✓ Cancel: running forge aborted in {aborted:.2f}s, retyped prompt supersedes")
+
+
+def test_backpressure():
+    """Once every worker is busy and the queue is full, new forges are rejected, not buffered."""
+    ai_client.FORGE_QUEUE_LIMIT = 2
+    client = offline_client('backpressure')
+    slow.attach(client)
+    assert client.forge_weapon('axe number 0', 0, progressive=False) == 'queued'
+    assert wait_until(lambda: client.player_forge_state(0) == 'running')
+    workers = client.forge_metrics()['workers']  # Known once the pool or engine has started
+    for player_id in range(1, workers):
+        assert client.forge_weapon(f'axe number {player_id}', player_id, progressive=False) == 'queued'
+        assert wait_until(lambda: client.player_forge_state(player_id) == 'running')
+    for player_id in range(workers, workers + 2):
+        assert client.forge_weapon(f'bow number {player_id}', player_id, progressive=False) == 'queued'
+    assert client.forge_metrics()['queue_depth'] == 2
+
+    late = workers + 2
+    assert client.forge_weapon('late lance', late, progressive=False) == 'rejected'
+    assert client.player_forge_state(late) is None
+    # A running player who retypes while the queue is full keeps the forge they have
+    running = client.player_jobs[0]
+    assert client.forge_weapon('another axe', 0, progressive=False) == 'rejected'
+    assert client.player_jobs[0] is running and not running.cancelled.is_set()
+    # A queued player's new prompt takes their own slot
+    assert client.forge_weapon('crossbow', workers, progressive=False) == 'queued'
+    metrics = client.forge_metrics()
+    assert metrics['queue_depth'] == 2 and metrics['rejected'] == 2, metrics
+
+    client.cancel_all()
+    assert wait_until(lambda: client.forge_metrics()['running'] == 0)
+    client.close()
+    ai_client.FORGE_QUEUE_LIMIT = 16
+    print(f"✓ Backpressure: {workers} running + 2 queued, further forges rejected")
+
+
+def test_placeholder():
+    """An uncached forge equips a procedural placeholder at once and hot-swaps the AI sprite later."""
+    client = offline_client('placeholder')
+    upstream.attach(client)
+    spawned, upgraded = [], []
+    client.set_weapon_spawned_callback(lambda weapon, player_id: spawned.append((weapon, player_id)))
+    client.set_weapon_upgraded_callback(lambda weapon, player_id: upgraded.append((weapon, player_id)))
+
+    assert client.forge_weapon('glacier spear', 0) == 'queued'
+    client.process_pending_results()
+    assert len(spawned) == 1 and spawned[0][0]['placeholder'] and spawned[0][0]['image'] is not None
+    assert wait_until(lambda: client.process_pending_results() or upgraded, timeout=10)
+    final, player_id = upgraded[0]
+    assert player_id == 0 and not final.get('placeholder') and final['damage'] == spawned[0][0]['damage']
+
+    # Cached now: the real weapon comes straight away, no placeholder
+    assert client.forge_weapon('Glacier Spear!', 1) == 'queued'
+    assert wait_until(lambda: client.process_pending_results() or len(spawned) == 2)
+    assert spawned[1][0].get('cached') and not spawned[1][0].get('placeholder') and len(upgraded) == 1
+
+    # No key: the placeholder is all there is, the mock result that follows is dropped
+    client.hackclub_key = None
+    assert client.forge_weapon('ember staff', 2) == 'queued'
+    client.process_pending_results()
+    assert spawned[2][0]['placeholder'] and spawned[2][1] == 2
+    assert wait_until(lambda: client.player_forge_state(2) is None)
+    client.process_pending_results()
+    assert len(spawned) == 3 and len(upgraded) == 1
+    client.close()
+    print("✓ Placeholder equipped at once, AI sprite upgraded in; cached and keyless forges handled")
+
+
+def test_batch():
+    """Batch forges are tagged apart from players; cache hits and timeouts stay out of the throughput."""
+    client = offline_client('batch')
+    upstream.attach(client)
+    warmed = client.forge_batch(['meteor flail'], timeout=30)
+    assert warmed[0]['outcome'] == 'ai'
+
+    prompts = ['meteor flail', 'coral trident', 'shadow scythe']
+    started = time.time()
+    results = client.forge_batch(prompts, timeout=30)
+    report = batch_report(results, time.time() - started)
+    assert [r['outcome'] for r in results] == ['cached', 'ai', 'ai'], results
+    assert report['outcomes'] == {'cached': 1, 'ai': 2} and report['cached'] == 1
+    assert report['p50'] >= min(r['seconds'] for r in results[1:]) > report['cached_p50']
+    assert not client.player_jobs  # Batch items never take a player's slot
+    traces = [trace.to_dict() for trace in client.telemetry.traces]
+    assert sorted(tuple(t['batch']) for t in traces[-3:]) == [(2, 0), (2, 1), (2, 2)]
+    assert all(t['player_id'] is None for t in traces)
+
+    slow.attach(client)
+    late = client.forge_batch(['glacier maul'], timeout=0.3)
+    assert late[0]['outcome'] == 'timeout' and late[0]['weapon'] is None
+    assert batch_report(late, 0.3)['forges_per_minute'] == 0.0
+    client.close()
+    print(f"✓ Batch: {report['forges_per_minute']:.0f} forges/min over 2 forged, cache hit and timeout reported apart")
+
+
+test_async_engine('threads')
+test_async_engine('aiohttp')
+
+test_cancel()
+test_backpressure()
+test_placeholder()
+test_batch()
+
+upstream.stop()
+slow.stop()
+scratch.cleanup()
+pygame.quit()
+print("\nAll forge queue checks passed")
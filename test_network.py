@@ -0,0 +1,147 @@
+# test_network.py
+# Loopback checks for the networking layer (modules/network.py) - no LAN needed
+
+import time
+import socket
+from modules.network import GameServer, GameClient, PeerSession, SendScheduler, _SEQ
+from modules.protocol import PROTOCOL_VERSION, encode_message
+
+
+def wait_until(condition, timeout=3.0):
+    """Poll condition() until it holds or timeout passes; returns its last value."""
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def run_scheduler(scheduler, seconds, dt=1 / 120):
+    """Advance the scheduler like the game loop would; returns how many snapshots it sent."""
+    return sum(scheduler.update(dt) for _ in range(round(seconds / dt)))
+
+
+def test_send_scheduler():
+    """AIMD snapshot rate: climbs on a clean link, backs off on queueing, cosmetic fields coarsen."""
+    scheduler = SendScheduler()
+    scheduler.on_rtt(0.02)
+    run_scheduler(scheduler, 5)
+    assert scheduler.rate == SendScheduler.MAX_RATE
+    assert 55 <= run_scheduler(scheduler, 1) <= 61
+    state = {'x': 100, 'y': 200, 'vx': 3.14159, 'vy': -1.3}
+    assert scheduler.shape(state) is state  # Full rate: sent as is
+
+    # RTT well above the best seen means packets are queueing somewhere: back off multiplicatively
+    for _ in range(10):
+        scheduler.on_rtt(0.2)
+    run_scheduler(scheduler, SendScheduler.EVAL_INTERVAL)
+    assert abs(scheduler.rate - SendScheduler.MAX_RATE * 0.7) < 1e-9
+    run_scheduler(scheduler, 5)
+    assert scheduler.rate == SendScheduler.MIN_RATE
+    assert 9 <= run_scheduler(scheduler, 1) <= 11
+    shaped = scheduler.shape(state)
+    assert shaped == {'x': 100, 'y': 200, 'vx': 3.0, 'vy': -1.5}, shaped
+
+    # Queue drained: additive increase, one step per evaluation
+    for _ in range(40):
+        scheduler.on_rtt(0.02)
+    run_scheduler(scheduler, SendScheduler.EVAL_INTERVAL)
+    assert scheduler.rate == SendScheduler.MIN_RATE + 5
+    run_scheduler(scheduler, 2)
+    assert scheduler.rate == SendScheduler.MIN_RATE + 25
+    assert scheduler.shape(state)['vx'] == 3.125
+
+    # Snapshots waiting in the outbox or blocked sends are congestion too
+    rate = scheduler.rate
+    scheduler.on_dequeue(0.1)
+    run_scheduler(scheduler, SendScheduler.EVAL_INTERVAL)
+    assert scheduler.rate < rate
+    rate = scheduler.rate
+    scheduler.on_send(0.2)
+    run_scheduler(scheduler, SendScheduler.EVAL_INTERVAL)
+    assert scheduler.rate < rate
+    print(f"✓ SendScheduler: {SendScheduler.MIN_RATE}-{SendScheduler.MAX_RATE} Hz AIMD, velocity quantized as the rate drops")
+
+
+def test_peer_session():
+    """Two PeerSessions on localhost find each other, drop stale snapshots and time out."""
+    a, b = PeerSession(), PeerSession()
+    received = []
+    b.on_state = received.append
+    b.PEER_TIMEOUT = 0.6
+    a.start('DUEL', 0, '127.0.0.1', b.port, 1)
+    b.start('DUEL', 1, '127.0.0.1', a.port, 0)
+    assert wait_until(lambda: a.active and b.active), "peers never heard each other"
+
+    a.send({'type': 'update', 'room_code': 'DUEL', 'player_id': 0, 'data': {'x': 100, 'y': 200}})
+    assert wait_until(lambda: received), "snapshot not delivered"
+    assert received[-1]['x'] == 100
+
+    # A datagram older than the newest one seen is dropped, as is one for another room
+    stale = encode_message({'type': 'update', 'room_code': 'DUEL', 'player_id': 0, 'data': {'x': 1}})
+    a.sock.sendto(_SEQ.pack(1) + stale, ('127.0.0.1', b.port))
+    other = encode_message({'type': 'update', 'room_code': 'OTHER', 'player_id': 0, 'data': {'x': 2}})
+    a.sock.sendto(_SEQ.pack(a.send_seq + 100) + other, ('127.0.0.1', b.port))
+    a.send({'type': 'update', 'room_code': 'DUEL', 'player_id': 0, 'data': {'x': 300}})
+    assert wait_until(lambda: received[-1]['x'] == 300)
+    assert [state['x'] for state in received] == [100, 300], received
+
+    a.close()
+    assert wait_until(lambda: not b.active), "session stayed active after the peer left"
+    b.close()
+    print("✓ PeerSession: link up, stale/foreign datagrams dropped, falls back when the peer goes quiet")
+
+
+def test_spectator_fan_out():
+    """A spectator that stops reading never holds up the players or the other spectators."""
+    server = GameServer()
+    server.host = '127.0.0.1'
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        server.port = probe.getsockname()[1]
+    server.start()
+
+    clients = [GameClient(p2p=False) for _ in range(2)]
+    for client in clients:
+        client.port = server.port
+        assert client.connect('127.0.0.1')
+    host, watcher = clients
+    assert host.create_room('SPEC') and watcher.spectate_room('SPEC')
+
+    # The stalled spectator joins by hand and then never reads its socket
+    stalled = socket.socket()
+    stalled.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    stalled.connect(('127.0.0.1', server.port))
+    stalled.sendall(encode_message({'type': 'hello'}, PROTOCOL_VERSION))
+    time.sleep(0.2)
+    stalled.sendall(encode_message({'type': 'join_room', 'role': 'spectator', 'room_code': 'SPEC'}, PROTOCOL_VERSION))
+    assert wait_until(lambda: len(server.spectator_conns) == 2)
+    for conn in server.spectator_conns:
+        if conn.getpeername() == stalled.getsockname():
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)  # Fill up after a few frames
+
+    host.send_event({'type': 'weapon_forged', 'weapon_name': 'Flaming Sword'})
+    banner = 'x' * 30000  # Big snapshots so the stalled spectator falls behind quickly
+    for x in range(120):
+        host.send_update({'x': x, 'y': 300, 'banner': banner})
+        time.sleep(1 / 60)
+    assert wait_until(lambda: watcher.get_snapshot().get('players', {}).get(0, {}).get('x') == 119), watcher.get_snapshot()
+    assert watcher.get_snapshot()['weapons'] == {0: 'Flaming Sword'}
+
+    # Latest-wins: however far behind, the stalled spectator has at most one snapshot queued
+    backlog = max(len(out['buffer']) for out in server.spectator_out.values())
+    assert 0 < backlog <= 40000, backlog
+    tick = watcher.get_snapshot()['tick']
+    host.send_update({'x': 500, 'y': 300})
+    assert wait_until(lambda: watcher.get_snapshot()['tick'] > tick and watcher.get_snapshot()['players'][0]['x'] == 500)
+
+    stalled.close()
+    for client in clients:
+        client.disconnect()
+    server.stop()
+    print(f"✓ Spectator fan-out: live watcher current, stalled one holds {backlog} queued bytes")
+
+
+test_send_scheduler()
+test_peer_session()
+test_spectator_fan_out()
+print("\nAll network checks passed")
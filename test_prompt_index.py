@@ -0,0 +1,47 @@
+# test_prompt_index.py
+# Normalization and nearest-prompt checks for the prompt index (modules/prompt_index.py)
+
+from modules.prompt_index import PromptIndex, canonical_tokens, normalize_prompt
+from settings import FUZZY_MATCH_THRESHOLD
+
+# Normalization and canonical tokens
+assert normalize_prompt('  Flaming   SWORD!! ') == 'flaming sword'
+assert normalize_prompt(None) == ''
+assert canonical_tokens('The Flaming Sword') == canonical_tokens('sword of fire') == ('fire', 'sword')
+assert canonical_tokens('giant blades') == ('massive', 'sword')
+assert canonical_tokens('glass sword') == ('glass', 'sword')  # 'ss' isn't a plural
+assert canonical_tokens('the of a') == ()
+print("✓ Normalization folds case, punctuation, stopwords, synonyms and plurals")
+
+index = PromptIndex()
+for key, prompt in [('k1', 'flaming sword'), ('k2', 'icy spear'), ('k3', 'giant tiger'), ('k4', 'lightning hammer')]:
+    index.add(key, prompt)
+assert len(index) == 4
+
+# Close variants find their entry at the game's threshold; unrelated prompts don't
+for query, expected in [('fire sword', 'k1'), ('sword of flames', 'k1'), ('frozen lance', 'k2'),
+                        ('huge tiger', 'k3'), ('thunder warhammer', 'k4')]:
+    match = index.nearest(query, FUZZY_MATCH_THRESHOLD)
+    assert match is not None and match[0] == expected, (query, match)
+    print(f"✓ '{query}' -> '{match[1]}' ({match[2]:.2f})")
+for query in ['fire axe', 'banana', '']:
+    assert index.nearest(query, FUZZY_MATCH_THRESHOLD) is None, query
+print("✓ Unrelated prompts don't match")
+
+# Scores are symmetric, bounded, and identical prompts score 1
+assert abs(index.similarity('fire sword', 'flaming blade') - 1.0) < 1e-9
+score = index.similarity('fire sword', 'ice sword')
+assert 0.0 < score < 1.0 and abs(score - index.similarity('ice sword', 'fire sword')) < 1e-9
+print(f"✓ Similarity bounded and symmetric ('fire sword' / 'ice sword' = {score:.2f})")
+
+# Re-adding a key replaces it; removing it drops its trigram postings
+index.add('k1', 'poison dagger')
+assert index.nearest('fire sword', FUZZY_MATCH_THRESHOLD) is None
+assert index.nearest('poison daggers', FUZZY_MATCH_THRESHOLD)[0] == 'k1'
+index.remove('k1')
+index.remove('missing')
+assert len(index) == 3 and index.nearest('poison dagger', FUZZY_MATCH_THRESHOLD) is None
+assert not any('k1' in keys for keys in index.postings.values())
+print("✓ Replace and remove keep the postings clean")
+
+print("\nAll prompt index checks passed")
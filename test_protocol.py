@@ -0,0 +1,120 @@
+# test_protocol.py
+# Round-trip and malformed-input checks for the binary wire codec (modules/protocol.py)
+
+from modules.protocol import *
+
+# One sample value per schema field type
+SAMPLES = {
+    'str': 'EPIC_BATTLE',
+    'u8': 3,
+    'u16': 5000,
+    'u32': 70000,
+    'pid': 1,
+    'str_list': ['Host', 'Player2'],
+    'value': {'hp': [1, 2.5, None, True, 'x'], 'nested': {'k': -7}},
+}
+
+
+def expect_error(label, fn):
+    """fn() must raise ProtocolError."""
+    try:
+        fn()
+    except ProtocolError as e:
+        print(f"✓ {label}: {e}")
+        return
+    raise AssertionError(f"{label}: no ProtocolError raised")
+
+
+# --- Every message type, in every protocol version that has it ---
+for msg_type, (type_id, fields) in MESSAGE_SCHEMAS.items():
+    message = {'type': msg_type}
+    for name, field_type, default in fields:
+        message[name] = SAMPLES[field_type]
+    for version in range(MESSAGE_SINCE.get(msg_type, MIN_PROTOCOL_VERSION), PROTOCOL_VERSION + 1):
+        decoded = decode_message(encode_message(message, version), version)
+        assert decoded == message, (msg_type, version, decoded)
+    print(f"✓ {msg_type} round-trips")
+
+# Missing fields decode as their schema defaults
+assert decode_message(encode_message({'type': 'ack'})) == {'type': 'ack', 'status': 'ok', 'message': ''}
+assert decode_message(encode_message({'type': 'update', 'room_code': 'R'}))['player_id'] is None
+print("✓ Defaults fill missing fields")
+
+# --- Player state fast path and gameplay events ---
+state = {'type': 'update', 'room_code': 'EPIC_BATTLE', 'player_id': 1, 'data': {
+    'x': 640, 'y': 408, 'vx': 6.5, 'vy': -3.25, 'health': 85, 'alive': True,
+    'facing_right': False, 'attack_state': 1}}
+frame = encode_message(state)
+assert frame[2] == STATE_TYPE_ID
+assert decode_message(frame) == state
+assert full_state_player(frame[2:]) == 1
+assert peek_route(frame[2:]) == ('update', 'EPIC_BATTLE', 1)
+assert decode_message(wrap_body(frame[2:])) == state
+
+# Partial updates carry only their fields: masked layout from v4, tagged encoding before
+partial = {'type': 'update', 'room_code': 'R', 'player_id': 0, 'data': {'x': 5, 'health': 3}}
+compact = encode_message(partial)
+assert compact[2] == STATE_TYPE_ID | COMPACT_FLAG and len(compact) == 2 + 3 + 2 + 2 + 1
+assert decode_message(compact) == partial and full_state_player(compact[2:]) is None
+assert peek_route(compact[2:]) == ('update', 'R', 0)
+for version in range(MIN_PROTOCOL_VERSION, COMPACT_SINCE):
+    assert encode_message(partial, version)[2] == MESSAGE_SCHEMAS['update'][0]
+    assert decode_message(encode_message(partial, version), version) == partial
+flags = {'type': 'update', 'room_code': 'R', 'player_id': None, 'data': {'facing_right': True, 'vx': -2.5}}
+assert decode_message(encode_message(flags)) == flags
+
+# Values the fixed layouts can't hold exactly keep the tagged encoding instead of being coerced
+for data in (dict(state['data'], x=640.5), {'y': 12.75}, {'health': 70000}):
+    loose = dict(state, data=data)
+    frame_bytes = encode_message(loose)
+    assert frame_bytes[2] == MESSAGE_SCHEMAS['update'][0] and decode_message(frame_bytes) == loose, data
+
+event = {'type': 'update', 'room_code': 'R', 'player_id': 0, 'data': {
+    'type': 'weapon_forged', 'player_id': 0, 'weapon_name': 'Flaming Forged Sword', 'forged': True}}
+for version in range(MIN_PROTOCOL_VERSION, PROTOCOL_VERSION + 1):
+    assert decode_message(encode_message(event, version), version) == event
+assert peek_route(encode_message(event)[2:]) == ('update', 'R', 0)
+print(f"✓ State fast path ({len(frame)} bytes, partial {len(compact)}) and events round-trip")
+
+# --- Version negotiation ---
+assert negotiate_version({'version': PROTOCOL_VERSION, 'min_version': 1}) == PROTOCOL_VERSION
+assert negotiate_version({'version': 2, 'min_version': 1}) == 2
+assert negotiate_version({'version': PROTOCOL_VERSION + 5, 'min_version': PROTOCOL_VERSION + 1}) is None
+print("✓ Version negotiation")
+
+# --- Malformed input ---
+good = encode_message({'type': 'join_room', 'room_code': 'ROOM', 'player_name': 'P'}, 1)
+expect_error("Unknown message type", lambda: encode_message({'type': 'rm -rf'}))
+expect_error("Unencodable value", lambda: encode_message({'type': 'update', 'room_code': 'R', 'data': object()}))
+expect_error("Too deeply nested", lambda: encode_message(
+    {'type': 'update', 'room_code': 'R', 'data': {'type': 'x', 'v': [[[[[[[[[1]]]]]]]]]}}))
+expect_error("Message newer than the version", lambda: encode_message({'type': 'ping', 'seq': 1}, 1))
+expect_error("Unsupported version", lambda: encode_message({'type': 'ack'}, PROTOCOL_VERSION + 1))
+expect_error("Empty frame", lambda: decode_body(b''))
+expect_error("Unknown type id", lambda: decode_body(bytes([99])))
+expect_error("Ping body at v1", lambda: decode_body(encode_message({'type': 'ping', 'seq': 1}, 2)[2:], 1))
+expect_error("Compact body at v3", lambda: decode_body(compact[2:], 3))
+expect_error("Compact relay at v3", lambda: peek_route(compact[2:], 3))
+expect_error("Truncated header", lambda: decode_message(b'\x00'))
+expect_error("Length mismatch", lambda: decode_message(good + b'x'))
+expect_error("Truncated field", lambda: decode_body(good[2:-1], 1))
+expect_error("Trailing bytes", lambda: decode_body(good[2:] + b'x', 1))
+expect_error("Invalid utf-8", lambda: decode_body(good[2:-1] + b'\xff', 1))
+expect_error("Truncated compact frame", lambda: decode_body(compact[2:-2]))
+expect_error("Bad compact mask", lambda: peek_route(compact[2:4] + b'\xff' + compact[5:]))
+expect_error("Truncated state frame", lambda: peek_route(frame[2:8]))
+expect_error("Bad state mask", lambda: peek_route(frame[2:4] + b'\x00' + frame[5:]))
+expect_error("Oversized frame length", lambda: FrameBuffer(max_frame_size=16).feed(b'\x00\x20' + b'x' * 32))
+expect_error("Zero frame length", lambda: FrameBuffer().feed(b'\x00\x00'))
+
+# --- Stream reassembly ---
+stream = encode_message(state) + encode_message(event) + encode_message({'type': 'ack'})
+buffer = FrameBuffer()
+bodies = []
+for i in range(len(stream)):
+    bodies += buffer.feed(stream[i:i + 1])  # One byte per recv()
+assert [decode_body(body) for body in bodies] == [state, event, {'type': 'ack', 'status': 'ok', 'message': ''}]
+assert not buffer.buffer
+print(f"✓ FrameBuffer reassembles {len(bodies)} frames fed byte by byte")
+
+print("\nAll protocol checks passed")
@@ -0,0 +1,95 @@
+# test_sprites.py
+# Checks for fitting AI images onto weapon sprites (modules/sprite_generator.py)
+
+import io
+import pygame
+from modules.sprite_generator import fit_weapon_sprite, quantize_sprite, encode_indexed_png
+from modules.weapon import Weapon
+from modules.ai_client import AIClient
+
+pygame.init()
+
+# A wide blade in the middle of a big, mostly transparent AI image
+ai_image = pygame.Surface((512, 512), pygame.SRCALPHA, 32)
+ai_image.fill((180, 180, 200, 255), (156, 236, 200, 40))
+
+sprite = fit_weapon_sprite(ai_image, 40)
+assert sprite.get_size() == (40, 40)
+blade = sprite.get_bounding_rect()
+assert blade.width == 40 and blade.height == 8, blade  # 200x40 -> 40x8, border trimmed
+assert blade.center == (20, 20), blade.center
+print(f"✓ 512x512 image trimmed and shrunk to a centered {blade.width}x{blade.height} blade")
+
+# Small pixel art is scaled up without smoothing
+tiny = pygame.Surface((4, 4), pygame.SRCALPHA, 32)
+tiny.fill((255, 0, 0, 255), (0, 0, 2, 4))
+tiny.fill((0, 0, 255, 255), (2, 0, 2, 4))
+crisp = fit_weapon_sprite(tiny, 32)
+assert tuple(crisp.get_at((15, 16)))[:3] == (255, 0, 0) and tuple(crisp.get_at((16, 16)))[:3] == (0, 0, 255)
+# An image that is all transparent keeps its full frame
+assert fit_weapon_sprite(pygame.Surface((8, 8), pygame.SRCALPHA, 32), 16).get_size() == (16, 16)
+print("✓ Upscaling keeps hard pixel edges; empty images don't crash")
+
+# The forge worker hands the game a sprite at the weapon's size, not the original
+encoded = io.BytesIO()
+pygame.image.save(ai_image, encoded, 'weapon.png')
+client = AIClient()
+assert client._load_surface(encoded.getvalue(), 36).get_size() == (36, 36)
+assert client._load_surface(encoded.getvalue()).get_size() == (512, 512)
+client.close()
+
+# Weapons cache their scaled / flipped surfaces
+weapon = Weapon({'name': 'Blade', 'size': 40, 'image': sprite}, owner_id=0, x=0, y=0)
+right = weapon.get_surface(40)
+assert weapon.get_surface((40, 40)) is right
+left = weapon.get_surface(40, flipped=True)
+assert left is not right and left.get_bounding_rect() == right.get_bounding_rect()
+weapon.upgrade({'image': fit_weapon_sprite(tiny, 40)})
+assert weapon.get_surface(40) is not right
+print("✓ Worker-side fit to weapon size; per-size surface cache cleared on upgrade")
+
+# Quantizing: few colours come through exactly, transparency becomes the colorkey
+flat = pygame.Surface((16, 16), pygame.SRCALPHA, 32)
+flat.fill((200, 30, 30, 255), (2, 2, 6, 12))
+flat.fill((40, 40, 220, 255), (8, 2, 6, 12))
+flat.fill((255, 255, 255, 60), (0, 14, 16, 2))  # Faint halo: under half alpha, dropped
+indexed, psnr = quantize_sprite(flat)
+assert indexed.get_bitsize() == 8 and indexed.get_colorkey() is not None and psnr == 99.0
+assert tuple(indexed.get_at((3, 3)))[:3] == (200, 30, 30) and tuple(indexed.get_at((9, 3)))[:3] == (40, 40, 220)
+key = indexed.map_rgb(indexed.get_colorkey())
+assert indexed.get_at_mapped((0, 0)) == key and indexed.get_at_mapped((5, 15)) == key
+
+# A gradient has to share a small palette, at a measurable cost
+gradient = pygame.Surface((32, 32), pygame.SRCALPHA, 32)
+for x in range(32):
+    for y in range(32):
+        gradient.set_at((x, y), (x * 8, y * 8, 128, 255))
+shaded, psnr = quantize_sprite(gradient, max_colors=16)
+assert len({shaded.get_at_mapped((x, y)) for x in range(32) for y in range(32)}) <= 16
+assert 20 < psnr < 99, psnr
+assert quantize_sprite(pygame.Surface((8, 8), pygame.SRCALPHA, 32)) == (None, 0.0)
+print(f"✓ quantize_sprite: exact for flat colours, {psnr:.1f} dB for a gradient in 16 colours")
+
+# Indexed PNG keeps the palette and the transparency
+png_bytes = encode_indexed_png(indexed)
+assert png_bytes[25] == 3  # IHDR colour type: palette
+assert b'tRNS' in png_bytes
+loaded = pygame.image.load(io.BytesIO(png_bytes))
+assert loaded.get_size() == (16, 16) and loaded.get_bitsize() == 8 and loaded.get_colorkey() is not None
+assert tuple(loaded.get_at((3, 3)))[:3] == (200, 30, 30) and loaded.get_at_mapped((0, 0)) == key
+print(f"✓ encode_indexed_png round trip ({len(png_bytes)} bytes), colorkey restored on load")
+
+# With a display, indexed sprites stay 8-bit in memory and still blit with their transparency
+screen = pygame.display.set_mode((32, 32))
+client = AIClient()
+shown = client._load_surface(png_bytes)
+assert shown.get_bitsize() == 8 and shown.get_flags() & pygame.RLEACCELOK, shown
+screen.fill((0, 0, 0))
+screen.blit(shown, (0, 0))
+assert tuple(screen.get_at((3, 3)))[:3] == (200, 30, 30) and tuple(screen.get_at((0, 0)))[:3] == (0, 0, 0)
+assert client._load_surface(encoded.getvalue()).get_bitsize() == 32  # Per-pixel alpha keeps 32-bit
+client.close()
+print("✓ Indexed sprites kept 8-bit for display, colorkey blits transparent")
+
+pygame.quit()
+print("\nAll sprite checks passed")
@@ -29,5 +29,26 @@ weapon.draw(screen)
 collided = weapon.check_collision(player)
 print('Collision occurred:', collided)
 
+# Hot-swap a finished forge over the placeholder
+sprite = pygame.Surface((40, 40), pygame.SRCALPHA)
+sprite.fill((255, 120, 0))
+before = weapon.get_surface(32)
+weapon.upgrade({'name': 'Flaming Sword', 'damage': 15, 'image': sprite, 'saved_path': 'sword.png'})
+assert weapon.name == 'Flaming Sword' and weapon.damage == 15 and weapon.knockback == 6
+assert weapon.image is sprite and weapon.saved_path == 'sword.png'
+assert weapon.get_surface(32) is not before
+weapon.upgrade({})  # Nothing new: keeps what it has
+assert weapon.image is sprite and weapon.name == 'Flaming Sword'
+print('Upgrade swapped name, damage and sprite')
+
+# A bigger, faster forge grows the hitbox around its centre and keeps flying left
+thrown = Weapon(weapon_data, owner_id=0, x=300, y=200)
+thrown.set_direction(-1)
+center = thrown.rect.center
+thrown.upgrade({'size': 48, 'speed': 9})
+assert thrown.rect.size == (48, 48) and thrown.rect.center == center
+assert thrown.velocity_x == -9
+print('Upgrade resized the hitbox in place and kept the direction')
+
 pygame.quit()
 